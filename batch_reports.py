@@ -0,0 +1,61 @@
+# Headless batch report generator for the water accounting dashboard.
+#
+# Renders the summary page (metrics, summary table, charts and the subbasin map)
+# for every (county, water year) into static HTML and/or PNG files, fanned out
+# over a process pool. The data is loaded once in the parent and shared with the
+# workers read-only.
+#
+#   python batch_reports.py --out reports
+#   python batch_reports.py --years 1402-03 1401-02 --counties مشهد --format html png --workers 8
+import argparse
+import os
+import sys
+import time
+
+import water_accounting as wa
+from water_accounting.constants import DEFAULT_BOUNDARY_ZIP
+from water_accounting.reports import REPORT_FORMATS, report_jobs, run_reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Static summary reports for every county and water year.")
+    parser.add_argument('--out', default='reports', help="Output directory (default: reports)")
+    parser.add_argument('--years', nargs='*', help="Water years to render (default: all)")
+    parser.add_argument('--counties', nargs='*', help="Counties to render (default: all)")
+    parser.add_argument('--no-province', action='store_true', help="Skip the all-counties report of each year")
+    parser.add_argument('--format', nargs='+', default=['html'], choices=REPORT_FORMATS, help="html and/or png (png needs kaleido)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: CPU count; 1 = in-process)")
+    parser.add_argument('--boundary-zip', default=DEFAULT_BOUNDARY_ZIP, help="Zipped boundary shapefile for the maps ('' to skip maps)")
+    parser.add_argument('--id-col', help="Subbasin ID column of the shapefile (default: guessed)")
+    args = parser.parse_args(argv)
+    if 'png' in args.format:
+        try: import kaleido # noqa: F401 (plotly's static image backend)
+        except ImportError: parser.error("PNG output needs the kaleido package: pip install kaleido")
+
+    started = time.perf_counter()
+    dataset = wa.load_dataset()
+    for diagnostic in dataset.diagnostics: print(f"[{diagnostic.level}] {diagnostic.message}", file=sys.stderr)
+    if dataset.frame.empty:
+        print("No data loaded.", file=sys.stderr)
+        return 1
+    boundary_gdf = None
+    if args.boundary_zip:
+        boundary = wa.read_boundary_file(args.boundary_zip)
+        for diagnostic in boundary.diagnostics: print(f"[{diagnostic.level}] {diagnostic.message}", file=sys.stderr)
+        boundary_gdf = boundary.gdf
+
+    jobs = report_jobs(dataset.catalog, args.counties, args.years, include_province=not args.no_province)
+    print(f"Loaded data in {time.perf_counter() - started:.1f}s; rendering {len(jobs)} reports with {args.workers} workers")
+
+    def progress(done, total, result):
+        status = f"FAILED: {result.error}" if result.error else f"{result.seconds:.1f}s"
+        print(f"  [{done}/{total}] {result.water_year} {result.county}: {status}")
+
+    results = run_reports(dataset, boundary_gdf, jobs, args.out, args.format, args.workers, args.id_col, progress)
+    failed = [r for r in results if r.error]
+    print(f"Wrote {sum(len(r.paths) for r in results)} files to {args.out} in {time.perf_counter() - started:.1f}s ({len(failed)} failed)")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
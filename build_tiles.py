@@ -0,0 +1,39 @@
+# Pre-generates the subbasin vector tiles served to the summary-page map.
+#
+# The dashboards build the tiles on first start (background warm-up) when they
+# are missing or the boundary zip changed; run this at deploy time instead when
+# the static folder is read-only for the server process.
+#
+#   python build_tiles.py
+#   python build_tiles.py --boundary-zip data/final_boundary_fixed.zip --id-col ID --max-zoom 13
+import argparse
+import os
+import sys
+import time
+
+import water_accounting as wa
+from water_accounting.constants import DEFAULT_BOUNDARY_ZIP
+from water_accounting.tiles import MAX_ZOOM, MIN_ZOOM
+
+DEFAULT_TILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'tiles', 'subbasins')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate MVT tiles of the subbasin boundaries under static/.")
+    parser.add_argument('--boundary-zip', default=DEFAULT_BOUNDARY_ZIP, help="Zipped boundary shapefile")
+    parser.add_argument('--out', default=DEFAULT_TILES_DIR, help="Tile directory (default: static/tiles/subbasins)")
+    parser.add_argument('--id-col', help="Subbasin ID column of the shapefile (default: guessed)")
+    parser.add_argument('--min-zoom', type=int, default=MIN_ZOOM)
+    parser.add_argument('--max-zoom', type=int, default=MAX_ZOOM)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    metadata, diagnostics = wa.ensure_tiles(args.boundary_zip, args.out, args.id_col, min_zoom=args.min_zoom, max_zoom=args.max_zoom)
+    for diagnostic in diagnostics: print(f"[{diagnostic.level}] {diagnostic.message}", file=sys.stderr)
+    if metadata is None: return 1
+    print(f"{metadata['tile_count']} tiles (zoom {metadata['minzoom']}-{metadata['maxzoom']}, ID column {metadata['id_column']}) in {args.out} [{time.perf_counter() - started:.1f}s]")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,930 @@
+# Streamlit view layer shared by streamlit_app.py, features_streamlit.py and
+# modified_streamlit.py. All data work goes through the water_accounting engine;
+# this module only renders widgets, charts and diagnostics.
+import hashlib
+import html
+import json
+import os
+import shutil
+import time
+import urllib.parse
+import zipfile
+
+import streamlit as st
+import streamlit.components.v1 as components
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import yaml
+
+import water_accounting as wa
+from water_accounting.constants import CLASS_LABEL, DAM_SOURCE_TYPES, DEFAULT_BOUNDARY_ZIP, EXTRACTION_LABEL, RENEWABLE_OPTIONS, SOURCE_TYPE_LABELS, SUBBASIN_LABEL
+from water_accounting.cache import all_cache_stats, bounded_cache, estimate_bytes, get_cache
+from water_accounting.diagnostics import ERROR, INFO, WARNING
+from water_accounting.export import EXPORT_FORMATS, MULTI_SHEET_FORMATS, write_export
+from water_accounting.figures import (boundary_map_figure, comparison_figure, distribution_figure, extraction_trend_figure, heatmap_figure, scenario_figure, sorted_years_axis,
+                                      subbasin_colors, summary_bar_figure)
+from water_accounting.jobs import JobLimitError
+from water_accounting.pivots import COMPARISON_DIMENSIONS, COMPARISON_LABELS
+from water_accounting.reports import report_jobs, run_reports
+from water_accounting.scenarios import SCENARIO_LABELS, Scenario, run_scenarios
+from water_accounting.snapshot import SNAPSHOT_DIR_ENV, snapshot_fingerprint, snapshot_loader
+from water_accounting.validation import VALIDATION_LABELS
+
+ALL = wa.ALL
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.yaml')
+ADMIN_PAGE = "عیب‌یابی سامانه"
+HEATMAP_PAGE = "نقشه حرارتی برداشت"
+SCENARIO_PAGE = "سناریوهای مخزن سدها"
+# Vector tiles of the default boundary, served by Streamlit's static file server (enableStaticServing)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_URL = 'app/static'
+TILES_DIR = os.path.join(STATIC_DIR, 'tiles', 'subbasins')
+TILES_URL = f'{STATIC_URL}/tiles/subbasins'
+MAPLIBRE_DIR = os.path.join(STATIC_DIR, 'vendor', 'maplibre-gl') # Filled by seed_basemap.py
+# Job output (exports, report archives) is streamed from disk by the static file server instead of st.download_button's in-memory media store
+DOWNLOADS_DIR = os.path.join(STATIC_DIR, 'downloads')
+DOWNLOADS_URL = f'{STATIC_URL}/downloads'
+MAX_DOWNLOAD_BYTES = 200 * 1024 * 1024 # Streamlit's static file server refuses larger files
+
+# --- Cache Budgets ---
+MB = 1024 * 1024
+BOUNDARY_CACHE = dict(max_bytes=128 * MB, max_entries=16, ttl=3600) # Uploaded shapefiles, keyed by content hash
+SUMMARY_CACHE = dict(max_bytes=256 * MB, max_entries=64) # One SummaryView per dataset version and filter state
+SCENARIO_CACHE = dict(max_bytes=64 * MB, max_entries=32) # One ScenarioResult per dataset version, county and scenario
+PARTITION_CACHE = dict(max_bytes=512 * MB, max_entries=32) # One Dataset partition per dataset version and access scope
+
+
+# --- Cached Engine Access ---
+@st.cache_resource(show_spinner=False)
+def get_store():
+    """The per-process dataset store; its watcher swaps in a new version when a source file changes.
+
+    Under serve.py (multi-process mode) the store follows the loader's memory-mapped snapshots instead.
+    """
+    snapshot_root = os.environ.get(SNAPSHOT_DIR_ENV)
+    if snapshot_root: store = wa.DatasetStore(loader=snapshot_loader(snapshot_root), fingerprint=lambda specs: snapshot_fingerprint(snapshot_root))
+    else: store = wa.DatasetStore()
+    store.add_prepare_hook(warm_default_view) # A new version is warmed before sessions can see it
+    store.add_prepare_hook(warm_partitions)
+    return store.start_watching()
+
+
+def get_dataset():
+    """The current dataset version; callers must treat the frames as read-only."""
+    store = get_store()
+    if store.version: return store.current()
+    with st.spinner("در حال بارگذاری داده‌ها..."): return store.current()
+
+
+def user_scope(username):
+    """The rows `username` may see, per config.yaml `access`."""
+    return wa.access_scope(load_app_config().get('access'), username)
+
+
+@bounded_cache('access_partitions', key=lambda dataset, scope: (dataset.version, scope), **PARTITION_CACHE)
+def dataset_partition(dataset, scope):
+    """The slice of `dataset` a restricted scope may see, with its own catalog, indexes and pivots."""
+    return wa.partition_dataset(dataset, scope)
+
+
+def user_dataset(dataset, username):
+    """`dataset` as `username` may see it: the full dataset, or their precomputed partition."""
+    scope = user_scope(username)
+    return dataset if scope.unrestricted else dataset_partition(dataset, scope)
+
+
+def session_dataset(username):
+    """get_dataset() for a script run, restricted to what `username` may see.
+
+    Call once and pass it on, so the whole rerun sees one version.
+    """
+    dataset = user_dataset(get_dataset(), username)
+    if dataset.scope is not None: st.sidebar.caption(f"🔒 دسترسی محدود به: {dataset.scope.describe() or 'هیچ داده‌ای'}")
+    previous = st.session_state.get('_dataset_version')
+    if previous is not None and previous != dataset.version: st.toast("داده‌ها به‌روزرسانی شدند.", icon="🔄")
+    st.session_state['_dataset_version'] = dataset.version
+    return dataset
+
+
+@bounded_cache('uploaded_boundaries', key=lambda data: hashlib.sha1(data).hexdigest(), **BOUNDARY_CACHE)
+def read_boundary_bytes(data):
+    return wa.read_boundary_zip(data)
+
+
+@bounded_cache('default_boundary', max_entries=1)
+def default_boundary():
+    """The bundled subbasin boundaries (data/final_boundary_fixed.zip), shown until a shapefile is uploaded."""
+    return wa.read_boundary_file(DEFAULT_BOUNDARY_ZIP)
+
+
+@bounded_cache('boundary_tiles', max_entries=1)
+def default_boundary_tiles():
+    """Tile metadata of the default boundary, (re)generating the tiles under static/ if the zip changed."""
+    return wa.ensure_tiles(DEFAULT_BOUNDARY_ZIP, TILES_DIR)
+
+
+@bounded_cache('basemap', max_entries=1, ttl=60)
+def basemap_settings():
+    """Basemap per config.yaml `basemap.mode`: 'auto' (local cache once seeded, else online), 'offline' or 'online'.
+
+    Returns a wa.Basemap, or None for a blank background (offline without a seeded cache).
+    """
+    config = load_app_config().get('basemap') or {}
+    mode, folder = config.get('mode', 'auto'), config.get('dir', 'basemap')
+    if mode == 'online': return wa.ONLINE_BASEMAP
+    local = wa.local_basemap(os.path.join(STATIC_DIR, folder), f'{STATIC_URL}/{folder}')
+    if local is not None: return local
+    return None if mode == 'offline' else wa.ONLINE_BASEMAP
+
+
+def maplibre_urls():
+    """(script, stylesheet) URLs of MapLibre GL: the local copy if seeded, else the CDN unless offline; None if unavailable."""
+    js, css = wa.basemap.MAPLIBRE_FILES
+    if all(os.path.exists(os.path.join(MAPLIBRE_DIR, name)) for name in (js, css)): return f'{STATIC_URL}/vendor/maplibre-gl/{js}', f'{STATIC_URL}/vendor/maplibre-gl/{css}'
+    if (load_app_config().get('basemap') or {}).get('mode') == 'offline': return None
+    return wa.basemap.MAPLIBRE_CDN + js, wa.basemap.MAPLIBRE_CDN + css
+
+
+@bounded_cache('summary_views', key=lambda dataset, water_years, county, filters: (dataset.cache_key, tuple(water_years), county, filters), **SUMMARY_CACHE)
+def get_summary_view(dataset, water_years, county, filters):
+    """Summary-page aggregates per dataset version and filter state."""
+    return wa.summary_view(dataset.frame, list(water_years), county, filters)
+
+
+@bounded_cache('reservoir_scenarios', key=lambda dataset, county, scenario: (dataset.cache_key, county, scenario), **SCENARIO_CACHE)
+def get_scenario_result(dataset, county, scenario):
+    """Monte Carlo storage and shortfall statistics of the dams in `county` under `scenario`."""
+    return run_scenarios(wa.filter_global(dataset.balance, [], county), scenario)
+
+
+@bounded_cache('forecasts', key=lambda dataset: dataset.cache_key, max_entries=8)
+def get_forecast(dataset):
+    """Next-year trend projections of every extraction series, fitted once per dataset version."""
+    return wa.build_forecast(dataset.frame)
+
+
+@st.cache_resource(show_spinner=False)
+def load_app_config():
+    """config.yaml as a dict (empty if missing); read once per process."""
+    try:
+        with open(CONFIG_PATH, encoding='utf-8') as file: return yaml.safe_load(file) or {}
+    except FileNotFoundError: return {}
+
+
+def is_admin(username):
+    return bool(username) and username in (load_app_config().get('admins') or [])
+
+
+def page_options(username):
+    """Dashboard pages offered to this user; the diagnostics page is admin-only."""
+    return ["تحلیل جزئی", "خلاصه بیلان آب", HEATMAP_PAGE, SCENARIO_PAGE] + ([ADMIN_PAGE] if is_admin(username) else [])
+
+
+# --- Warm-up ---
+def warm_default_view(dataset=None):
+    """Computes what the first analyst sees: latest water year, all counties, default summary filters."""
+    if dataset is None: dataset = get_dataset()
+    catalog = dataset.catalog
+    catalog.options('County', include_unknown=False)
+    latest = (catalog.latest_year,) if catalog.latest_year else ()
+    get_summary_view(dataset, latest, ALL, wa.SummaryFilters())
+
+
+def warm_partitions(dataset):
+    """Builds the partition of every restricted scope in config.yaml, so restricted users never wait for one."""
+    for scope in wa.configured_scopes(load_app_config().get('access')): dataset_partition(dataset, scope)
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_api():
+    """The read-only JSON API on the dashboard's store (config.yaml `api`), or None if disabled, without valid tokens or the port is taken.
+
+    Tokens share the dashboard's access partitions. Under serve.py the workers
+    leave it to serve.py, which runs it once on the loader's store.
+    """
+    app_config = load_app_config()
+    config = app_config.get('api') or {}
+    if not config.get('enabled') or os.environ.get(SNAPSHOT_DIR_ENV): return None
+    try:
+        tokens = wa.api.token_scopes(config, app_config.get('access'))
+        return wa.QueryApi(get_store(), tokens, host=config.get('host', wa.api.DEFAULT_HOST), port=config.get('port', wa.api.DEFAULT_PORT), partition=dataset_partition).start()
+    except (OSError, ValueError): return None # No usable tokens, or the port is taken, e.g. by another dashboard script already serving the API
+
+
+@st.cache_resource(show_spinner=False)
+def get_warmup():
+    """Starts the per-process warm-up thread (and the query API, if configured) on the first script run, before anyone logs in."""
+    get_query_api()
+    return wa.Warmup([
+        ('ingest', "بارگذاری داده‌ها", get_dataset),
+        ('boundary', "کاشی‌های نقشه زیرحوضه‌ها", default_boundary_tiles),
+        ('aggregates', "نمای پیش‌فرض", warm_default_view),
+    ]).start()
+
+
+def sidebar_readiness(warmup):
+    """Sidebar indicator of the warm-up; never blocks."""
+    if warmup.ready:
+        st.sidebar.caption("🟢 داده‌ها آماده است")
+    elif warmup.finished:
+        failed = [step.label for step in warmup.steps if step.status == wa.warmup.FAILED]
+        st.sidebar.caption(f"🟠 آماده‌سازی با خطا همراه بود: {'، '.join(failed)}")
+    else:
+        current = warmup.current
+        st.sidebar.progress(warmup.progress, text=f"⏳ در حال آماده‌سازی: {current.label if current else '...'}")
+
+
+# --- Background Jobs ---
+JOB_POLL_SECONDS = 1.0
+JOB_STATUS_LABELS = {'pending': "در صف", 'running': "در حال اجرا", 'done': "انجام شد", 'failed': "ناموفق", 'cancelled': "لغو شد"}
+
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """The per-process job queue; config.yaml `jobs` sets the worker cap and the active jobs allowed per user."""
+    config = load_app_config().get('jobs') or {}
+    queue = wa.JobQueue(max_workers=config.get('max_workers', wa.jobs.DEFAULT_WORKERS), max_per_owner=config.get('max_per_user', wa.jobs.DEFAULT_PER_OWNER),
+                        workdir_root=DOWNLOADS_DIR)
+    queue.remove_stale_workdirs()
+    return queue
+
+
+def session_jobs():
+    """This session's job registry: {slot: Job}."""
+    return st.session_state.setdefault('jobs', {})
+
+
+def submit_job(slot, label, func, *args, **kwargs):
+    """Starts `func(job, *args, **kwargs)` in the background under `slot`, replacing the slot's previous job; returns the Job or None."""
+    queue = get_job_queue()
+    owner = st.session_state.get('username') or 'anonymous'
+    previous = session_jobs().pop(slot, None)
+    if previous is not None: queue.discard(previous)
+    try: job = queue.submit(owner, label, func, *args, **kwargs)
+    except JobLimitError:
+        st.warning(f"حداکثر {queue.max_per_owner} کار سنگین هم‌زمان مجاز است؛ لطفاً تا پایان کارهای قبلی صبر کنید.")
+        return None
+    session_jobs()[slot] = job
+    return job
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _job_progress(slot):
+    job = session_jobs().get(slot)
+    if job is None: return
+    if not job.active:
+        st.rerun() # Hand the result to the full page
+    text = f"⏳ {job.label}" + (f": {job.message}" if job.message else "") + (" (در صف)" if job.status == wa.jobs.PENDING else "")
+    st.progress(job.progress, text=text)
+    if job.cancel_requested: st.caption("در حال لغو...")
+    elif st.button("لغو", key=f"{slot}_cancel"): job.cancel()
+
+
+def job_result(slot):
+    """Progress and cancel controls while the job in `slot` runs (polled without rerunning the page); the finished Job afterwards, else None.
+
+    Failed and cancelled jobs are reported here and also returned, with no result.
+    """
+    job = session_jobs().get(slot)
+    if job is None: return None
+    if job.active:
+        _job_progress(slot)
+        return None
+    if job.status == wa.jobs.FAILED: st.error(f"{job.label} ناموفق بود: {job.error}")
+    elif job.status == wa.jobs.CANCELLED: st.info(f"{job.label} لغو شد.")
+    return job
+
+
+def check_download_size(path):
+    """Raises if `path` is too large for the static file server; returns it otherwise."""
+    if os.path.getsize(path) > MAX_DOWNLOAD_BYTES:
+        raise RuntimeError(f"فایل بزرگ‌تر از {MAX_DOWNLOAD_BYTES // MB} مگابایت است؛ قالب Parquet یا فیلترهای محدودتر را انتخاب کنید.")
+    return path
+
+
+def download_link(path, label):
+    """A link to a job's output file under DOWNLOADS_DIR; the browser downloads it straight from disk."""
+    relative = os.path.relpath(path, DOWNLOADS_DIR).split(os.sep)
+    url = f"{DOWNLOADS_URL}/{'/'.join(urllib.parse.quote(part) for part in relative)}"
+    st.markdown(f'<a href="{html.escape(url)}" download="{html.escape(os.path.basename(path))}">📥 {html.escape(label)}</a>', unsafe_allow_html=True)
+
+
+def _copy_job(job, source):
+    job.report(0, "کپی فایل")
+    target = os.path.join(job.workdir(), os.path.basename(source))
+    shutil.copyfile(source, target)
+    return check_download_size(target)
+
+
+def _read_boundary_job(job, data):
+    job.report(0, "خواندن و تبدیل مختصات شیپ‌فایل")
+    return read_boundary_bytes(data) # Also cached, so the same zip uploaded again is not read again
+
+
+def load_shapefile(uploaded_file):
+    """Loads a shapefile from an uploaded zip file, showing any problems; None while it is still being read.
+
+    A shapefile not read before is read by a background job, so the page stays
+    responsive; its result is kept on the job, so a cache eviction never makes a
+    rerun read the file itself. A failed or cancelled read can be started again.
+    """
+    data = uploaded_file.getvalue()
+    slot = f"boundary_{uploaded_file.file_id}"
+    job = session_jobs().get(slot)
+    if job is not None and job.status == wa.jobs.DONE: result = job.result
+    elif hashlib.sha1(data).hexdigest() in read_boundary_bytes.cache: result = read_boundary_bytes(data)
+    else:
+        retry = job is not None and job.status in (wa.jobs.FAILED, wa.jobs.CANCELLED) and st.button("خواندن دوباره شیپ‌فایل", key=f"{slot}_retry")
+        if job is None or retry: submit_job(slot, "بارگذاری شیپ‌فایل", _read_boundary_job, data)
+        job = job_result(slot)
+        if job is None or job.status != wa.jobs.DONE: return None
+        result = job.result
+    show_diagnostics(result.diagnostics)
+    return result.gdf
+
+
+def show_diagnostics(diagnostics, container=st):
+    """Renders engine diagnostics with the matching Streamlit status element."""
+    for d in diagnostics:
+        if d.level == ERROR: container.error(d.message)
+        elif d.level == WARNING: container.warning(d.message)
+        elif d.level == INFO: container.info(d.message)
+
+
+def _export_job(job, sheets, fmt, file_name):
+    path = os.path.join(job.workdir(), file_name)
+    try:
+        with open(path, 'wb') as file: write_export(sheets, fmt, file, progress=lambda fraction: job.report(fraction, "نوشتن فایل"))
+    except ImportError as e: raise RuntimeError(f"کتابخانه لازم برای قالب {EXPORT_FORMATS[fmt][0]} نصب نیست: {e.name}") from e
+    return check_download_size(path)
+
+
+def display_export(sheets, key, file_base):
+    """Download controls for the given tables ({sheet name: frame}).
+
+    The file is written chunk by chunk by a background job only after the analyst
+    asks for it, so reruns that do not export cost nothing and the page stays usable meanwhile.
+    """
+    with st.expander("📥 دریافت داده‌ها"):
+        fmt = st.radio("قالب فایل", list(EXPORT_FORMATS), format_func=lambda f: EXPORT_FORMATS[f][0], horizontal=True, key=f"{key}_format")
+        if fmt not in MULTI_SHEET_FORMATS and len(sheets) > 1:
+            name = st.selectbox("جدول", list(sheets), key=f"{key}_table")
+            sheets = {name: sheets[name]}
+        if st.button("آماده‌سازی فایل", key=f"{key}_prepare"): submit_job(f"{key}_export", f"آماده‌سازی فایل {EXPORT_FORMATS[fmt][0]}", _export_job, sheets, fmt, f"{file_base}.{fmt}")
+        job = job_result(f"{key}_export")
+        if job is None or job.status != wa.jobs.DONE or not os.path.exists(job.result): return
+        label = EXPORT_FORMATS[os.path.splitext(job.result)[1].lstrip('.')][0]
+        download_link(job.result, f"دریافت فایل {label}")
+
+
+def years_caption(selected_water_years):
+    return ', '.join(selected_water_years)
+
+
+# --- Detailed Analysis Page ---
+def gw_well_counts(dataset, df_gw_viz_filtered, by, scope, gw_filters):
+    """Distinct wells per value of `by`, merged from the dataset's partition sketch when available."""
+    if dataset is None or dataset.well_sketch is None: return wa.well_counts(df_gw_viz_filtered, by)
+    return dataset.well_sketch.count(by, **scope, **gw_filters.as_dimensions())
+
+
+def display_balance_closure(balance, selected_water_years, selected_county_sidebar, selected_dam=ALL):
+    """Closure residual ranking of the dam-years in scope, from the balance table cached with the dataset."""
+    table = wa.filters.filter_equals(wa.filter_global(balance, selected_water_years, selected_county_sidebar), 'Source_Name', selected_dam)
+    st.subheader("بستگی بیلان سد: ΔS − (ورودی − خروجی) (MCM)")
+    if table.empty:
+        st.info("داده‌ای برای محاسبه بستگی بیلان موجود نیست.")
+        return
+    bcol1, bcol2 = st.columns(2)
+    bcol1.metric("تعداد سال-سدهای ناهنجار", f"{int(table['Anomaly'].sum())} از {len(table)}")
+    bcol2.metric("بیشترین باقیمانده مطلق", f"{table['Residual'].abs().max():,.2f}")
+    fig_residual = px.bar(table, x='Water_Year_Str', y='Residual', color='Source_Name', barmode='group', title="باقیمانده بیلان به تفکیک سال", labels={'Water_Year_Str': 'سال آبی', 'Residual': 'باقیمانده (MCM)', 'Source_Name': 'سد'})
+    st.plotly_chart(sorted_years_axis(fig_residual, table['Water_Year_Str']), use_container_width=True)
+    anomalies_only = st.checkbox("فقط نمایش ناهنجاری‌ها", key="balance_anomalies_only")
+    ranking = wa.residual_ranking(table, anomalies_only=anomalies_only)
+    st.dataframe(ranking[[col for col in wa.BALANCE_LABELS if col in ranking.columns]].rename(columns=wa.BALANCE_LABELS), use_container_width=True, hide_index=True)
+
+
+def display_worst_offenders(wells, selected_county_sidebar, gw_filters):
+    """Ranked over-extracting wells over all years, from the per-well trends cached with the dataset."""
+    st.subheader("⚠️ چاه‌های با بیشترین اضافه برداشت (همه سال‌ها)")
+    limit = st.slider("تعداد چاه‌ها", min_value=10, max_value=200, value=25, step=5, key="worst_offenders_limit")
+    offenders = wa.worst_offenders(wells, limit, County=selected_county_sidebar, Usage_Type=gw_filters.usage_type, Well_Type=gw_filters.well_type, Well_Status=gw_filters.well_status)
+    if offenders.empty:
+        st.info("چاهی با اضافه برداشت برای فیلترهای انتخاب شده یافت نشد.")
+        return
+    st.caption(f"اضافه برداشت مداوم: حداقل {wa.wells.PERSISTENT_YEARS} سال متوالی با اضافه برداشت مثبت.")
+    st.dataframe(offenders[[col for col in wa.WELL_TREND_LABELS if col in offenders.columns]].rename(columns=wa.WELL_TREND_LABELS), use_container_width=True, hide_index=True)
+
+
+def display_well_lookup(well_index):
+    """Finds one well by subscription, electricity subscription or well ID and shows its full history."""
+    st.subheader("🔎 جستجوی چاه")
+    if not well_index.columns:
+        st.info("ستون شناسه چاه یا اشتراک در داده‌های آب زیرزمینی موجود نیست.")
+        return
+    query = st.text_input(f"شناسه یا ابتدای آن ({'، '.join(wa.ID_LABELS[col] for col in well_index.columns)})", key="well_lookup_query")
+    matches = well_index.search(query)
+    if not query.strip(): return
+    if not matches:
+        st.info("چاهی با این شناسه یافت نشد.")
+        return
+    col, value = st.selectbox("نتایج", matches, format_func=lambda match: f"{wa.ID_LABELS[match[0]]}: {match[1]}", key="well_lookup_match")
+    history = well_index.history(value, col)
+    if 'Actual_Extraction_m3' in history.columns:
+        fig_history = px.line(history, x='Water_Year_Str', y='Actual_Extraction_m3', markers=True, title=f"برداشت سالانه چاه {value}", labels={'Water_Year_Str': 'سال آبی', 'Actual_Extraction_m3': 'برداشت واقعی (m3)'})
+        st.plotly_chart(sorted_years_axis(fig_history, history['Water_Year_Str']), use_container_width=True)
+    st.dataframe(history, use_container_width=True, hide_index=True)
+
+
+def display_detailed_analysis(catalog, df_dam_viz, df_gw_viz, selected_water_years, selected_county_sidebar, dataset=None):
+    """Displays the detailed charts and tables; widget options come from the dimension catalog.
+
+    `dataset` supplies the per-dam and per-well tables precomputed at ingest; their sections are skipped without it.
+    """
+    scope = {'Water_Year_Str': selected_water_years, 'County': selected_county_sidebar}
+    st.title("💧 داشبورد حسابداری آب - تحلیل جزئی")
+    st.header("🌊 تحلیل داده‌های سد و آب انتقالی")
+    if df_dam_viz is None or df_dam_viz.empty:
+        st.warning(f"داده‌ای برای سد/انتقالی با فیلترهای انتخاب شده یافت نشد (سال آبی: {selected_water_years}, شهرستان: {selected_county_sidebar}).")
+    else:
+        dam_names = catalog.source_names(DAM_SOURCE_TYPES, **scope)
+        selected_dam = st.selectbox("انتخاب سد / منبع انتقالی", dam_names, key="dam_select_detail")
+        df_dam_viz_filtered = wa.filters.filter_equals(df_dam_viz, 'Source_Name', selected_dam) # Measures are already typed at ingest
+        if not df_dam_viz_filtered.empty:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.subheader("حجم آب سد (MCM)")
+                fig_dam_vol = px.line(df_dam_viz_filtered, x='Water_Year_Str', y=['Volume_Start_Year', 'Volume_End_Year'], title=f"حجم آب برای {selected_dam}", labels={'Water_Year_Str': 'سال آبی', 'value': 'حجم (میلیون متر مکعب)', 'variable': 'اندازه‌گیری'}, markers=True)
+                st.plotly_chart(sorted_years_axis(fig_dam_vol, df_dam_viz_filtered['Water_Year_Str']), use_container_width=True)
+            with col2:
+                st.subheader("تراز آب سد (m)")
+                fig_dam_level = px.line(df_dam_viz_filtered, x='Water_Year_Str', y=['Level_Start_Year', 'Level_End_Year'], title=f"تراز آب برای {selected_dam}", labels={'Water_Year_Str': 'سال آبی', 'value': 'تراز (متر)', 'variable': 'اندازه‌گیری'}, markers=True)
+                st.plotly_chart(sorted_years_axis(fig_dam_level, df_dam_viz_filtered['Water_Year_Str']), use_container_width=True)
+            st.subheader(f"مولفه‌های بیلان آب برای {selected_dam} (MCM)")
+            df_balance_melt = wa.dam_balance(df_dam_viz_filtered, selected_dam)
+            if not df_balance_melt.empty:
+                title_suffix = "(تجمیعی)" if selected_dam == ALL else f"برای {selected_dam}"
+                fig_balance = px.bar(df_balance_melt, x='Water_Year_Str', y='حجم (MCM)', color='مولفه', title=f"مولفه‌های بیلان آب {title_suffix} ({years_caption(selected_water_years)})", labels={'Water_Year_Str': 'سال آبی'}, barmode='group')
+                st.plotly_chart(sorted_years_axis(fig_balance, df_balance_melt['Water_Year_Str']), use_container_width=True)
+            else: st.info("داده‌های مولفه‌های بیلان برای نمایش موجود نیست.")
+            if dataset is not None: display_balance_closure(dataset.balance, selected_water_years, selected_county_sidebar, selected_dam)
+            st.subheader(f"داده‌های فیلتر شده سد/انتقالی ({selected_dam})")
+            st.dataframe(df_dam_viz_filtered)
+            display_export({"سد و انتقالی": df_dam_viz_filtered}, "export_dam", "dam_transfer")
+        else: st.warning(f"داده‌ای برای سد/انتقالی با فیلترهای انتخاب شده یافت نشد (سال آبی: {selected_water_years}, شهرستان: {selected_county_sidebar}, منبع: {selected_dam}).")
+
+    st.divider()
+    st.header("🌍 تحلیل داده‌های آب زیرزمینی")
+    if df_gw_viz is None or df_gw_viz.empty:
+        st.warning(f"داده‌ای برای آب زیرزمینی با فیلترهای انتخاب شده یافت نشد (سال آبی: {selected_water_years}, شهرستان: {selected_county_sidebar}).")
+        return
+    selected_gw_usage = st.selectbox("انتخاب نوع کاربری آب زیرزمینی", catalog.groundwater_options('Usage_Type', **scope), key="gw_usage_detail")
+    selected_well_type = ALL
+    if 'Well_Type' in df_gw_viz.columns: selected_well_type = st.selectbox("انتخاب نوع چاه", catalog.groundwater_options('Well_Type', **scope), key="gw_well_type_detail")
+    selected_well_status = ALL
+    if 'Well_Status' in df_gw_viz.columns: selected_well_status = st.selectbox("انتخاب وضعیت چاه", catalog.groundwater_options('Well_Status', **scope), key="gw_status_detail")
+    gw_filters = wa.GroundwaterFilters(selected_gw_usage, selected_well_type, selected_well_status)
+    df_gw_viz_filtered = wa.filter_groundwater(df_gw_viz, gw_filters)
+    if df_gw_viz_filtered.empty:
+        st.warning(f"داده‌ای برای آب زیرزمینی با فیلترهای انتخاب شده یافت نشد.")
+        return
+
+    summary = wa.groundwater_summary(df_gw_viz_filtered)
+    st.subheader("مقادیر خلاصه (فیلتر شده)")
+    mcol1, mcol2, mcol3 = st.columns(3)
+    mcol1.metric("مجموع برداشت (میلیون متر مکعب)", f"{summary.total_extraction_mcm:,.2f}")
+    mcol2.metric("میانگین عمق چاه (متر)", f"{summary.avg_depth_m:.1f}" if not pd.isna(summary.avg_depth_m) else "N/A")
+    mcol3.metric("تعداد زیرحوضه‌های فعال", f"{summary.num_subbasins}")
+    st.subheader("مجموع برداشت آب زیرزمینی بر اساس سال آبی و نوع کاربری (MCM)")
+    df_gw_agg_usage = wa.groundwater_usage_by_year(df_gw_viz_filtered)
+    fig_gw_usage = px.bar(df_gw_agg_usage, x='Water_Year_Str', y='Extraction_MCM', color='Usage_Type', title=f"برداشت سالانه آب زیرزمینی بر اساس نوع کاربری ({years_caption(selected_water_years)})", labels={'Water_Year_Str': 'سال آبی', 'Extraction_MCM': 'مجموع برداشت (میلیون متر مکعب)'})
+    st.plotly_chart(sorted_years_axis(fig_gw_usage, df_gw_agg_usage['Water_Year_Str']), use_container_width=True)
+    col3, col4 = st.columns(2)
+    with col3:
+        if 'Well_Type' in df_gw_viz_filtered.columns:
+            st.subheader("توزیع نوع چاه (بر اساس تعداد)")
+            fig_gw_type = px.pie(gw_well_counts(dataset, df_gw_viz_filtered, 'Well_Type', scope, gw_filters), names='Well_Type', values='Count', title="توزیع انواع چاه", hole=0.3)
+            st.plotly_chart(fig_gw_type, use_container_width=True)
+        else: st.info("داده نوع چاه موجود نیست.")
+    with col4:
+        if 'Well_Status' in df_gw_viz_filtered.columns:
+            st.subheader("توزیع وضعیت چاه (بر اساس تعداد)")
+            fig_gw_status = px.pie(gw_well_counts(dataset, df_gw_viz_filtered, 'Well_Status', scope, gw_filters), names='Well_Status', values='Count', title="توزیع وضعیت چاه‌ها", hole=0.3)
+            st.plotly_chart(fig_gw_status, use_container_width=True)
+        else: st.info("داده وضعیت چاه موجود نیست.")
+    df_scatter = wa.extraction_scatter_frame(df_gw_viz_filtered)
+    if df_scatter is None: st.info("ستون‌های لازم برای نمودار پراکندگی موجود نیستند.")
+    elif df_scatter.empty: st.info("داده‌ای با برداشت و ساعات کارکرد مثبت برای نمودار پراکندگی وجود ندارد.")
+    else:
+        st.subheader("برداشت (MCM) در مقابل ساعات کارکرد")
+        fig_scatter = px.scatter(df_scatter, x='Operating_Hours', y='Extraction_MCM', color='Usage_Type', size='Flow_Rate_ls', hover_name='ID', title="برداشت در مقابل ساعات کارکرد (اندازه بر اساس دبی)", labels={'Operating_Hours': 'ساعات کارکرد', 'Extraction_MCM': 'برداشت (میلیون متر مکعب)'})
+        st.plotly_chart(fig_scatter, use_container_width=True)
+    if dataset is not None:
+        display_worst_offenders(dataset.wells, selected_county_sidebar, gw_filters)
+        display_well_lookup(dataset.well_index)
+    st.subheader("داده‌های فیلتر شده آب زیرزمینی")
+    st.dataframe(df_gw_viz_filtered)
+    display_export({"آب زیرزمینی": df_gw_viz_filtered}, "export_gw", "groundwater")
+
+
+# --- Water Balance Summary Page ---
+def summary_filter_widgets(catalog, selected_water_years, selected_county_sidebar):
+    """Renders the summary-page filters and returns them as SummaryFilters."""
+    scope = {'Water_Year_Str': selected_water_years, 'County': selected_county_sidebar}
+    col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+    with col_f1: # County
+        county_options = catalog.options('County', include_unknown=False, Water_Year_Str=selected_water_years)
+        disabled_county = selected_county_sidebar != ALL
+        if disabled_county and selected_county_sidebar not in county_options: county_options.append(selected_county_sidebar)
+        selected_county_summary = st.selectbox("شهرستان", options=county_options, key="county_summary_filter", index=county_options.index(selected_county_sidebar) if disabled_county else 0, disabled=disabled_county)
+        if disabled_county: st.caption(f"فیلتر شهرستان '{selected_county_sidebar}' اعمال شده است.")
+    current_county = selected_county_sidebar if disabled_county else selected_county_summary
+    with col_f2: # Study Area
+        selected_study_area = st.selectbox("محدوده مطالعاتی", options=catalog.groundwater_options('Study_Area', Water_Year_Str=selected_water_years, County=current_county), key="study_area_filter")
+    with col_f3: # Usage Type
+        selected_usage_type = st.selectbox("نوع کاربری", options=catalog.options('Usage_Type', include_unknown=False, **scope), key="usage_type_filter")
+    with col_f4: # Source Classification
+        selected_source_type_display = st.selectbox("طبقه‌بندی منبع", options=wa.source_type_labels(catalog.options('Source_Type', **scope)), key="source_type_filter")
+    selected_renewable_status = st.selectbox("تجدیدپذیری", options=RENEWABLE_OPTIONS, key="renewable_filter")
+    return wa.SummaryFilters(ALL if disabled_county else selected_county_summary, selected_study_area, selected_usage_type,
+                             SOURCE_TYPE_LABELS.get(selected_source_type_display, "All"), selected_renewable_status)
+
+
+def display_summary_metrics(dataset, totals):
+    st.subheader("خلاصه مقادیر برداشت (میلیون متر مکعب - MCM)")
+    metric_col1, metric_col2, metric_col3, metric_col4 = st.columns(4)
+    metric_col1.metric("برداشت آب سطحی (سدها)", f"{totals[wa.SURFACE]:,.2f}")
+    metric_col2.metric("برداشت آب زیرزمینی", f"{totals[wa.GROUNDWATER]:,.2f}")
+    metric_col3.metric("برداشت آب انتقالی", f"{totals[wa.TRANSFER]:,.2f}" if dataset.has_source(wa.TRANSFER) else "N/A")
+    metric_col4.metric("تصفیه خانه", f"{totals[wa.WASTEWATER]:,.2f}" if dataset.has_source(wa.WASTEWATER) else "N/A")
+
+
+def display_summary_table(summary):
+    """Shows the aggregated summary table of a SummaryView and returns it (empty if nothing to show)."""
+    st.subheader("جدول خلاصه داده‌های فیلتر شده")
+    if summary.frame.empty:
+        st.warning("داده‌ای برای نمایش در جدول با فیلترهای انتخاب شده یافت نشد.")
+        return pd.DataFrame()
+    aggregated_table = summary.table
+    if aggregated_table.empty: st.warning("ستون‌های لازم برای ایجاد جدول خلاصه یافت نشدند.")
+    else: st.dataframe(aggregated_table.style.format({EXTRACTION_LABEL: '{:,.2f}'}))
+    return aggregated_table
+
+
+def trend_projection(forecast, filters, selected_county_sidebar):
+    """Projection per source type for the summary filters, or None if the filters go beyond the forecast's series."""
+    if forecast is None or filters is None: return None
+    if filters.study_area != ALL or filters.renewable_status != ALL:
+        st.caption("پیش‌بینی برای فیلترهای محدوده مطالعاتی و تجدیدپذیری در دسترس نیست.")
+        return None
+    county = filters.county if filters.county != ALL else selected_county_sidebar
+    return forecast.table(by='Source_Type', county=county, usage_type=filters.usage_type, source_type=filters.source_type)
+
+
+def display_forecast_table(forecast, filters, selected_county_sidebar):
+    """Next-year projections grouped by subbasin, county, usage or source type."""
+    with st.expander(f"📈 پیش‌بینی برداشت {forecast.next_year}"):
+        st.caption(f"روند خطی هر سری (زیرحوضه × شهرستان × کاربری × منبع) بر اساس {len(forecast.years)} سال آبی؛ سری‌های با کمتر از {wa.forecast.MIN_TREND_YEARS} سال داده با میانگین پیش‌بینی می‌شوند.")
+        by = st.radio("تجمیع بر اساس", wa.FORECAST_KEYS, format_func=wa.FORECAST_LABELS.get, horizontal=True, key="forecast_by")
+        county = filters.county if filters.county != ALL else selected_county_sidebar
+        table = forecast.table(by=by, county=county, usage_type=filters.usage_type, source_type=filters.source_type)
+        st.dataframe(table.rename(columns=wa.FORECAST_LABELS).round(3), use_container_width=True, hide_index=True)
+
+
+def display_summary_charts(aggregated_table, df_summary_filtered, selected_water_years, forecast=None, filters=None, selected_county_sidebar=ALL):
+    st.divider()
+    st.subheader("نمودار داده‌های خلاصه شده")
+    if aggregated_table.empty:
+        st.warning("داده‌ای در جدول خلاصه برای رسم نمودار وجود ندارد.")
+        return
+    chart_type = st.radio("انتخاب نوع نمودار:", ('میله‌ای', 'خطی', 'دایره‌ای'), key="chart_select", horizontal=True)
+    try:
+        if chart_type == 'میله‌ای': st.plotly_chart(summary_bar_figure(aggregated_table), use_container_width=True)
+        elif chart_type == 'خطی':
+            if len(selected_water_years) > 1:
+                show_projection = forecast is not None and st.checkbox(f"نمایش پیش‌بینی {forecast.next_year}", value=True, key="trend_projection")
+                projection = trend_projection(forecast, filters, selected_county_sidebar) if show_projection else None
+                st.plotly_chart(extraction_trend_figure(df_summary_filtered, projection, forecast.next_year if forecast else None), use_container_width=True)
+                if forecast is not None and filters is not None: display_forecast_table(forecast, filters, selected_county_sidebar)
+            else: st.warning("نمودار خطی برای نمایش روند، نیاز به انتخاب حداقل دو سال آبی در فیلتر عمومی دارد.")
+        elif chart_type == 'دایره‌ای':
+            pie_col = st.selectbox("نمایش توزیع بر اساس:", ('طبقه‌بندی منبع', 'کاربری', 'شهرستان'), key="pie_col_select")
+            if pie_col in aggregated_table.columns:
+                fig_chart = distribution_figure(aggregated_table, pie_col)
+                if fig_chart is not None: st.plotly_chart(fig_chart, use_container_width=True)
+                else: st.warning(f"داده‌ای با مقدار برداشت مثبت برای نمایش نمودار دایره‌ای بر اساس '{pie_col}' وجود ندارد.")
+            else: st.warning(f"ستون '{pie_col}' برای رسم نمودار دایره‌ای در داده‌های تجمیع شده یافت نشد.")
+    except Exception as e: st.error(f"خطا در رسم نمودار: {e}")
+
+
+def display_boundary_map(aggregated_table):
+    """Shapefile upload plus the subbasin choropleth of the summary table."""
+    st.divider()
+    st.subheader("نقشه محدوده و برداشت")
+    uploaded_shp_zip = st.file_uploader("آپلود شیپ‌فایل محدوده (فایل .zip)", type="zip", key="shp_uploader")
+    if uploaded_shp_zip is None:
+        metadata, _ = default_boundary_tiles()
+        if metadata is not None and maplibre_urls() is not None:
+            st.caption("نمایش مرز پیش‌فرض زیرحوضه‌ها؛ برای استفاده از مرز دیگر شیپ‌فایل آپلود کنید.")
+            display_tile_map(aggregated_table, metadata)
+            return
+        result = default_boundary() # Tiles or MapLibre unavailable (e.g. read-only static folder, offline): embed the geometry instead
+        if result.gdf is None: return
+        gdf = result.gdf
+        st.caption("نمایش مرز پیش‌فرض زیرحوضه‌ها؛ برای استفاده از مرز دیگر شیپ‌فایل آپلود کنید.")
+    else:
+        gdf = load_shapefile(uploaded_shp_zip)
+        if gdf is None: return
+        st.success("شیپ‌فایل با موفقیت بارگذاری و خوانده شد.")
+    shp_cols = gdf.columns.tolist()
+    id_col_shp = st.selectbox("انتخاب ستون شناسه (ID) در شیپ‌فایل برای اتصال:", options=shp_cols, index=wa.guess_id_column(shp_cols))
+    if not id_col_shp or aggregated_table.empty:
+        st.warning("لطفاً ستون شناسه در شیپ‌فایل را انتخاب کنید و مطمئن شوید داده‌ای برای اتصال وجود دارد.")
+        return
+    try:
+        merged_gdf, color_col, diagnostics = wa.map_frame(gdf, id_col_shp, aggregated_table)
+        show_diagnostics(diagnostics)
+        st.write("نقشه رنگ‌بندی شده بر اساس برداشت (MCM):")
+        fig_map = boundary_map_figure(merged_gdf, id_col_shp, color_col, basemap_settings())
+        st.plotly_chart(fig_map, use_container_width=True)
+    except KeyError as e: st.error(f"خطا در اتصال داده‌ها به شیپ‌فایل: ستون شناسه '{e}' یافت نشد.")
+    except Exception as e: st.error(f"خطا در ایجاد نقشه: {e}")
+
+
+def display_year_comparison(dataset, selected_county_sidebar):
+    """Year-over-year deltas per county, subbasin or source, read from the dataset's precomputed pivot."""
+    st.divider()
+    st.subheader("مقایسه سال به سال")
+    pivot = dataset.pivot
+    if pivot is None or len(pivot.years) < 2:
+        st.info("برای مقایسه، داده‌های حداقل دو سال آبی لازم است.")
+        return
+    st.caption(f"مقایسه بر اساس شهرستان انتخابی در نوار کناری ({selected_county_sidebar}) و بدون فیلترهای این صفحه انجام می‌شود.")
+    years = list(pivot.years)
+    mode = st.radio("نوع مقایسه", ('دو سال آبی', 'دوره پایه در برابر سال هدف'), horizontal=True, key="yoy_mode")
+    col1, col2 = st.columns(2)
+    target_year = col2.selectbox("سال هدف", years[::-1], key="yoy_target")
+    earlier = [year for year in years if year < target_year]
+    if mode == 'دو سال آبی':
+        baseline_years = [col1.selectbox("سال پایه", [y for y in years[::-1] if y != target_year], key="yoy_baseline")]
+    else:
+        baseline_years = col1.multiselect("سال‌های دوره پایه (میانگین سالانه)", [y for y in years if y != target_year], default=earlier[-3:], key="yoy_period")
+    if not baseline_years:
+        st.warning("حداقل یک سال پایه انتخاب کنید.")
+        return
+    dimension = st.radio("مقایسه بر اساس", list(COMPARISON_DIMENSIONS), format_func=COMPARISON_DIMENSIONS.get, horizontal=True, key="yoy_dimension")
+    if dimension not in pivot.cubes:
+        st.warning(f"ستون '{COMPARISON_DIMENSIONS[dimension]}' در داده‌ها یافت نشد.")
+        return
+    table = pivot.compare(dimension, baseline_years, target_year, selected_county_sidebar)
+    if table.empty:
+        st.warning("برای سال‌های انتخاب شده برداشتی ثبت نشده است.")
+        return
+    baseline_caption = baseline_years[0] if len(baseline_years) == 1 else f"میانگین {years_caption(sorted(baseline_years))}"
+    st.dataframe(table.style.format({label: '{:,.2f}' for key, label in COMPARISON_LABELS.items() if key != 'pct_change'} | {COMPARISON_LABELS['pct_change']: '{:+.1f}%'}, na_rep='-'),
+                 use_container_width=True, hide_index=True)
+    st.plotly_chart(comparison_figure(table, f"تغییر برداشت {target_year} نسبت به {baseline_caption}"), use_container_width=True)
+
+
+TILE_MAP_HTML = """<div id="map" style="position:absolute;inset:0"></div><div id="legend"></div>
+<link href="__MAPLIBRE_CSS__" rel="stylesheet">
+<script src="__MAPLIBRE_JS__"></script>
+<style>body{margin:0} #legend{position:absolute;bottom:8px;right:8px;background:#fffd;padding:4px 8px;font:12px Tahoma,sans-serif;direction:rtl}</style>
+<script>
+const P = __PAYLOAD__;
+// Tile URLs must be absolute for MapLibre's workers; the iframe's base URL is the app's
+const absolute = t => /^https?:/.test(t) ? t : new URL(t.slice(0, t.indexOf('{')), document.baseURI).href + t.slice(t.indexOf('{'));
+const tiles = absolute(P.url + '/{z}/{x}/{y}.pbf');
+const fill = ['match', ['get', P.id_property]];
+for (const [id, row] of Object.entries(P.values)) fill.push(id, row.c);
+fill.push('#cccccc');
+const sources = {subbasins: {type: 'vector', tiles: [tiles], minzoom: P.minzoom, maxzoom: P.maxzoom, bounds: P.bounds}};
+const layers = [{id: 'background', type: 'background', paint: {'background-color': '#f2f2f2'}}];
+if (P.basemap) {
+  sources.basemap = {type: 'raster', tiles: [absolute(P.basemap.url)], tileSize: 256, minzoom: P.basemap.minzoom, maxzoom: P.basemap.maxzoom, attribution: P.basemap.attribution};
+  layers.push({id: 'basemap', type: 'raster', source: 'basemap'});
+}
+const map = new maplibregl.Map({container: 'map', center: P.center.slice(0, 2), zoom: P.center[2], style: {version: 8, sources: sources,
+  layers: [...layers,
+    {id: 'fill', type: 'fill', source: 'subbasins', 'source-layer': P.layer, paint: {'fill-color': Object.keys(P.values).length ? fill : '#cccccc', 'fill-opacity': 0.6}},
+    {id: 'line', type: 'line', source: 'subbasins', 'source-layer': P.layer, paint: {'line-color': '#333', 'line-width': 0.5}}]}});
+map.fitBounds(P.bounds, {padding: 20, animate: false});
+const popup = new maplibregl.Popup({closeButton: false, closeOnClick: false});
+map.on('mousemove', 'fill', e => {
+  const id = e.features[0].properties[P.id_property], row = P.values[id];
+  popup.setLngLat(e.lngLat).setHTML('<b>' + id + '</b><br>' + P.label + ': ' + (row ? row.v.toLocaleString() : '-') + (row && row.k ? '<br>' + row.k : '')).addTo(map);
+});
+map.on('mouseleave', 'fill', () => popup.remove());
+document.getElementById('legend').innerHTML = P.legend.map(([k, c]) => '<div><span style="background:' + c + ';display:inline-block;width:10px;height:10px"></span> ' + k + '</div>').join('');
+</script>"""
+
+
+def display_tile_map(aggregated_table, metadata, height=520):
+    """Subbasin map from the pre-generated vector tiles; the rerun only sends the ID → value table."""
+    if aggregated_table.empty:
+        st.warning("داده‌ای برای نمایش روی نقشه وجود ندارد.")
+        return
+    values, color_col, diagnostics = wa.subbasin_values(metadata['ids'], aggregated_table)
+    show_diagnostics(diagnostics)
+    values['color'] = subbasin_colors(values, color_col)
+    has_classes = color_col == CLASS_LABEL
+    rows = {row[SUBBASIN_LABEL]: {'v': round(float(row[EXTRACTION_LABEL]), 2), 'c': row['color'], 'k': row[CLASS_LABEL] if has_classes else ''} for _, row in values.iterrows()}
+    if has_classes: legend = sorted(values[[CLASS_LABEL, 'color']].drop_duplicates().itertuples(index=False, name=None))
+    else: legend = [(f"{values[EXTRACTION_LABEL].min():,.2f}", values['color'].iloc[values[EXTRACTION_LABEL].argmin()]), (f"{values[EXTRACTION_LABEL].max():,.2f}", values['color'].iloc[values[EXTRACTION_LABEL].argmax()])]
+    payload = {'url': TILES_URL, 'layer': metadata['vector_layers'][0]['id'], 'id_property': wa.tiles.ID_PROPERTY, 'minzoom': metadata['minzoom'], 'maxzoom': metadata['maxzoom'],
+               'bounds': metadata['bounds'], 'center': metadata['center'], 'label': EXTRACTION_LABEL, 'values': rows, 'legend': legend}
+    basemap = basemap_settings()
+    if basemap is not None: payload['basemap'] = {'url': basemap.url, 'attribution': basemap.attribution, 'minzoom': basemap.min_zoom, 'maxzoom': basemap.max_zoom}
+    js, css = maplibre_urls()
+    st.write("نقشه رنگ‌بندی شده بر اساس برداشت (MCM):")
+    page = TILE_MAP_HTML.replace('__MAPLIBRE_JS__', js).replace('__MAPLIBRE_CSS__', css)
+    components.html(page.replace('__PAYLOAD__', json.dumps(payload, ensure_ascii=False).replace('</', '<\\/')), height=height)
+
+
+def display_water_balance_summary(dataset, selected_water_years, selected_county_sidebar):
+    """Displays the summary page with filters, metrics, table, charts, and map."""
+    st.title("💧 داشبورد حسابداری آب - خلاصه بیلان آب")
+    st.markdown("خلاصه برداشت آب (میلیون متر مکعب - MCM) بر اساس فیلترهای انتخابی.")
+    st.info("نکته: داده‌های جریان برگشتی، ضرایب برگشت در دسترس نیستند. ستون تجدیدپذیری Placeholder است.")
+    filters = summary_filter_widgets(dataset.catalog, selected_water_years, selected_county_sidebar)
+    summary = get_summary_view(dataset, tuple(selected_water_years), selected_county_sidebar, filters)
+    show_diagnostics(summary.diagnostics)
+    display_summary_metrics(dataset, summary.totals)
+    aggregated_table = display_summary_table(summary)
+    if not aggregated_table.empty: display_export({"جدول خلاصه": aggregated_table, "داده‌های فیلتر شده": summary.frame}, "export_summary", "water_balance_summary")
+    display_summary_charts(aggregated_table, summary.frame, selected_water_years, get_forecast(dataset), filters, selected_county_sidebar)
+    display_year_comparison(dataset, selected_county_sidebar)
+    display_boundary_map(aggregated_table)
+
+
+# --- Heatmap Page ---
+def display_extraction_heatmap(dataset, selected_county_sidebar):
+    """Water year × county / subbasin extraction heatmap per source type, read from the dataset's pivot."""
+    st.title("🗓️ نقشه حرارتی برداشت")
+    st.markdown("برداشت سالانه (میلیون متر مکعب - MCM) در تمام سال‌های آبی، به تفکیک شهرستان یا زیرحوضه.")
+    pivot = dataset.pivot
+    if pivot is None:
+        st.warning("داده‌ای برای رسم نقشه حرارتی وجود ندارد.")
+        return
+    col1, col2 = st.columns(2)
+    dimension = col1.radio("محور افقی", [d for d in ('County', 'ID') if d in pivot.cubes], format_func=COMPARISON_DIMENSIONS.get, horizontal=True, key="heatmap_dimension")
+    source_labels = {value: label for label, value in SOURCE_TYPE_LABELS.items()}
+    source_type = col2.selectbox("نوع منبع", [ALL] + list(pivot.source_types), format_func=lambda v: v if v == ALL else source_labels.get(v, v), key="heatmap_source")
+    matrix = pivot.matrix(dimension, selected_county_sidebar, source_type)
+    columns = np.flatnonzero(matrix.any(axis=0)) # Values with no extraction in any year are left out
+    if not len(columns):
+        st.warning("برای این انتخاب برداشتی ثبت نشده است.")
+        return
+    x_title = COMPARISON_DIMENSIONS[dimension]
+    title = f"برداشت سالانه بر اساس {x_title}" + (f" - {selected_county_sidebar}" if selected_county_sidebar != ALL else "")
+    st.plotly_chart(heatmap_figure(pivot.years, [pivot.labels[dimension][i] for i in columns], matrix[:, columns], title, x_title), use_container_width=True)
+    st.caption(f"{len(pivot.years)} سال × {len(columns)} {x_title}")
+
+
+def display_reservoir_scenarios(dataset, selected_county_sidebar):
+    """What-if inflow and demand changes for every dam, simulated as thousands of stochastic multi-year runs."""
+    st.title("🌊 سناریوهای مخزن سدها")
+    st.markdown("شبیه‌سازی مونت‌کارلو حجم مخزن و کمبود تأمین نیاز برای هر سد، بر اساس بیلان ثبت شده (میلیون متر مکعب - MCM).")
+    col1, col2, col3, col4 = st.columns(4)
+    inflow_change = col1.slider("تغییر جریان ورودی (%)", -60, 30, 0, step=5, key="scenario_inflow")
+    demand_change = col2.slider("تغییر نیاز (%)", -30, 50, 0, step=5, key="scenario_demand")
+    years = col3.slider("افق (سال)", 1, 15, 5, key="scenario_years")
+    runs = col4.select_slider("تعداد اجرا", [1000, 2000, 5000, 10000], value=5000, key="scenario_runs")
+    scenario = Scenario(inflow_change / 100, demand_change / 100, years, runs)
+    result = get_scenario_result(dataset, selected_county_sidebar, scenario)
+    if result.dams.empty:
+        st.warning("داده بیلان سدی برای شبیه‌سازی موجود نیست.")
+        return
+    st.caption(f"{len(result.dams)} سد × {runs:,} اجرا × {years} سال؛ ماندگاری خشکسالی (همبستگی سال به سال ورودی) {scenario.persistence}.")
+    dams = result.dams
+    st.subheader(f"وضعیت در پایان سال {years}")
+    table = dams[[col for col in SCENARIO_LABELS if col in dams.columns]].copy()
+    table['Any_Shortfall_Probability'] = (table['Any_Shortfall_Probability'] * 100).round(1)
+    st.dataframe(table.rename(columns=SCENARIO_LABELS).round(2), use_container_width=True, hide_index=True)
+    dam = st.selectbox("سد", dams['Source_Name'].tolist(), key="scenario_dam")
+    st.plotly_chart(scenario_figure(result.by_year, dam, float(dams.loc[dams['Source_Name'] == dam, 'Capacity'].iloc[0])), use_container_width=True)
+    by_year = result.by_year[result.by_year['Source_Name'] == dam].drop(columns=['Source_Name', 'County'])
+    by_year['Shortfall_Probability'] = (by_year['Shortfall_Probability'] * 100).round(1)
+    st.dataframe(by_year.rename(columns=SCENARIO_LABELS).round(2), use_container_width=True, hide_index=True)
+    st.caption("ظرفیت برابر بیشترین حجم ثبت شده در نظر گرفته شده است؛ آب مازاد بر آن سرریز می‌شود.")
+
+
+# --- Admin Diagnostics Page ---
+def process_rss_bytes():
+    """Resident set size of this process, or None if psutil is not installed."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError: return None
+
+
+def _batch_report_job(job, dataset, boundary_gdf, water_years):
+    pairs = report_jobs(dataset.catalog, water_years=water_years)
+    out_dir = os.path.join(job.workdir(), 'reports')
+    job.report(0, f"0/{len(pairs)}")
+    # In-process: the job pool already caps how many cores background work may take
+    results = run_reports(dataset, boundary_gdf, pairs, out_dir, workers=1,
+                          progress=lambda done, total, result: job.report(done / total, f"{done}/{total}: {result.water_year} {result.county}"))
+    archive = os.path.join(job.workdir(), 'reports.zip')
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(out_dir):
+            for name in files: zf.write(os.path.join(root, name), os.path.relpath(os.path.join(root, name), out_dir))
+    shutil.rmtree(out_dir, ignore_errors=True) # Only the archive is served
+    return check_download_size(archive), [r for r in results if r.error]
+
+
+def display_batch_reports(dataset):
+    """Summary-page reports of every county for the chosen water years, rendered by a background job and downloaded as a zip."""
+    with st.expander("📄 گزارش‌های دسته‌ای"):
+        years = st.multiselect("سال‌های آبی", list(dataset.catalog.years), default=[dataset.catalog.latest_year] if dataset.catalog.latest_year else [], key="batch_report_years")
+        if st.button("تولید گزارش‌ها", key="batch_report_start", disabled=not years):
+            submit_job("batch_reports", "تولید گزارش‌های دسته‌ای", _batch_report_job, dataset, default_boundary().gdf, years)
+        job = job_result("batch_reports")
+        if job is None or job.status != wa.jobs.DONE or not os.path.exists(job.result[0]): return
+        archive, failed = job.result
+        for result in failed: st.warning(f"{result.water_year} {result.county}: {result.error}")
+        download_link(archive, "دریافت گزارش‌ها (zip)")
+
+
+def display_validation_report(dataset):
+    """Rows read, loaded and quarantined per source file, the failing rules and the quarantine files to download."""
+    st.subheader("اعتبارسنجی داده‌ها")
+    reports = [result.validation for result in dataset.sources.values() if result.validation is not None]
+    if not reports:
+        st.info("هیچ فایل داده‌ای اعتبارسنجی نشده است.")
+        return
+    st.dataframe(pd.DataFrame([{
+        'فایل': report.source, 'ردیف خوانده شده': report.rows, 'ردیف بارگذاری شده': report.loaded, 'ردیف قرنطینه شده': report.quarantined,
+        'ردیف علامت‌گذاری شده': report.flagged, 'ستون‌های یافت نشده': ', '.join(report.missing_columns),
+    } for report in reports]), use_container_width=True, hide_index=True)
+    if dataset.validation is not None and not dataset.validation.empty:
+        st.dataframe(dataset.validation.rename(columns=VALIDATION_LABELS), use_container_width=True, hide_index=True)
+    for report in reports:
+        if not report.quarantine_path or not os.path.exists(report.quarantine_path): continue
+        slot = f"quarantine_{report.source}"
+        if st.button(f"آماده‌سازی ردیف‌های قرنطینه شده {report.source}", key=f"{slot}_prepare"):
+            submit_job(slot, f"آماده‌سازی فایل قرنطینه {report.source}", _copy_job, report.quarantine_path)
+        job = job_result(slot)
+        if job is not None and job.status == wa.jobs.DONE and os.path.exists(job.result): download_link(job.result, f"دریافت ردیف‌های قرنطینه شده {report.source}")
+
+
+def display_admin_diagnostics(username):
+    """Data validation, cache budgets and counters, dataset version and warm-up timings, for administrators only."""
+    st.title("🛠️ عیب‌یابی سامانه")
+    if not is_admin(username):
+        st.error("دسترسی به این صفحه فقط برای مدیران مجاز است.")
+        return
+    store, dataset = get_store(), get_dataset()
+    rss = process_rss_bytes()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("حافظه فرایند (MB)", f"{rss / MB:,.1f}" if rss is not None else "N/A")
+    col2.metric("حجم داده بارگذاری شده (MB)", f"{estimate_bytes(dataset.frame) / MB:,.1f}")
+    col3.metric("نسخه داده", f"{dataset.version}")
+    api = get_query_api()
+    if api: st.caption(f"رابط برنامه‌نویسی (فقط خواندنی): {api.url}")
+    elif (load_app_config().get('api') or {}).get('enabled') and not os.environ.get(SNAPSHOT_DIR_ENV): st.caption("رابط برنامه‌نویسی در این فرایند اجرا نشد (درگاه در حال استفاده است یا توکن معتبری در api: tokens تعریف نشده است).")
+
+    display_validation_report(dataset)
+
+    st.subheader("حافظه‌های نهان")
+    names = [s.name for s in all_cache_stats()]
+    clear_col1, clear_col2 = st.columns([3, 1])
+    to_clear = clear_col1.selectbox("پاک کردن حافظه نهان", [ALL] + names, key="admin_cache_clear_select")
+    if clear_col2.button("پاک کردن", key="admin_cache_clear"):
+        for name in names:
+            if to_clear in (ALL, name): get_cache(name).clear()
+        st.success("حافظه نهان پاک شد.")
+    st.caption("مقدار خالی در ستون‌های حداکثر، بودجه و TTL یعنی بدون محدودیت.")
+    st.dataframe(pd.DataFrame([{
+        'نام': s.name, 'تعداد': s.entries, 'حداکثر تعداد': s.max_entries or None, 'حجم (MB)': round(s.bytes / MB, 2),
+        'بودجه (MB)': round(s.max_bytes / MB, 1) if s.max_bytes else None, 'TTL (ثانیه)': int(s.ttl) or None, 'hit': s.hits, 'miss': s.misses,
+        'نرخ hit': f"{s.hit_ratio:.0%}", 'eviction': s.evictions, 'انقضا': s.expirations, 'محاسبه تکراری حذف شده': s.coalesced,
+    } for s in all_cache_stats()]), use_container_width=True, hide_index=True)
+
+    st.subheader("کارهای پس‌زمینه")
+    queue = get_job_queue()
+    st.caption(f"حداکثر {queue.max_workers} کار هم‌زمان و {queue.max_per_owner} کار فعال برای هر کاربر.")
+    jobs = queue.jobs()
+    if jobs:
+        st.dataframe(pd.DataFrame([{
+            'کار': job.label, 'کاربر': job.owner, 'وضعیت': JOB_STATUS_LABELS[job.status], 'پیشرفت': f"{job.progress:.0%}",
+            'زمان (ثانیه)': round((job.finished or time.time()) - job.started, 1) if job.started else None, 'خطا': job.error,
+        } for job in jobs]), use_container_width=True, hide_index=True)
+    display_batch_reports(user_dataset(dataset, username))
+
+    st.subheader("آماده‌سازی و بارگذاری مجدد")
+    warmup = get_warmup()
+    st.dataframe(pd.DataFrame([{'مرحله': step.label, 'وضعیت': step.status, 'زمان (ثانیه)': round(step.seconds, 2), 'خطا': step.error} for step in warmup.steps]), use_container_width=True, hide_index=True)
+    for timestamp, message in store.reload_errors: st.warning(f"{pd.Timestamp(timestamp, unit='s'):%Y-%m-%d %H:%M:%S}: {message}")
+
+
+# --- Sidebar ---
+def sidebar_county_filter(catalog):
+    return st.sidebar.selectbox("انتخاب شهرستان", options=catalog.options('County', include_unknown=False), key="county_sidebar_filter")
+
+
+def sidebar_footer():
+    st.sidebar.divider()
+    st.sidebar.info("داشبورد ایجاد شده با Streamlit.")
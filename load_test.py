@@ -0,0 +1,308 @@
+# Headless load-test harness for the water accounting dashboard.
+#
+# Runs N concurrent analyst sessions against a dashboard script with
+# streamlit.testing.v1.AppTest (one process, shared st.cache_* state, exactly
+# like one `streamlit run` server) and reports rerun latency percentiles,
+# throughput and RSS growth.
+#
+#   python load_test.py --sessions 8 --iterations 3
+#   python load_test.py --app features_streamlit.py --sessions 16 --json report.json
+import argparse
+import json
+import os
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+try:
+    import psutil # Optional: more accurate current RSS
+except ImportError:
+    psutil = None
+
+from streamlit.testing.v1 import AppTest
+
+try:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+except NameError:
+    BASE_DIR = os.getcwd() # Fallback
+
+DEFAULT_APP = os.path.join(BASE_DIR, 'streamlit_app.py')
+DEFAULT_BOUNDARY_ZIP = os.path.join(BASE_DIR, 'data/final_boundary_fixed.zip')
+
+PAGE_DETAIL = "تحلیل جزئی"
+PAGE_SUMMARY = "خلاصه بیلان آب"
+ALL_OPTION = "همه"
+
+# Session-state key under which the harness stages files for st.file_uploader widgets.
+STAGED_UPLOADS_KEY = "_load_test_staged_uploads"
+
+
+# --- File Uploader Support ---
+# AppTest (streamlit 1.44) cannot drive st.file_uploader, so the harness stages
+# the zip bytes in the session's own st.session_state and a wrapped
+# FileUploaderSerde hands them to the widget keyed by the same name. Sessions
+# that did not stage anything are unaffected.
+_uploader_patch_lock = threading.Lock()
+_uploader_patched = False
+
+
+def install_upload_support():
+    """Wraps FileUploaderSerde.deserialize once per process so staged uploads reach the script."""
+    global _uploader_patched
+    with _uploader_patch_lock:
+        if _uploader_patched:
+            return
+        from streamlit.elements.widgets import file_uploader as fu
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        from streamlit.runtime.uploaded_file_manager import UploadedFile, UploadedFileRec
+        from streamlit.proto.Common_pb2 import FileURLs
+
+        original_deserialize = fu.FileUploaderSerde.deserialize
+
+        def deserialize(self, ui_value, widget_id):
+            ctx = get_script_run_ctx()
+            staged = {}
+            if ctx is not None and STAGED_UPLOADS_KEY in ctx.session_state:
+                staged = ctx.session_state[STAGED_UPLOADS_KEY]
+            for key, (name, data) in staged.items():
+                if widget_id.endswith(f"-{key}") or widget_id == key:
+                    rec = UploadedFileRec(file_id=f"load-test-{key}", name=name, type="application/zip", data=data)
+                    uploaded = UploadedFile(rec, FileURLs())
+                    return [uploaded] if self.accept_multiple_files else uploaded
+            return original_deserialize(self, ui_value, widget_id)
+
+        fu.FileUploaderSerde.deserialize = deserialize
+        _uploader_patched = True
+
+
+# --- Shared Runtime ---
+# AppTest installs a fresh mock Runtime at the start of every run and clears it
+# at the end, which breaks any other session still running. Concurrent
+# sessions share the first mock Runtime instead, as they would share the real
+# one inside a single `streamlit run` process.
+_runtime_patch_lock = threading.Lock()
+_runtime_patched = False
+
+
+def install_shared_runtime():
+    """Makes AppTest runs in different threads share one Runtime instance."""
+    global _runtime_patched
+    with _runtime_patch_lock:
+        if _runtime_patched:
+            return
+        from streamlit.runtime import Runtime
+        from streamlit.testing.v1 import app_test
+
+        class _SharedInstanceMeta(type):
+            def __setattr__(cls, name, value):
+                if name != '_instance':
+                    super().__setattr__(name, value)
+                elif value is not None and Runtime._instance is None:
+                    Runtime._instance = value # First session's runtime wins; resets to None are ignored
+
+        class _SharedRuntime(Runtime, metaclass=_SharedInstanceMeta):
+            pass
+
+        app_test.Runtime = _SharedRuntime
+        _runtime_patched = True
+
+
+# --- Memory Helpers ---
+def current_rss_mb():
+    """Returns the current resident set size of this process in MB."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Linux reports KB
+
+
+# --- Session Script ---
+def _widget(at, kind, key=None, label=None, sidebar=None):
+    """Finds a widget by key or label, optionally restricted to the sidebar; returns None if absent."""
+    container = at.sidebar if sidebar else at
+    for w in getattr(container, kind):
+        if key is None and label is None: return w
+        if key is not None and w.key == key: return w
+        if label is not None and w.label == label: return w
+    return None
+
+
+class SessionRunner:
+    """Scripts one analyst session and records the latency of every rerun."""
+
+    def __init__(self, app_path, username, password, boundary_zip, timeout, seed):
+        self.app_path = app_path
+        self.username = username
+        self.password = password
+        self.boundary_zip = boundary_zip
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.samples = [] # (step, seconds)
+        self.errors = [] # (step, message)
+
+    def _rerun(self, at, step, action=None):
+        start = time.perf_counter()
+        try:
+            if action is not None: action()
+            at.run(timeout=self.timeout)
+        except Exception as e:
+            self.errors.append((step, f"{type(e).__name__}: {e}"))
+            return False
+        self.samples.append((step, time.perf_counter() - start))
+        if at.exception:
+            self.errors.append((step, at.exception[0].message.splitlines()[0]))
+            return False
+        return True
+
+    def _pick(self, options, current=None):
+        choices = [o for o in options if o != current] or list(options)
+        return self.rng.choice(choices)
+
+    def run(self, iterations):
+        at = AppTest.from_file(self.app_path, default_timeout=self.timeout)
+        if not self._rerun(at, 'initial_load'): return self
+
+        # Login
+        if len(at.text_input) >= 2 and at.button:
+            at.text_input[0].input(self.username)
+            at.text_input[1].input(self.password)
+            if not self._rerun(at, 'login', at.button[0].click): return self
+        if not at.sidebar.radio:
+            self.errors.append(('login', "صفحه داشبورد پس از ورود نمایش داده نشد."))
+            return self
+
+        for _ in range(iterations):
+            # Summary page with global filters
+            nav = at.sidebar.radio[0]
+            self._rerun(at, 'switch_page_summary', lambda: nav.set_value(PAGE_SUMMARY))
+            years = _widget(at, 'multiselect', sidebar=True)
+            if years is not None and years.options:
+                subset = self.rng.sample(years.options, k=self.rng.randint(1, min(3, len(years.options))))
+                self._rerun(at, 'change_years', lambda: years.set_value(subset))
+            else:
+                year = _widget(at, 'selectbox', label="انتخاب سال آبی", sidebar=True)
+                if year is not None: self._rerun(at, 'change_years', lambda: year.set_value(self._pick(year.options, year.value)))
+            county = _widget(at, 'selectbox', key="county_sidebar_filter", sidebar=True)
+            if county is not None: self._rerun(at, 'change_county', lambda: county.set_value(self._pick(county.options, county.value)))
+            source = _widget(at, 'selectbox', key="source_type_filter")
+            if source is not None: self._rerun(at, 'change_source', lambda: source.set_value(self._pick(source.options, source.value)))
+
+            # Boundary upload and map
+            if self.boundary_zip and _widget_exists(at, 'shp_uploader'):
+                with open(self.boundary_zip, 'rb') as f: payload = (os.path.basename(self.boundary_zip), f.read())
+                self._rerun(at, 'upload_boundary', lambda: at.session_state.__setitem__(STAGED_UPLOADS_KEY, {'shp_uploader': payload}))
+
+            # Detailed page
+            nav = at.sidebar.radio[0]
+            self._rerun(at, 'switch_page_detail', lambda: nav.set_value(PAGE_DETAIL))
+            dam = _widget(at, 'selectbox', key="dam_select_detail")
+            if dam is not None: self._rerun(at, 'change_dam', lambda: dam.set_value(self._pick(dam.options, dam.value)))
+            if county is not None:
+                county = _widget(at, 'selectbox', key="county_sidebar_filter", sidebar=True)
+                self._rerun(at, 'reset_county', lambda: county.set_value(ALL_OPTION))
+        return self
+
+
+def _widget_exists(at, key):
+    """Returns True if an element with the given user key was rendered in the last run."""
+    return any(getattr(node, 'key', None) == key or getattr(getattr(node, 'proto', None), 'id', '').endswith(f"-{key}") for node in _walk(at._tree))
+
+
+def _walk(node):
+    yield node
+    for child in getattr(node, 'children', {}).values():
+        yield from _walk(child)
+
+
+# --- Reporting ---
+def summarize(runners, wall_seconds, rss_start, rss_end, rss_peak):
+    """Builds the load-test report from all finished session runners."""
+    by_step = {}
+    for r in runners:
+        for step, seconds in r.samples: by_step.setdefault(step, []).append(seconds)
+    all_samples = np.array([s for r in runners for _, s in r.samples]) if any(r.samples for r in runners) else np.array([])
+
+    def pct(values):
+        values = np.asarray(values) * 1000
+        return {'count': int(values.size), 'p50_ms': float(np.percentile(values, 50)), 'p90_ms': float(np.percentile(values, 90)),
+                'p95_ms': float(np.percentile(values, 95)), 'p99_ms': float(np.percentile(values, 99)), 'max_ms': float(values.max())}
+
+    errors = [{'step': step, 'message': msg} for r in runners for step, msg in r.errors]
+    return {
+        'sessions': len(runners),
+        'wall_seconds': wall_seconds,
+        'reruns': int(all_samples.size),
+        'throughput_reruns_per_s': all_samples.size / wall_seconds if wall_seconds > 0 else 0.0,
+        'latency_all': pct(all_samples) if all_samples.size else None,
+        'latency_by_step': {step: pct(v) for step, v in sorted(by_step.items())},
+        'rss_start_mb': rss_start, 'rss_end_mb': rss_end, 'rss_peak_mb': rss_peak, 'rss_growth_mb': rss_end - rss_start,
+        'errors': errors,
+    }
+
+
+def print_report(report):
+    print(f"Sessions: {report['sessions']}  Reruns: {report['reruns']}  Wall: {report['wall_seconds']:.2f}s  "
+          f"Throughput: {report['throughput_reruns_per_s']:.2f} reruns/s")
+    header = f"{'step':<22}{'n':>6}{'p50':>10}{'p90':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header); print('-' * len(header))
+    rows = list(report['latency_by_step'].items())
+    if report['latency_all']: rows.append(('ALL', report['latency_all']))
+    for step, s in rows:
+        print(f"{step:<22}{s['count']:>6}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}{s['max_ms']:>10.1f}")
+    print(f"RSS: start {report['rss_start_mb']:.1f} MB, end {report['rss_end_mb']:.1f} MB, peak {report['rss_peak_mb']:.1f} MB, "
+          f"growth {report['rss_growth_mb']:+.1f} MB")
+    if report['errors']:
+        print(f"Errors: {len(report['errors'])}")
+        for e in report['errors'][:10]: print(f"  [{e['step']}] {e['message']}")
+
+
+def run_load_test(app_path=DEFAULT_APP, sessions=4, iterations=2, username='jsmith', password='123',
+                  boundary_zip=DEFAULT_BOUNDARY_ZIP, timeout=60.0, seed=0):
+    """Runs `sessions` concurrent scripted sessions and returns the report dict."""
+    install_shared_runtime()
+    install_upload_support()
+    rss_start = current_rss_mb()
+    runners = [SessionRunner(app_path, username, password, boundary_zip, timeout, seed + i) for i in range(sessions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(r.run, iterations) for r in runners]
+        for f in as_completed(futures): f.result()
+    wall = time.perf_counter() - start
+    return summarize(runners, wall, rss_start, current_rss_mb(), peak_rss_mb())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the water accounting dashboard.")
+    parser.add_argument('--app', default=DEFAULT_APP, help="Dashboard script to exercise (default: streamlit_app.py)")
+    parser.add_argument('--sessions', type=int, default=4, help="Number of concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=2, help="Interaction loops per session after login")
+    parser.add_argument('--username', default='jsmith')
+    parser.add_argument('--password', default='123')
+    parser.add_argument('--boundary-zip', default=DEFAULT_BOUNDARY_ZIP, help="Shapefile zip to upload on the summary page ('' to skip)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Per-rerun timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Optional path to write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(args.app, args.sessions, args.iterations, args.username, args.password,
+                           args.boundary_zip or None, args.timeout, args.seed)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
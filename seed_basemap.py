@@ -0,0 +1,61 @@
+# Seeds the offline basemap served from static/ (see `basemap` in config.yaml).
+#
+# Downloads the raster tiles covering the subbasin boundaries from a tile server,
+# or unpacks an existing MBTiles file, into static/basemap, and copies the MapLibre
+# GL library to static/vendor so the maps need no internet access afterwards.
+# Run once on a machine with internet access (or with --mbtiles on the server).
+#
+#   python seed_basemap.py
+#   python seed_basemap.py --max-zoom 13 --url "https://tiles.example.org/{z}/{x}/{y}.png" --attribution "© ..."
+#   python seed_basemap.py --mbtiles khorasan.mbtiles --skip-maplibre
+import argparse
+import os
+import sys
+import time
+
+import water_accounting as wa
+from water_accounting.basemap import MAX_ZOOM, MIN_ZOOM, ONLINE_ATTRIBUTION, ONLINE_URL, seed_maplibre
+from water_accounting.constants import DEFAULT_BOUNDARY_ZIP
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MARGIN_DEGREES = 0.5 # Basemap drawn around the boundaries
+
+
+def print_progress(done, total):
+    if done == total or done % 100 == 0: print(f"\r  {done}/{total} tiles", end='\n' if done == total else '', flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the local basemap tile cache under static/.")
+    parser.add_argument('--out', default=os.path.join(STATIC_DIR, 'basemap'), help="Tile cache directory (default: static/basemap)")
+    parser.add_argument('--mbtiles', help="Unpack this raster MBTiles file instead of downloading")
+    parser.add_argument('--url', default=ONLINE_URL, help="{z}/{x}/{y} tile server template to download from")
+    parser.add_argument('--attribution', default=ONLINE_ATTRIBUTION)
+    parser.add_argument('--boundary-zip', default=DEFAULT_BOUNDARY_ZIP, help="Area to cover (default: the subbasin boundaries)")
+    parser.add_argument('--min-zoom', type=int, default=MIN_ZOOM)
+    parser.add_argument('--max-zoom', type=int, default=MAX_ZOOM)
+    parser.add_argument('--workers', type=int, default=4, help="Parallel downloads")
+    parser.add_argument('--skip-maplibre', action='store_true', help="Do not copy the MapLibre GL library to static/vendor")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.mbtiles:
+        metadata = wa.seed_from_mbtiles(args.mbtiles, args.out, print_progress)
+    else:
+        boundary = wa.read_boundary_file(args.boundary_zip)
+        if boundary.gdf is None:
+            for diagnostic in boundary.diagnostics: print(f"[{diagnostic.level}] {diagnostic.message}", file=sys.stderr)
+            return 1
+        minx, miny, maxx, maxy = boundary.gdf.total_bounds
+        bounds = (minx - MARGIN_DEGREES, miny - MARGIN_DEGREES, maxx + MARGIN_DEGREES, maxy + MARGIN_DEGREES)
+        metadata = wa.seed_from_url(bounds, args.out, args.url, args.min_zoom, args.max_zoom, args.attribution, args.workers, print_progress)
+    print(f"{metadata['tile_count']} basemap tiles (zoom {metadata['minzoom']}-{metadata['maxzoom']}) in {args.out}, {metadata['failed']} failed")
+    if not args.skip_maplibre:
+        try: print("MapLibre GL copied to", os.path.dirname(seed_maplibre(os.path.join(STATIC_DIR, 'vendor', 'maplibre-gl'))[0]))
+        except OSError as e: print(f"Could not download MapLibre GL: {e}", file=sys.stderr)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    return 1 if metadata['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
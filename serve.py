@@ -0,0 +1,143 @@
+# Multi-process deployment of the water accounting dashboard.
+#
+# One loader process ingests the source files and publishes each version as a
+# memory-mapped snapshot; N Streamlit worker processes map that snapshot
+# read-only, so the data sits in the page cache once instead of once per
+# worker. A reverse proxy spreads browsers over the workers; the generated nginx
+# config pins each browser to one worker, because a session's websocket, file
+# uploads and media URLs all live in that worker's memory. When config.yaml
+# enables it, the read-only JSON query API (water_accounting/api.py) runs once,
+# in this process, on the loader's store.
+#
+#   python serve.py --workers 4
+#   python serve.py --workers 8 --base-port 9000 --proxy-config /etc/nginx/conf.d/water_accounting.conf
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import yaml
+
+import water_accounting as wa
+from water_accounting.api import DEFAULT_HOST as DEFAULT_API_HOST, DEFAULT_PORT as DEFAULT_API_PORT, token_scopes
+from water_accounting.snapshot import SNAPSHOT_DIR_ENV, write_snapshot
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+NGINX_TEMPLATE = """\
+# Generated by serve.py; include it from the http block of nginx.conf.
+upstream water_accounting {{
+    # Sticky by client: a session's websocket, uploads and media must reach the worker that holds it
+    hash $remote_addr$http_user_agent consistent;
+{servers}
+}}
+
+map $http_upgrade $connection_upgrade {{
+    default upgrade;
+    '' close;
+}}
+
+server {{
+    listen {port};
+    client_max_body_size 200m;
+
+    location / {{
+        proxy_pass http://water_accounting;
+        proxy_http_version 1.1;
+        proxy_set_header Host $host;
+        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header Upgrade $http_upgrade;
+        proxy_set_header Connection $connection_upgrade;
+        proxy_read_timeout 86400;
+    }}
+}}
+"""
+
+
+def nginx_config(ports, port):
+    """nginx upstream/server blocks balancing `port` over the worker `ports`."""
+    servers = '\n'.join(f'    server 127.0.0.1:{p};' for p in ports)
+    return NGINX_TEMPLATE.format(servers=servers, port=port)
+
+
+def start_worker(app, port, env):
+    command = [sys.executable, '-m', 'streamlit', 'run', app, '--server.port', str(port), '--server.address', '127.0.0.1',
+               '--server.headless', 'true', '--browser.gatherUsageStats', 'false']
+    return subprocess.Popen(command, cwd=BASE_DIR, env=env)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard from several worker processes sharing one memory-mapped dataset.")
+    parser.add_argument('--app', default='streamlit_app.py', help="Dashboard script (default: streamlit_app.py)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Streamlit worker processes (default: CPU count)")
+    parser.add_argument('--base-port', type=int, default=8511, help="Port of the first worker; the others follow (default: 8511)")
+    parser.add_argument('--port', type=int, default=8501, help="Port the reverse proxy listens on (default: 8501)")
+    parser.add_argument('--snapshot-dir', default=os.path.join(BASE_DIR, '.snapshots'), help="Where dataset snapshots are written (default: .snapshots)")
+    parser.add_argument('--proxy-config', help="Where to write the nginx config (default: <snapshot-dir>/nginx.conf)")
+    parser.add_argument('--config', default=os.path.join(BASE_DIR, 'config.yaml'), help="Dashboard config; its api and access sections configure the JSON API (default: config.yaml)")
+    parser.add_argument('--api-port', type=int, help=f"Port of the read-only JSON API (default: api: port in the config, else {DEFAULT_API_PORT})")
+    parser.add_argument('--no-api', action='store_true', help="Do not serve the JSON API even if the config enables it")
+    args = parser.parse_args(argv)
+    if args.workers < 1: parser.error("--workers must be at least 1")
+    snapshot_dir = os.path.abspath(args.snapshot_dir)
+    try:
+        with open(args.config, encoding='utf-8') as f: config = yaml.safe_load(f) or {}
+    except FileNotFoundError: config = {}
+    api_config = config.get('api') or {}
+    api_tokens = None
+    if api_config.get('enabled') and not args.no_api:
+        try: api_tokens = token_scopes(api_config, config.get('access'))
+        except ValueError as e: parser.error(f"{e}; add tokens or pass --no-api")
+
+    # --- Loader ---
+    started = time.perf_counter()
+    store = wa.DatasetStore()
+    store.add_prepare_hook(lambda dataset: print(f"Published dataset v{dataset.version}: {write_snapshot(dataset, snapshot_dir)}"))
+    dataset = store.current()
+    for diagnostic in dataset.diagnostics: print(f"[{diagnostic.level}] {diagnostic.message}", file=sys.stderr)
+    store.start_watching()
+    print(f"Loaded data in {time.perf_counter() - started:.1f}s")
+    api = None
+    if api_tokens:
+        api = wa.QueryApi(store, api_tokens, host=api_config.get('host', DEFAULT_API_HOST), port=args.api_port or api_config.get('port', DEFAULT_API_PORT)).start()
+    if api: print(f"Serving the JSON API at {api.url}")
+
+    # --- Proxy Config ---
+    ports = [args.base_port + i for i in range(args.workers)]
+    proxy_config = args.proxy_config or os.path.join(snapshot_dir, 'nginx.conf')
+    with open(proxy_config, 'w', encoding='utf-8') as f: f.write(nginx_config(ports, args.port))
+    print(f"Wrote the nginx config to {proxy_config}; the dashboard is served at port {args.port} once nginx includes it")
+
+    # --- Workers ---
+    env = dict(os.environ, **{SNAPSHOT_DIR_ENV: snapshot_dir})
+    workers = {port: start_worker(args.app, port, env) for port in ports}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Started {len(workers)} workers on ports {ports[0]}-{ports[-1]}")
+    try:
+        while not stopping:
+            time.sleep(1)
+            for port, process in workers.items():
+                if process.poll() is None or stopping: continue
+                print(f"Worker on port {port} exited with code {process.returncode}; restarting", file=sys.stderr)
+                workers[port] = start_worker(args.app, port, env)
+    finally:
+        store.stop()
+        if api: api.stop()
+        for process in workers.values(): process.terminate()
+        for process in workers.values():
+            try: process.wait(timeout=10)
+            except subprocess.TimeoutExpired: process.kill()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
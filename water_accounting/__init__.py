@@ -0,0 +1,31 @@
+"""Streamlit-free analytics core for the water accounting dashboards.
+
+Ingest, filtering and aggregation live here so they can be cached once per
+process, benchmarked and profiled outside Streamlit, and reused by batch jobs.
+Functions report problems as `Diagnostic` objects instead of rendering them.
+"""
+from .access import NO_ACCESS, UNRESTRICTED, AccessScope, access_scope, configured_scopes, partition_dataset
+from .aggregate import (GroundwaterSummary, SummaryView, dam_balance, distribution, extraction_scatter_frame, extraction_totals, extraction_trend,
+                        groundwater_summary, groundwater_usage_by_year, map_frame, subbasin_totals, subbasin_values, summary_table, summary_view, well_counts)
+from .api import QueryApi
+from .balance import BALANCE_LABELS, balance_table, residual_ranking
+from .basemap import ONLINE as ONLINE_BASEMAP, Basemap, local_basemap, seed_from_mbtiles, seed_from_url
+from .boundaries import BoundaryResult, guess_id_column, map_center, read_boundary_file, read_boundary_zip
+from .constants import ALL, GROUNDWATER, SURFACE, TRANSFER, UNKNOWN, WASTEWATER
+from .diagnostics import Diagnostic
+from .dimensions import DimensionCatalog, build_catalog
+from .export import EXPORT_FORMATS, write_export
+from .filters import (GroundwaterFilters, SummaryFilters, filter_global, filter_groundwater, filter_summary, source_type_labels, split_detail, value_options,
+                      year_options)
+from .forecast import FORECAST_KEYS, FORECAST_LABELS, ExtractionForecast, build_forecast
+from .ingest import Dataset, SourceResult, SourceSpec, coerce_measures, default_source_specs, load_dataset, load_source, safe_to_numeric
+from .jobs import Job, JobCancelled, JobLimitError, JobQueue
+from .lookup import ID_LABELS, IdentifierIndex, WellIndex, build_well_index
+from .pivots import COMPARISON_DIMENSIONS, COMPARISON_LABELS, YearPivot, build_year_pivot
+from .snapshot import read_snapshot, snapshot_fingerprint, snapshot_loader, write_snapshot
+from .sketches import WellCountSketch, build_well_sketch
+from .store import DatasetStore, source_fingerprint
+from .tiles import encode_tile, ensure_tiles, generate_tiles, read_tile_metadata
+from .validation import VALIDATION_LABELS, ValidationReport, validate_frame, validation_table
+from .warmup import Warmup
+from .wells import WELL_TREND_LABELS, well_key_column, well_trends, worst_offenders
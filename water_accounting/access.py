@@ -0,0 +1,70 @@
+"""Row-level access: which counties and subbasins each user may see.
+
+`access` in config.yaml maps usernames to allowed counties and/or subbasin IDs.
+A restricted user is served a partition of the Dataset that holds only their
+rows, with every ingest-time table (catalog, balance, well index, pivots)
+rebuilt from that slice, so their pages never scan or aggregate other rows.
+"""
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .ingest import build_dataset
+
+EVERYONE = '*' # Config entry for users not listed by name
+ALL_ROWS = 'all'
+
+
+@dataclass(frozen=True)
+class AccessScope:
+    """Rows a user may see: those of `counties` plus those of `subbasins` (IDs as strings)."""
+    counties: frozenset = frozenset()
+    subbasins: frozenset = frozenset()
+    unrestricted: bool = False
+
+    def mask(self, frame):
+        """Boolean Series of the rows of `frame` inside the scope."""
+        allowed = frame['County'].isin(self.counties) if 'County' in frame.columns else None
+        if 'ID' in frame.columns and self.subbasins:
+            in_subbasins = frame['ID'].astype(str).isin(self.subbasins)
+            allowed = in_subbasins if allowed is None else allowed | in_subbasins
+        return allowed if allowed is not None else pd.Series(False, index=frame.index)
+
+    def describe(self):
+        return '، '.join(sorted(self.counties) + sorted(self.subbasins))
+
+
+UNRESTRICTED = AccessScope(unrestricted=True)
+NO_ACCESS = AccessScope()
+
+
+def _parse_entry(entry):
+    if entry == ALL_ROWS: return UNRESTRICTED
+    if not isinstance(entry, dict): return NO_ACCESS
+    listed = lambda key: frozenset(str(v) for v in (entry.get(key) or []))
+    return AccessScope(listed('counties'), listed('subbasins'))
+
+
+def access_scope(access_config, username):
+    """The AccessScope of `username` under config.yaml's `access` section.
+
+    Without an `access` section everyone sees everything. With one, users not
+    listed fall back to the '*' entry, and to no rows at all if there is none.
+    """
+    if not access_config: return UNRESTRICTED
+    if username in access_config: return _parse_entry(access_config[username])
+    return _parse_entry(access_config.get(EVERYONE))
+
+
+def configured_scopes(access_config):
+    """Distinct restricted scopes of the config, for building partitions ahead of time."""
+    return list(dict.fromkeys(scope for scope in map(_parse_entry, (access_config or {}).values()) if not scope.unrestricted))
+
+
+def partition_dataset(dataset, scope):
+    """`dataset` restricted to `scope`: the combined frame is filtered and every derived table is rebuilt from the slice."""
+    if scope.unrestricted: return dataset
+    frame = dataset.frame[scope.mask(dataset.frame)].reset_index(drop=True)
+    partition = build_dataset(frame, dataset.sources, dataset.diagnostics)
+    partition.version, partition.scope = dataset.version, scope
+    return partition
@@ -0,0 +1,147 @@
+"""Aggregations behind the metrics, tables and charts of both dashboard pages."""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .constants import (ALL, CLASS_LABEL, DAM_BALANCE_COLS, EXTRACTION_LABEL, GROUNDWATER, GW_SCATTER_COLS, SUBBASIN_LABEL,
+                        SUMMARY_COLUMN_LABELS, SUMMARY_GROUP_COLS, SURFACE, TRANSFER, WASTEWATER)
+from .diagnostics import Diagnostic
+from .filters import filter_global, filter_summary
+from .wells import well_key_column
+
+
+# --- Summary Page ---
+def extraction_totals(df):
+    """Total Extraction_MCM per source type (all four keys are always present)."""
+    sums = df.groupby('Source_Type')['Extraction_MCM'].sum() if not df.empty else pd.Series(dtype=float)
+    return {source_type: float(sums.get(source_type, 0.0)) for source_type in (SURFACE, GROUNDWATER, TRANSFER, WASTEWATER)}
+
+
+def summary_table(df):
+    """Extraction summed by source, subbasin, county, usage and renewability, with Persian headers.
+
+    Returns (table, group_cols); the table is empty when nothing can be grouped.
+    """
+    if df.empty: return pd.DataFrame(), []
+    df_renamed = df.rename(columns=SUMMARY_COLUMN_LABELS)
+    group_cols = [col for col in SUMMARY_GROUP_COLS if col in df_renamed.columns]
+    if EXTRACTION_LABEL not in df_renamed.columns or not group_cols: return pd.DataFrame(), []
+    # Ensure group by columns are hashable (convert potential lists/dicts to strings if necessary)
+    for col in group_cols:
+        if df_renamed[col].apply(type).isin([list, dict]).any(): df_renamed[col] = df_renamed[col].astype(str)
+    table = df_renamed.groupby(group_cols, observed=False)[EXTRACTION_LABEL].sum().reset_index()
+    table[EXTRACTION_LABEL] = pd.to_numeric(table[EXTRACTION_LABEL], errors='coerce').fillna(0)
+    return table[group_cols + [EXTRACTION_LABEL]], group_cols
+
+
+@dataclass(frozen=True)
+class SummaryView:
+    """Everything the summary page shows for one filter state."""
+    frame: pd.DataFrame # rows left after the sidebar and summary-page filters
+    diagnostics: list
+    totals: dict # see extraction_totals
+    table: pd.DataFrame # see summary_table
+
+
+def summary_view(df, water_years, county, filters):
+    """Applies the sidebar and summary-page filters and aggregates the result in one cacheable call."""
+    frame, diagnostics = filter_summary(filter_global(df, water_years, county), filters)
+    table = summary_table(frame)[0] if not frame.empty else pd.DataFrame()
+    return SummaryView(frame, diagnostics, extraction_totals(frame), table)
+
+
+def extraction_trend(df):
+    """Extraction per water year and source type, for the trend line chart."""
+    return df.groupby(['Water_Year_Str', 'Source_Type'])['Extraction_MCM'].sum().reset_index()
+
+
+def distribution(table, col):
+    """Positive extraction totals of the summary table grouped by one of its label columns."""
+    pie_data = table.groupby(col)[EXTRACTION_LABEL].sum().reset_index()
+    return pie_data[pie_data[EXTRACTION_LABEL] > 0]
+
+
+# --- Dam Section ---
+def dam_balance(df, selected_dam=ALL):
+    """Long-form balance components per water year; summed over dams when `selected_dam` is 'همه'."""
+    cols = [col for col in DAM_BALANCE_COLS if col in df.columns]
+    if not cols: return pd.DataFrame()
+    df_balance = df.groupby('Water_Year_Str')[cols].sum().reset_index() if selected_dam == ALL else df[['Water_Year_Str'] + cols]
+    return df_balance.melt(id_vars='Water_Year_Str', value_vars=cols, var_name='مولفه', value_name='حجم (MCM)')
+
+
+# --- Groundwater Section ---
+@dataclass(frozen=True)
+class GroundwaterSummary:
+    total_extraction_mcm: float
+    avg_depth_m: float # NaN when well depths are unavailable
+    num_subbasins: int
+
+
+def groundwater_summary(df):
+    avg_depth = df['Well_Depth_m'].mean() if 'Well_Depth_m' in df.columns else np.nan
+    return GroundwaterSummary(float(df['Extraction_MCM'].sum()), avg_depth, int(df['ID'].nunique()))
+
+
+def groundwater_usage_by_year(df):
+    return df.groupby(['Water_Year_Str', 'Usage_Type'])['Extraction_MCM'].sum().reset_index()
+
+
+def well_counts(df, by):
+    """Distinct wells per value of `by` by exact scan (falls back to subbasin IDs when well IDs are missing).
+
+    Dashboards with a Dataset use its WellCountSketch instead; both key wells the same way.
+    """
+    count_col = well_key_column(df) or 'ID'
+    return df.groupby(by)[count_col].nunique().reset_index().rename(columns={count_col: 'Count'})
+
+
+def extraction_scatter_frame(df):
+    """Rows with positive extraction and operating hours, or None if the columns are missing."""
+    if not all(c in df.columns for c in GW_SCATTER_COLS): return None
+    return df[(df['Extraction_MCM'] > 0) & (df['Operating_Hours'] > 0)]
+
+
+# --- Map ---
+def subbasin_totals(table):
+    """Extraction per subbasin ID (as string) from the summary table."""
+    map_data = table[[SUBBASIN_LABEL, EXTRACTION_LABEL]].copy()
+    map_data[SUBBASIN_LABEL] = map_data[SUBBASIN_LABEL].astype(str)
+    return map_data.groupby(SUBBASIN_LABEL)[EXTRACTION_LABEL].sum().reset_index()
+
+
+def subbasin_values(ids, table):
+    """Extraction per subbasin for the given IDs (0 where the table has none), with quartile classes.
+
+    Returns (frame, color_col, diagnostics); the frame has SUBBASIN_LABEL and
+    EXTRACTION_LABEL columns plus CLASS_LABEL when there are enough distinct
+    values, in which case color_col is the class column.
+    """
+    diagnostics = []
+    values = pd.DataFrame({SUBBASIN_LABEL: pd.Series(ids, dtype=object).astype(str).to_numpy()})
+    values = values.merge(subbasin_totals(table), on=SUBBASIN_LABEL, how='left')
+    values[EXTRACTION_LABEL] = values[EXTRACTION_LABEL].fillna(0)
+    color_col = EXTRACTION_LABEL
+    try:
+        non_zero_values = values[EXTRACTION_LABEL][values[EXTRACTION_LABEL] > 0]
+        if non_zero_values.nunique() >= 4:
+            classes = pd.qcut(non_zero_values, q=4, labels=False, duplicates='drop')
+            values[CLASS_LABEL] = ('کلاس ' + (classes + 1).astype(str)).reindex(values.index).fillna('بدون برداشت')
+            color_col = CLASS_LABEL
+        else: diagnostics.append(Diagnostic.info("تعداد مقادیر منحصر به فرد برای طبقه‌بندی کوانتایل کافی نیست. از مقادیر خام استفاده می‌شود.", code='too_few_classes'))
+    except Exception as e_class: diagnostics.append(Diagnostic.warning(f"خطا در طبقه‌بندی داده‌ها: {e_class}. از مقادیر خام استفاده می‌شود.", code='classification_failed'))
+    return values, color_col, diagnostics
+
+
+def map_frame(gdf, id_col, table):
+    """Joins subbasin totals onto the boundary polygons and adds quartile classes.
+
+    Returns (merged_gdf, color_col, diagnostics); color_col is the class column
+    when there are enough distinct values, otherwise the raw extraction column.
+    """
+    merged = gdf[[id_col, 'geometry']].copy()
+    merged[id_col] = merged[id_col].astype(str)
+    values, color_col, diagnostics = subbasin_values(merged[id_col], table)
+    for col in values.columns: merged[col] = values[col].to_numpy() # Same row order as the polygons
+    return merged, color_col, diagnostics
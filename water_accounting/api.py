@@ -0,0 +1,275 @@
+"""Read-only HTTP JSON API over the summary-page aggregates, for internal tools.
+
+The server runs on a daemon thread next to the dashboard and reads the same
+DatasetStore, so it always answers from the version the dashboard shows. Every
+request needs one of config.yaml's `api: tokens` (`Authorization: Bearer
+<token>` or `X-API-Token`); each token belongs to a username and is served the
+partition that user's `access` entry allows, never the rows outside it.
+
+Every response carries the version in a weak ETag built from the version, the
+token's scope and the normalized query alone: a matching If-None-Match is
+answered with 304 before anything is computed. Bodies are compact JSON with
+tables as columns (one list per column), gzipped once when they are cached, so
+repeated queries cost a dictionary lookup.
+
+    GET /api/v1/meta                       water years and filter values
+    GET /api/v1/totals?years=1402-03       extraction per source type
+    GET /api/v1/summary?county=مشهد        the summary table
+    GET /api/v1/timeseries?by=County       extraction per water year and value of `by`
+
+Filters: years (comma-separated, default all), county, study_area, usage_type,
+renewable_status ('همه' or absent = all) and source_type (e.g. Surface; 'All').
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .access import access_scope, partition_dataset
+from .aggregate import summary_view
+from .cache import bounded_cache
+from .constants import ALL, INVALID_YEARS, SOURCE_TYPE_LABELS, SUMMARY_COLUMN_LABELS
+from .filters import SummaryFilters
+from .pivots import COMPARISON_DIMENSIONS
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8600
+PREFIX = '/api/v1/'
+MIN_TOKEN_LENGTH = 16
+GZIP_MIN_BYTES = 1024 # Smaller bodies are sent as they are
+RESPONSE_CACHE = dict(max_bytes=64 * 1024 * 1024, max_entries=4096) # Encoded bodies per dataset version, scope and query
+PARTITION_CACHE = dict(max_entries=16) # Restricted tokens' partitions, when the caller does not share its own cache
+
+FILTER_PARAMS = ('years', 'county', 'study_area', 'usage_type', 'source_type', 'renewable_status')
+TIMESERIES_DIMENSIONS = ('Source_Type', 'County', 'Study_Area', 'Usage_Type', 'ID', 'Renewable_Status')
+SUMMARY_COLUMNS = {label: col for col, label in SUMMARY_COLUMN_LABELS.items()} # Persian header -> standardized name
+
+
+logger = logging.getLogger(__name__)
+
+
+class ApiError(Exception):
+    """A request the API cannot answer; `status` is the HTTP status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- Queries ---
+def _filters(params):
+    """(water years, SummaryFilters) from normalized query parameters."""
+    years = [year for year in params.get('years', '').split(',') if year]
+    source_type = params.get('source_type', 'All')
+    if source_type not in SOURCE_TYPE_LABELS.values(): raise ApiError(400, f"Unknown source_type {source_type!r}; use one of {list(SOURCE_TYPE_LABELS.values())}")
+    return years, SummaryFilters(county=params.get('county', ALL), study_area=params.get('study_area', ALL), usage_type=params.get('usage_type', ALL),
+                                 source_type=source_type, renewable_status=params.get('renewable_status', ALL))
+
+
+def _column(series):
+    """A column as a JSON list, missing values as null."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _meta(dataset, params):
+    catalog = dataset.catalog
+    options = lambda dimension: catalog.options(dimension)[1:] if catalog else []
+    return {
+        'years': list(catalog.years) if catalog else [], 'counties': options('County'), 'study_areas': catalog.groundwater_options('Study_Area')[1:] if catalog else [],
+        'usage_types': options('Usage_Type'), 'source_types': sorted(dataset.source_types), 'renewable_statuses': options('Renewable_Status'),
+        'timeseries_dimensions': list(TIMESERIES_DIMENSIONS),
+    }
+
+
+def _totals(dataset, params):
+    years, filters = _filters(params)
+    view = summary_view(dataset.frame, years, ALL, filters)
+    return {'rows': len(view.frame), 'totals': view.totals, 'total': sum(view.totals.values())}
+
+
+def _summary(dataset, params):
+    years, filters = _filters(params)
+    table = summary_view(dataset.frame, years, ALL, filters).table.rename(columns=SUMMARY_COLUMNS)
+    return {'columns': list(table.columns), 'data': {col: _column(table[col]) for col in table.columns}}
+
+
+def _timeseries(dataset, params):
+    years, filters = _filters(params)
+    by = params.get('by', 'Source_Type')
+    if by not in TIMESERIES_DIMENSIONS: raise ApiError(400, f"Unknown by {by!r}; use one of {list(TIMESERIES_DIMENSIONS)}")
+    pivot = dataset.pivot
+    if pivot is not None and by in COMPARISON_DIMENSIONS and filters == SummaryFilters(county=filters.county, source_type=filters.source_type):
+        # Only pivot axes are filtered: slice the precomputed year cube instead of the rows
+        source_type = ALL if filters.source_type == 'All' else filters.source_type
+        matrix = pivot.matrix(by, filters.county, source_type)
+        positions = [i for i, year in enumerate(pivot.years) if not years or year in years]
+        matrix, axis_years = matrix[positions], [pivot.years[i] for i in positions]
+        series = {str(value): matrix[:, j].tolist() for j, value in enumerate(pivot.labels[by]) if matrix[:, j].any()}
+        return {'by': by, 'years': axis_years, 'series': series}
+    frame = summary_view(dataset.frame, years, ALL, filters).frame
+    if by not in frame.columns: frame = frame.iloc[:0].assign(**{by: None})
+    frame = frame[frame['Water_Year_Str'].notna() & ~frame['Water_Year_Str'].isin(INVALID_YEARS)]
+    table = frame.groupby(['Water_Year_Str', by])['Extraction_MCM'].sum().unstack(fill_value=0.0).sort_index()
+    table = table.loc[:, (table != 0).any()]
+    return {'by': by, 'years': list(table.index), 'series': {str(value): table[value].tolist() for value in table.columns}}
+
+
+ENDPOINTS = {'meta': (_meta, ()), 'totals': (_totals, FILTER_PARAMS), 'summary': (_summary, FILTER_PARAMS), 'timeseries': (_timeseries, FILTER_PARAMS + ('by',))}
+
+
+def parse_query(path):
+    """(endpoint, normalized params) of a request path; params are a sorted tuple of (name, value) pairs."""
+    parts = urlsplit(path)
+    if not parts.path.startswith(PREFIX) or parts.path[len(PREFIX):].strip('/') not in ENDPOINTS:
+        raise ApiError(404, f"Unknown endpoint {parts.path}; use {PREFIX}{{{','.join(ENDPOINTS)}}}")
+    endpoint = parts.path[len(PREFIX):].strip('/')
+    allowed, params = ENDPOINTS[endpoint][1], {}
+    for name, values in parse_qs(parts.query).items():
+        if name not in allowed: raise ApiError(400, f"Unknown parameter {name!r} for {endpoint}; use {list(allowed)}")
+        if name == 'years': params[name] = ','.join(sorted({year for value in values for year in value.split(',') if year}))
+        else: params[name] = values[-1]
+    if params.get('years') == '': del params['years']
+    return endpoint, tuple(sorted(params.items()))
+
+
+def etag(dataset, endpoint, params):
+    scope = dataset.scope
+    scope = None if scope is None else (sorted(scope.counties), sorted(scope.subbasins)) # Sorted: frozenset order differs between processes
+    digest = hashlib.sha1(repr((scope, endpoint, params)).encode('utf-8')).hexdigest()[:16]
+    return f'W/"{dataset.version}-{digest}"' # Weak: the gzipped and plain bodies carry the same tag
+
+
+def accepts_gzip(accept_encoding):
+    """Whether an Accept-Encoding header allows gzip: listed, or covered by '*', with a non-zero q-value."""
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() != 'q': continue
+            try: q = float(value)
+            except ValueError: q = 0.0
+        if coding: weights[coding.lower()] = q
+    return weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0))) > 0
+
+
+# --- Authentication ---
+def token_scopes(api_config, access_config):
+    """{token: AccessScope} from config.yaml's `api: tokens` (token: username); each token sees what its user may see under `access`."""
+    tokens = {str(token): access_scope(access_config, username) for token, username in ((api_config or {}).get('tokens') or {}).items()}
+    if not tokens: raise ValueError("No API tokens configured (api: tokens in config.yaml)")
+    short = [user for token, user in api_config['tokens'].items() if len(str(token)) < MIN_TOKEN_LENGTH]
+    if short: raise ValueError(f"API tokens of {short} are shorter than {MIN_TOKEN_LENGTH} characters")
+    return tokens
+
+
+def request_scope(tokens, headers):
+    """The AccessScope of the request's token; ApiError 401 without a known one."""
+    scheme, _, credentials = headers.get('Authorization', '').partition(' ')
+    token = credentials.strip() if scheme.lower() == 'bearer' else headers.get('X-API-Token', '').strip()
+    if not token: raise ApiError(401, "Missing API token; send 'Authorization: Bearer <token>'")
+    scope = None
+    for known, known_scope in tokens.items(): # Compares every token in constant time, so timing does not reveal a prefix
+        if hmac.compare_digest(known.encode('utf-8'), token.encode('utf-8')): scope = known_scope
+    if scope is None: raise ApiError(401, "Unknown API token")
+    return scope
+
+
+@bounded_cache('api_partitions', key=lambda dataset, scope: (dataset.cache_key, scope), **PARTITION_CACHE)
+def scoped_dataset(dataset, scope):
+    return partition_dataset(dataset, scope)
+
+
+@bounded_cache('api_responses', key=lambda dataset, endpoint, params: (dataset.cache_key, endpoint, params), **RESPONSE_CACHE)
+def encoded_response(dataset, endpoint, params):
+    """(JSON body, gzipped body or None) of one query against `dataset`."""
+    payload = {'version': dataset.version, **ENDPOINTS[endpoint][0](dataset, dict(params))}
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+    return body, gzip.compress(body, compresslevel=6) if len(body) >= GZIP_MIN_BYTES else None
+
+
+# --- Server ---
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive: clients reuse one connection for many queries
+    server_version = 'WaterAccountingAPI/1'
+    disable_nagle_algorithm = True # Headers and body go out as separate writes; without this each response waits for a delayed ACK
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def _respond(self, head):
+        server = self.server
+        try:
+            scope = request_scope(server.tokens, self.headers)
+            endpoint, params = parse_query(self.path)
+            dataset = server.store.current()
+            if not scope.unrestricted: dataset = server.partition(dataset, scope)
+            tag = etag(dataset, endpoint, params)
+            if tag in (value.strip() for value in self.headers.get('If-None-Match', '').split(',')):
+                self._send(304, b'', {'ETag': tag, 'Cache-Control': 'private, no-cache'}, head=True)
+                return
+            body, gzipped = encoded_response(dataset, endpoint, params)
+            headers = {'ETag': tag, 'Cache-Control': 'private, no-cache', 'Vary': 'Accept-Encoding, Authorization, X-API-Token', 'X-Dataset-Version': str(dataset.version)}
+            if gzipped is not None and accepts_gzip(self.headers.get('Accept-Encoding', '')): body, headers['Content-Encoding'] = gzipped, 'gzip'
+            self._send(200, body, headers, head)
+        except ApiError as e:
+            headers = {'WWW-Authenticate': 'Bearer realm="water-accounting"'} if e.status == 401 else {}
+            self._send(e.status, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'), headers, head)
+        except Exception: # Details stay in the server log; the client only learns that the request failed
+            logger.exception("API request %s failed", self.path)
+            self._send(500, json.dumps({'error': "Internal server error"}).encode('utf-8'), {}, head)
+
+    def _send(self, status, body, headers, head):
+        self.send_response(status)
+        if status != 304: self.send_header('Content-Type', 'application/json; charset=utf-8')
+        for name, value in headers.items(): self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)) if status != 304 else '0')
+        self.end_headers()
+        if not head: self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # Hundreds of requests per second would flood the dashboard's console
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class QueryApi:
+    """Serves the API for `store` (a DatasetStore) on a daemon thread; port 0 picks a free port.
+
+    `tokens` maps each accepted token to its AccessScope (see token_scopes);
+    `partition(dataset, scope)` returns a restricted scope's dataset, by default
+    from this module's own cache.
+    """
+
+    def __init__(self, store, tokens, host=DEFAULT_HOST, port=DEFAULT_PORT, partition=None):
+        if not tokens: raise ValueError("The API needs at least one token")
+        self._server = _Server((host, int(port)), _Handler)
+        self._server.store, self._server.tokens, self._server.partition = store, dict(tokens), partition or scoped_dataset
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{PREFIX}"
+
+    def start(self):
+        """Starts serving once; returns self."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever, name='water-accounting-api', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
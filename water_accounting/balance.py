@@ -0,0 +1,90 @@
+"""Dam water-balance closure: residuals and derived indicators for every dam and year.
+
+The measures are repeated on each usage row of a dam-year, so the engine keeps
+the first row per (dam, year) and sums extraction across them. Everything after
+the grouping is plain NumPy over a (dam-years × measures) matrix.
+"""
+import numpy as np
+import pandas as pd
+
+from .constants import DAM_SOURCE_TYPES, INVALID_YEARS
+
+BALANCE_KEYS = ['Source_Type', 'Source_Name', 'County', 'Water_Year_Str']
+INPUT_COLS = ['Inflow', 'Other_Input']
+OUTPUT_COLS = ['Leakage', 'Pumping_Out', 'Drainage', 'Evaporation', 'Sediment_Discharge', 'Intake_Discharge', 'Spillway_Discharge']
+STORAGE_COLS = ['Volume_Start_Year', 'Volume_End_Year']
+REPORTED_TOTAL_COLS = ['Total_Input', 'Total_Outflow']
+# |residual| above this share of the larger of inputs and outputs flags the dam-year as an anomaly
+RESIDUAL_TOLERANCE = 0.1
+# Robust z-score (median / MAD) above which a residual is an outlier among all dam-years
+OUTLIER_Z = 3.5
+
+BALANCE_LABELS = {
+    'Source_Name': 'سد', 'County': 'شهرستان', 'Water_Year_Str': 'سال آبی', 'Delta_Storage': 'تغییر ذخیره', 'Inputs': 'ورودی‌ها',
+    'Outputs': 'خروجی‌ها', 'Residual': 'باقیمانده بیلان', 'Relative_Residual': 'باقیمانده نسبی', 'Residual_Z': 'امتیاز z', 'Anomaly': 'ناهنجاری',
+}
+
+
+def _empty_table():
+    return pd.DataFrame(columns=BALANCE_KEYS + ['Delta_Storage', 'Inputs', 'Outputs', 'Residual', 'Relative_Residual', 'Residual_Z', 'Anomaly'])
+
+
+def balance_table(df):
+    """One row per dam and water year with ΔStorage, inputs, outputs and the closure residual.
+
+    Residual = ΔStorage − (inputs − outputs); positive means storage grew more
+    than the recorded flows explain. Also reports the gap between the reported
+    totals and the component sums, evaporation and spill shares, and an anomaly flag.
+    Rows missing a key column or with an invalid year are left out:
+
+    >>> cols = dict.fromkeys(STORAGE_COLS + INPUT_COLS + OUTPUT_COLS, [1.0, 2.0])
+    >>> frame = pd.DataFrame({'Source_Type': 'Surface', 'Source_Name': ['A', None], 'County': 'C', 'Water_Year_Str': '1402-03', **cols})
+    >>> balance_table(frame)['Source_Name'].tolist()
+    ['A']
+    """
+    if df.empty or 'Source_Type' not in df.columns: return _empty_table()
+    dams = df[df['Source_Type'].isin(DAM_SOURCE_TYPES)]
+    measure_cols = STORAGE_COLS + INPUT_COLS + OUTPUT_COLS
+    if dams.empty or any(col not in dams.columns for col in measure_cols): return _empty_table()
+    keys = [col for col in BALANCE_KEYS if col in dams.columns]
+    dams = dams.dropna(subset=keys) # A row without a dam, county or year belongs to no dam-year (ngroup would give it -1)
+    if 'Water_Year_Str' in keys: dams = dams[~dams['Water_Year_Str'].isin(INVALID_YEARS)] # Ingest writes a missing year as 'nan'
+    if dams.empty: return _empty_table()
+
+    group = dams.groupby(keys, sort=True, observed=True).ngroup().to_numpy()
+    _, first = np.unique(group, return_index=True) # First row of each dam-year, in group order
+    m = dams[measure_cols].to_numpy(dtype='float64')[first]
+    n_storage, n_inputs = len(STORAGE_COLS), len(INPUT_COLS)
+    delta_storage = m[:, 1] - m[:, 0]
+    inputs = m[:, n_storage:n_storage + n_inputs].sum(axis=1)
+    outputs = m[:, n_storage + n_inputs:].sum(axis=1)
+    residual = delta_storage - (inputs - outputs)
+    scale = np.maximum(inputs, outputs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = np.where(scale > 0, residual / scale, np.nan)
+        evaporation_share = np.where(outputs > 0, m[:, measure_cols.index('Evaporation')] / outputs, np.nan)
+        spill_share = np.where(outputs > 0, m[:, measure_cols.index('Spillway_Discharge')] / outputs, np.nan)
+    mad = np.median(np.abs(residual - np.median(residual))) if residual.size else 0.0
+    z = 0.6745 * (residual - np.median(residual)) / mad if mad > 0 else np.zeros_like(residual)
+
+    table = dams.iloc[first][keys].reset_index(drop=True)
+    table['Volume_Start_Year'], table['Volume_End_Year'] = m[:, 0], m[:, 1]
+    for i, col in enumerate(INPUT_COLS + OUTPUT_COLS): table[col] = m[:, n_storage + i] # Components, for the scenario simulator
+    table['Delta_Storage'], table['Inputs'], table['Outputs'] = delta_storage, inputs, outputs
+    table['Residual'], table['Relative_Residual'], table['Residual_Z'] = residual, relative, z
+    table['Anomaly'] = (np.abs(np.nan_to_num(relative)) > RESIDUAL_TOLERANCE) | (np.abs(z) > OUTLIER_Z)
+    if all(col in dams.columns for col in REPORTED_TOTAL_COLS):
+        reported = dams[REPORTED_TOTAL_COLS].to_numpy(dtype='float64')[first]
+        table['Reported_Input_Gap'] = reported[:, 0] - inputs
+        table['Reported_Outflow_Gap'] = reported[:, 1] - outputs
+    table['Evaporation_Share'], table['Spill_Share'] = evaporation_share, spill_share
+    if 'Extraction_MCM' in dams.columns: table['Extraction_MCM'] = np.bincount(group, weights=dams['Extraction_MCM'].to_numpy(dtype='float64'))
+    return table
+
+
+def residual_ranking(table, limit=None, anomalies_only=False):
+    """Dam-years ordered by absolute closure residual, largest first."""
+    if table.empty: return table
+    ranked = table[table['Anomaly']] if anomalies_only else table
+    ranked = ranked.iloc[np.argsort(-np.abs(ranked['Residual'].to_numpy()), kind='stable')]
+    return ranked.head(limit) if limit else ranked
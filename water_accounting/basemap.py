@@ -0,0 +1,143 @@
+"""Offline raster basemap: a local {z}/{x}/{y} tile cache served from the Streamlit static folder.
+
+The cache is seeded once, either by downloading the tiles that cover the study
+area from a tile server or by unpacking an MBTiles file (the static file server
+only serves plain files). Maps then fetch basemap tiles from the app itself, so
+render latency is local and no internet access is needed.
+"""
+import json
+import math
+import os
+import sqlite3
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+
+from .tiles import tile_range
+
+ONLINE_URL = 'https://a.basemaps.cartocdn.com/light_all/{z}/{x}/{y}.png'
+ONLINE_ATTRIBUTION = '© OpenStreetMap contributors © CARTO'
+MIN_ZOOM, MAX_ZOOM = 5, 12
+METADATA_FILE = 'metadata.json'
+RASTER_FORMATS = ('png', 'jpg', 'jpeg', 'webp')
+USER_AGENT = 'water-accounting-basemap-seeder'
+# The tile map's JavaScript library, copied next to the basemap so offline maps need no CDN either
+MAPLIBRE_CDN = 'https://unpkg.com/maplibre-gl@4.7.1/dist/'
+MAPLIBRE_FILES = ('maplibre-gl.js', 'maplibre-gl.css')
+_HALF_WORLD = 20037508.342789244
+
+
+@dataclass(frozen=True)
+class Basemap:
+    """Where a map takes its basemap tiles from; `url` may be relative to the app (local cache)."""
+    url: str
+    attribution: str = ''
+    min_zoom: int = 0
+    max_zoom: int = 20
+    local: bool = False
+
+
+ONLINE = Basemap(ONLINE_URL, ONLINE_ATTRIBUTION)
+
+
+def mercator_bounds(bounds):
+    """WGS84 (minx, miny, maxx, maxy) in Web Mercator metres."""
+    def y(lat): return math.log(math.tan(math.pi / 4 + math.radians(max(min(lat, 85.0511), -85.0511)) / 2)) * _HALF_WORLD / math.pi
+    minx, miny, maxx, maxy = bounds
+    return minx * _HALF_WORLD / 180, y(miny), maxx * _HALF_WORLD / 180, y(maxy)
+
+
+def tile_list(bounds, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """(z, x, y) of every tile covering WGS84 `bounds`."""
+    projected = mercator_bounds(bounds)
+    tiles = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        x0, y0, x1, y1 = tile_range(projected, zoom)
+        tiles.extend((zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+    return tiles
+
+
+def _write_metadata(out_dir, **metadata):
+    with open(os.path.join(out_dir, METADATA_FILE), 'w', encoding='utf-8') as f: json.dump(metadata, f, ensure_ascii=False)
+    return metadata
+
+
+def read_basemap_metadata(out_dir):
+    """metadata.json of a seeded tile cache, or None if it was never seeded."""
+    try:
+        with open(os.path.join(out_dir, METADATA_FILE), encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+def download(url, path, timeout=30):
+    """Fetches `url` into `path` (written via a temporary name); existing files are kept."""
+    if os.path.exists(path): return False
+    request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response: data = response.read()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.part', 'wb') as f: f.write(data)
+    os.replace(path + '.part', path)
+    return True
+
+
+def seed_from_url(bounds, out_dir, url=ONLINE_URL, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, attribution=ONLINE_ATTRIBUTION, workers=4, progress=None):
+    """Downloads the tiles covering WGS84 `bounds` from a {z}/{x}/{y} tile server into `out_dir`.
+
+    Tiles already on disk are skipped, so an interrupted run can be resumed.
+    `progress(done, total)` is called as tiles finish. Returns the metadata;
+    its 'failed' entry counts tiles that could not be fetched.
+    """
+    fmt = os.path.splitext(url.split('?')[0])[1].lstrip('.') or 'png'
+    tiles = tile_list(bounds, min_zoom, max_zoom)
+    failed, done = [], 0
+
+    def fetch(tile):
+        z, x, y = tile
+        try: download(url.format(z=z, x=x, y=y), os.path.join(out_dir, str(z), str(x), f'{y}.{fmt}'))
+        except Exception: failed.append(tile)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in pool.map(fetch, tiles):
+            done += 1
+            if progress: progress(done, len(tiles))
+    return _write_metadata(out_dir, format=fmt, minzoom=min_zoom, maxzoom=max_zoom, bounds=list(bounds), attribution=attribution,
+                           source=url, tile_count=len(tiles) - len(failed), failed=len(failed))
+
+
+def seed_maplibre(out_dir):
+    """Copies the MapLibre GL script and stylesheet into `out_dir`; returns their paths."""
+    paths = [os.path.join(out_dir, name) for name in MAPLIBRE_FILES]
+    for name, path in zip(MAPLIBRE_FILES, paths): download(MAPLIBRE_CDN + name, path)
+    return paths
+
+
+def seed_from_mbtiles(path, out_dir, progress=None):
+    """Unpacks the raster tiles of an MBTiles file into `out_dir`; returns the metadata.
+
+    MBTiles stores rows in TMS order (y counted from the south), so rows are flipped.
+    """
+    with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as db:
+        info = dict(db.execute('SELECT name, value FROM metadata').fetchall())
+        fmt = info.get('format', 'png').lower()
+        if fmt not in RASTER_FORMATS: raise ValueError(f"MBTiles format '{fmt}' is not a raster basemap ({', '.join(RASTER_FORMATS)})")
+        total = db.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+        zooms = []
+        for done, (z, x, tms_y, data) in enumerate(db.execute('SELECT zoom_level, tile_column, tile_row, tile_data FROM tiles'), 1):
+            tile_dir = os.path.join(out_dir, str(z), str(x))
+            os.makedirs(tile_dir, exist_ok=True)
+            with open(os.path.join(tile_dir, f'{(1 << z) - 1 - tms_y}.{fmt}'), 'wb') as f: f.write(data)
+            zooms.append(z)
+            if progress: progress(done, total)
+    bounds = [float(v) for v in info['bounds'].split(',')] if info.get('bounds') else None
+    return _write_metadata(out_dir, format=fmt, minzoom=min(zooms, default=0), maxzoom=max(zooms, default=0), bounds=bounds,
+                           attribution=info.get('attribution', ''), source=os.path.basename(path), tile_count=total, failed=0)
+
+
+def local_basemap(out_dir, url_prefix):
+    """Basemap served from a seeded cache at `url_prefix` (e.g. 'app/static/basemap'), or None if not seeded."""
+    metadata = read_basemap_metadata(out_dir)
+    if not metadata or not metadata.get('tile_count'): return None
+    return Basemap(f"{url_prefix.rstrip('/')}/{{z}}/{{x}}/{{y}}.{metadata['format']}", metadata.get('attribution', ''),
+                   int(metadata['minzoom']), int(metadata['maxzoom']), local=True)
@@ -0,0 +1,63 @@
+"""Reading zipped subbasin boundary shapefiles."""
+import io
+import os
+import tempfile
+import zipfile
+from dataclasses import dataclass, field
+
+from .diagnostics import Diagnostic
+
+LIKELY_ID_COLUMNS = ('ID', 'SUBBASINID', 'SUBBASIN_I', 'IDENTIFIER', 'CODE')
+DEFAULT_CENTER = {"lat": 36.0, "lon": 58.0}
+
+
+@dataclass
+class BoundaryResult:
+    """Boundary polygons in EPSG:4326 (None if reading failed) plus diagnostics."""
+    gdf: object
+    diagnostics: list = field(default_factory=list)
+
+
+def read_boundary_zip(data):
+    """Reads the first .shp inside a zip archive given as bytes."""
+    try:
+        import geopandas as gpd
+    except ImportError:
+        return BoundaryResult(None, [Diagnostic.error("کتابخانه geopandas یافت نشد. لطفاً آن را نصب کنید: pip install geopandas", code='missing_geopandas')])
+    diagnostics = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as z:
+            shp_file_path = next((name for name in z.namelist() if name.lower().endswith(".shp")), None)
+            if shp_file_path is None: return BoundaryResult(None, [Diagnostic.error("فایل .shp در فایل فشرده یافت نشد.", code='missing_shp')])
+            with tempfile.TemporaryDirectory() as tmpdir:
+                z.extractall(path=tmpdir)
+                shp_full_path = os.path.join(tmpdir, shp_file_path)
+                if not os.path.exists(shp_full_path): return BoundaryResult(None, [Diagnostic.error("خطا در استخراج یا یافتن فایل .shp در مسیر موقت.", code='extract_failed')])
+                gdf = gpd.read_file(shp_full_path)
+        if gdf.crs is None:
+            gdf = gdf.set_crs("EPSG:4326")
+            diagnostics.append(Diagnostic.warning("سیستم مختصات (CRS) برای شیپ‌فایل مشخص نشده بود. EPSG:4326 (WGS84) به عنوان پیش‌فرض در نظر گرفته شد.", code='missing_crs'))
+        return BoundaryResult(gdf.to_crs("EPSG:4326"), diagnostics)
+    except zipfile.BadZipFile: return BoundaryResult(None, [Diagnostic.error("فایل آپلود شده یک فایل فشرده (zip) معتبر نیست.", code='bad_zip')])
+    except Exception as e: return BoundaryResult(None, [Diagnostic.error(f"خطا در خواندن شیپ‌فایل: {e}", code='read_failed')])
+
+
+def read_boundary_file(path):
+    """Reads a zipped shapefile from disk."""
+    with open(path, 'rb') as f: return read_boundary_zip(f.read())
+
+
+def guess_id_column(columns):
+    """Index of the column most likely holding the subbasin ID (0 if none looks like one)."""
+    columns = list(columns)
+    likely_id_cols = [col for col in columns if col.upper() in LIKELY_ID_COLUMNS]
+    return columns.index(likely_id_cols[0]) if likely_id_cols else 0
+
+
+def map_center(gdf):
+    """Mean centroid of the polygons, computed in a projected CRS; falls back to Khorasan Razavi."""
+    try:
+        centroids = gdf.geometry.to_crs(gdf.geometry.estimate_utm_crs()).centroid.to_crs("EPSG:4326")
+        return {"lat": float(centroids.y.mean()), "lon": float(centroids.x.mean())}
+    except Exception:
+        return dict(DEFAULT_CENTER)
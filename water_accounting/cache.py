@@ -0,0 +1,190 @@
+"""Bounded in-process caches: size-aware LRU eviction, entry/byte budgets, TTLs and counters.
+
+Every cache registers itself by name so a diagnostics page can list hit, miss,
+eviction and byte counters for all of them. Misses are single-flight: callers
+asking for a key that is already being computed wait for that computation.
+"""
+import dataclasses
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+_REGISTRY = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _geometry_bytes(frame):
+    """Coordinates held by a GeoDataFrame's geometries (pandas reports only the pointer array)."""
+    try:
+        import shapely
+        return int(shapely.get_num_coordinates(np.asarray(frame.geometry.values)).sum()) * 16
+    except Exception: return 0 # Not a GeoDataFrame, or shapely unavailable
+
+
+def estimate_bytes(value, _depth=0):
+    """Approximate memory held by `value`: deep for frames and arrays, recursive for containers and dataclasses."""
+    if isinstance(value, pd.DataFrame): return int(value.memory_usage(deep=True).sum()) + (_geometry_bytes(value) if 'geometry' in value.columns else 0)
+    if isinstance(value, pd.Series): return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray): return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)): return sys.getsizeof(value)
+    if _depth > 3: return sys.getsizeof(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return sys.getsizeof(value) + sum(estimate_bytes(getattr(value, f.name), _depth + 1) for f in dataclasses.fields(value))
+    if isinstance(value, dict): return sys.getsizeof(value) + sum(estimate_bytes(k, _depth + 1) + estimate_bytes(v, _depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)): return sys.getsizeof(value) + sum(estimate_bytes(v, _depth + 1) for v in value)
+    return sys.getsizeof(value)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    name: str
+    entries: int
+    max_entries: int # 0 = unlimited
+    bytes: int
+    max_bytes: int # 0 = unlimited
+    ttl: float # seconds, 0 = never expires
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    coalesced: int # misses that waited for an in-flight computation instead of repeating it
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class BoundedCache:
+    """Thread-safe LRU cache bounded by entry count and estimated bytes, with an optional TTL.
+
+    A value larger than the whole byte budget is returned to the caller but not stored.
+    `get_or_compute` computes each missing key once, however many threads miss it together.
+    """
+
+    def __init__(self, name, max_bytes=0, max_entries=0, ttl=0, sizer=estimate_bytes):
+        self.name, self.max_bytes, self.max_entries, self.ttl = name, int(max_bytes), int(max_entries), float(ttl)
+        self._sizer = sizer
+        self._entries = OrderedDict() # key -> (value, size, stored_at)
+        self._inflight = {} # key -> Future of the computation under way
+        self._lock = threading.RLock()
+        self._bytes = self.hits = self.misses = self.evictions = self.expirations = self.coalesced = 0
+        with _REGISTRY_LOCK: _REGISTRY[name] = self
+
+    def _expired(self, stored_at, now):
+        return self.ttl > 0 and now - stored_at > self.ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[2], time.monotonic()):
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and not self._expired(entry[2], time.monotonic())
+
+    def put(self, key, value):
+        size = self._sizer(value)
+        with self._lock:
+            if key in self._entries: self._remove(key)
+            if self.max_bytes and size > self.max_bytes: return value
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            self._evict()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Cached value for `key`, calling `compute()` and storing its result on a miss.
+
+        Concurrent misses of one key share a single `compute()` call; its exception
+        is raised in every waiting caller and nothing is stored. If the computing
+        thread is interrupted (e.g. a Streamlit rerun), a waiter takes over.
+        """
+        sentinel = object()
+        while True:
+            with self._lock:
+                value = self.get(key, sentinel)
+                if value is not sentinel: return value
+                future = self._inflight.get(key)
+                if future is None:
+                    future = self._inflight[key] = Future()
+                    break
+                self.coalesced += 1
+            try: return future.result()
+            except CancelledError: continue
+        try:
+            value = self.put(key, compute())
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.cancel() # Not this caller's error to share (interrupts, exits)
+            raise
+        finally:
+            with self._lock: self._inflight.pop(key, None)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, (_, _, stored_at) in self._entries.items() if self._expired(stored_at, now)]:
+            self._remove(key)
+            self.expirations += 1
+        while self._entries and ((self.max_entries and len(self._entries) > self.max_entries) or (self.max_bytes and self._bytes > self.max_bytes)):
+            self._remove(next(iter(self._entries))) # Least recently used first
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(self.name, len(self._entries), self.max_entries, self._bytes, self.max_bytes, self.ttl,
+                              self.hits, self.misses, self.evictions, self.expirations, self.coalesced)
+
+
+def bounded_cache(name, max_bytes=0, max_entries=0, ttl=0, key=None):
+    """Decorator caching a function in a BoundedCache; `key(*args, **kwargs)` builds the cache key (default: the arguments)."""
+    def decorator(func):
+        cache = BoundedCache(name, max_bytes, max_entries, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            return cache.get_or_compute(cache_key, lambda: func(*args, **kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def get_cache(name):
+    return _REGISTRY.get(name)
+
+
+def all_cache_stats():
+    """CacheStats of every registered cache, in registration order."""
+    with _REGISTRY_LOCK: caches = list(_REGISTRY.values())
+    return [cache.stats() for cache in caches]
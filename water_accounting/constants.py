@@ -0,0 +1,63 @@
+"""Shared labels, source mappings and column groups for the water accounting data."""
+import os
+
+try:
+    BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+except NameError:
+    BASE_DIR = os.getcwd() # Fallback
+
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+QUARANTINE_DIR = os.path.join(DATA_DIR, 'quarantine') # Rows that failed validation, one CSV per source file
+DAM_DATA_PATH = os.path.join(BASE_DIR, 'data/Dam_6Apr25.txt')
+GW_DATA_PATH = os.path.join(BASE_DIR, 'data/GW_6Apr25.txt')
+TRANSFER_DATA_PATH = os.path.join(BASE_DIR, 'Transfer_Data.txt')
+WASTEWATER_DATA_PATH = os.path.join(BASE_DIR, 'Wastewater_Data.txt')
+DEFAULT_BOUNDARY_ZIP = os.path.join(BASE_DIR, 'data/final_boundary_fixed.zip')
+
+# --- Filter Sentinels ---
+ALL = "همه"
+UNKNOWN = "نامشخص"
+INVALID_YEARS = ['nan', UNKNOWN, 'None']
+
+# --- Source Types ---
+SURFACE = 'Surface'
+GROUNDWATER = 'Groundwater'
+TRANSFER = 'Transfer'
+WASTEWATER = 'Wastewater'
+DAM_SOURCE_TYPES = [SURFACE, TRANSFER]
+TRANSFER_DAM_NAMES = ['سد دوستی']
+
+# Display label -> Source_Type value, in the order the summary filter shows them
+SOURCE_TYPE_LABELS = {"همه": "All", "آب سطحی (سد)": SURFACE, "آب زیرزمینی": GROUNDWATER, "آب انتقالی": TRANSFER, "تصفیه خانه": WASTEWATER}
+RENEWABLE_OPTIONS = [ALL, "تجدیدپذیر", "تجدیدناپذیر", UNKNOWN]
+
+# --- Raw File Mappings ---
+DAM_EXPECTED_COLS = ['Year', 'Name of Dam', 'تراز انتهای سال آبی', 'تراز ابتدای سال آبی', 'حجم انتهای سال آبی', 'حجم ابتدای سال آبی', 'ورودی', 'سایر', 'كل', 'نشتي', 'پمپاژ', 'زهكش', 'تبخير', 'تخلیه رسوب', 'دريچه آبگيري', 'سرريز', 'کل', 'Type of Use', 'ID', 'Value', 'sharestan']
+DAM_RENAME_MAP = {'Year': 'Water_Year_Str', 'Name of Dam': 'Dam_Name', 'تراز انتهای سال آبی': 'Level_End_Year', 'تراز ابتدای سال آبی': 'Level_Start_Year', 'حجم انتهای سال آبی': 'Volume_End_Year', 'حجم ابتدای سال آبی': 'Volume_Start_Year', 'ورودی': 'Inflow', 'سایر': 'Other_Input', 'كل': 'Total_Input', 'نشتي': 'Leakage', 'پمپاژ': 'Pumping_Out', 'زهكش': 'Drainage', 'تبخير': 'Evaporation', 'تخلیه رسوب': 'Sediment_Discharge', 'دريچه آبگيري': 'Intake_Discharge', 'سرريز': 'Spillway_Discharge', 'کل': 'Total_Outflow', 'Type of Use': 'Usage_Type', 'ID': 'SubBasin_ID', 'Value': 'Dam_Extraction_Value', 'sharestan': 'County'}
+GW_EXPECTED_COLS = ['سال آبي', 'اشتراک', 'امور', 'اشتراک برق', 'محدوده مطالعاتي', 'شهرستان', 'MA_XUTM', 'MA_YUTM', 'عمق چاه', 'دبي', 'ساعت کارکرد', 'اضافه کسربرداشت', 'تخليه مترمکعب', 'نوع چاه', 'نوع مصرف', 'نيرو محرکه', 'وضعيت چاه', 'برداشت واقعي', 'کنتور هوشمند', 'conat', 'ID']
+GW_RENAME_MAP = {'سال آبي': 'Water_Year_Str', 'اشتراک': 'Subscription_ID', 'امور': 'Department', 'اشتراک برق': 'Electricity_Subscription', 'محدوده مطالعاتي': 'Study_Area', 'شهرستان': 'County', 'MA_XUTM': 'X_UTM', 'MA_YUTM': 'Y_UTM', 'عمق چاه': 'Well_Depth_m', 'دبي': 'Flow_Rate_ls', 'ساعت کارکرد': 'Operating_Hours', 'اضافه کسربرداشت': 'Over_Under_Extraction_m3', 'تخليه مترمکعب': 'Discharge_m3', 'نوع چاه': 'Well_Type', 'نوع مصرف': 'Usage_Type', 'نيرو محرکه': 'Power_Source', 'وضعيت چاه': 'Well_Status', 'برداشت واقعي': 'Actual_Extraction_m3', 'کنتور هوشمند': 'Smart_Meter', 'conat': 'Coordinates_Text', 'ID': 'SubBasin_ID'}
+TRANSFER_EXPECTED_COLS = ['Water_Year', 'Source_Name', 'Extraction_MCM', 'Usage_Type', 'County', 'ID', 'Renewable_Status']
+TRANSFER_RENAME_MAP = {'Water_Year': 'Water_Year_Str', 'Source_Name': 'Transfer_Source_Name', 'Extraction_MCM': 'Extraction_MCM', 'Usage_Type': 'Usage_Type', 'County': 'County', 'ID': 'SubBasin_ID', 'Renewable_Status': 'Renewable_Status'}
+WW_EXPECTED_COLS = ['Water_Year', 'Plant_Name', 'Treated_Volume_MCM', 'Usage_Type', 'County', 'ID', 'Renewable_Status']
+WW_RENAME_MAP = {'Water_Year': 'Water_Year_Str', 'Plant_Name': 'WW_Plant_Name', 'Treated_Volume_MCM': 'Extraction_MCM', 'Usage_Type': 'Usage_Type', 'County': 'County', 'ID': 'SubBasin_ID', 'Renewable_Status': 'Renewable_Status'}
+
+# --- Standardized Column Groups ---
+BASE_COLS = ['Extraction_MCM', 'ID', 'Source_Type', 'Source_Name', 'Usage_Type', 'County', 'Water_Year_Str', 'Renewable_Status']
+# Measures are converted to float64 once at ingest; the view layer never touches dtypes
+DAM_MEASURE_COLS = ['Volume_Start_Year', 'Volume_End_Year', 'Level_Start_Year', 'Level_End_Year', 'Inflow', 'Other_Input', 'Total_Input', 'Leakage', 'Pumping_Out', 'Drainage', 'Evaporation', 'Sediment_Discharge', 'Intake_Discharge', 'Spillway_Discharge', 'Total_Outflow']
+GW_MEASURE_COLS = ['Well_Depth_m', 'Operating_Hours', 'Flow_Rate_ls', 'Actual_Extraction_m3', 'Over_Under_Extraction_m3', 'Discharge_m3']
+# Identifiers are kept as strings; the first one present identifies a well across years
+GW_ID_COLS = ['Well_ID_Orig', 'Subscription_ID', 'Electricity_Subscription']
+GW_EXTRA_COLS = ['Study_Area', 'Well_Type', 'Well_Status'] + GW_MEASURE_COLS + GW_ID_COLS
+DAM_EXTRA_COLS = list(DAM_MEASURE_COLS)
+DAM_BALANCE_COLS = ['Inflow', 'Leakage', 'Pumping_Out', 'Drainage', 'Evaporation', 'Sediment_Discharge', 'Intake_Discharge', 'Spillway_Discharge', 'Extraction_MCM']
+GW_SCATTER_COLS = ['Extraction_MCM', 'Operating_Hours', 'Flow_Rate_ls']
+
+# --- Summary Table Labels ---
+EXTRACTION_LABEL = 'برداشت (MCM)'
+SUMMARY_COLUMN_LABELS = {'Extraction_MCM': EXTRACTION_LABEL, 'ID': 'شناسه زیرحوضه', 'Usage_Type': 'کاربری', 'County': 'شهرستان', 'Source_Type': 'طبقه‌بندی منبع', 'Source_Name': 'نام منبع', 'Renewable_Status': 'وضعیت تجدیدپذیری'}
+# Persian headers for exported detail frames (columns without a label keep their standardized name)
+EXPORT_COLUMN_LABELS = {**SUMMARY_COLUMN_LABELS, 'Water_Year_Str': 'سال آبی', 'Study_Area': 'محدوده مطالعاتی', 'Well_Type': 'نوع چاه', 'Well_Status': 'وضعیت چاه'}
+SUMMARY_GROUP_COLS = ['طبقه‌بندی منبع', 'نام منبع', 'شناسه زیرحوضه', 'شهرستان', 'کاربری', 'وضعیت تجدیدپذیری']
+SUBBASIN_LABEL = 'شناسه زیرحوضه'
+CLASS_LABEL = 'کلاس_برداشت'
@@ -0,0 +1,32 @@
+"""Structured diagnostics returned by the engine instead of calling st.error/st.warning."""
+from dataclasses import dataclass
+
+ERROR = 'error'
+WARNING = 'warning'
+INFO = 'info'
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """One problem found while processing data; `message` is ready to show to analysts."""
+    level: str
+    message: str
+    source: str = ''
+    code: str = ''
+
+    @classmethod
+    def error(cls, message, source='', code=''):
+        return cls(ERROR, message, source, code)
+
+    @classmethod
+    def warning(cls, message, source='', code=''):
+        return cls(WARNING, message, source, code)
+
+    @classmethod
+    def info(cls, message, source='', code=''):
+        return cls(INFO, message, source, code)
+
+
+def visible(diagnostics):
+    """Returns the diagnostics worth showing in the UI (errors and warnings)."""
+    return [d for d in diagnostics if d.level in (ERROR, WARNING)]
@@ -0,0 +1,88 @@
+"""Dimension catalog: ordered filter values and parent→child mappings built once at ingest.
+
+Widget option lists are looked up here instead of running `sorted(df[col].unique())`
+over the full frame on every rerun, so they are cheap and stable across reruns.
+"""
+from dataclasses import dataclass, field
+
+from .constants import ALL, GROUNDWATER, INVALID_YEARS, UNKNOWN
+
+# Dimensions offered as filter options
+DIMENSIONS = ['Water_Year_Str', 'County', 'Study_Area', 'Usage_Type', 'Source_Type', 'Source_Name', 'Well_Type', 'Well_Status']
+# Dimensions other filters cascade from; every (parent, child) pair gets a mapping
+PARENT_DIMENSIONS = ['Water_Year_Str', 'County', 'Source_Type']
+
+
+def _ordered(values, reverse=False):
+    try: return tuple(sorted(values, reverse=reverse))
+    except TypeError: return tuple(sorted(values, key=str, reverse=reverse)) # Mixed types in a badly typed column
+
+
+@dataclass
+class DimensionCatalog:
+    """Ordered distinct values per dimension plus parent value → child values mappings."""
+    values: dict # dimension -> tuple of values in display order
+    children: dict # (parent, child) -> {parent value: frozenset of child values}
+    _memo: dict = field(default_factory=dict, repr=False, compare=False)
+
+    @property
+    def years(self):
+        """Valid water years, newest first."""
+        return self.values.get('Water_Year_Str', ())
+
+    @property
+    def latest_year(self):
+        return self.years[0] if self.years else None
+
+    def options(self, dimension, include_unknown=True, **parents):
+        """['همه'] plus the values of `dimension` that co-occur with every given parent filter.
+
+        Parent filters are keyword arguments named after a parent dimension; each
+        takes one value or a list of values (union). 'همه', None and empty lists
+        are ignored, e.g. `options('Source_Name', Source_Type=['Surface', 'Transfer'], County='مشهد')`.
+        """
+        key = (dimension, include_unknown, tuple(sorted((p, v if isinstance(v, str) or v is None else tuple(v)) for p, v in parents.items())))
+        cached = self._memo.get(key)
+        if cached is None:
+            cached = (ALL,) + self._values(dimension, include_unknown, parents)
+            self._memo[key] = cached
+        return list(cached)
+
+    def _values(self, dimension, include_unknown, parents):
+        if dimension not in self.values: return () # Column absent from every loaded source
+        allowed = None
+        for parent, selected in parents.items():
+            if selected is None or selected == ALL: continue
+            selected = [selected] if isinstance(selected, str) else list(selected)
+            if not selected: continue
+            mapping = self.children.get((parent, dimension), {})
+            matched = frozenset().union(*(mapping.get(v, frozenset()) for v in selected))
+            allowed = matched if allowed is None else allowed & matched
+        values = self.values[dimension]
+        if allowed is not None: values = tuple(v for v in values if v in allowed)
+        if not include_unknown: values = tuple(v for v in values if v != UNKNOWN)
+        return values
+
+    def source_names(self, source_types, **parents):
+        """Source names of the given source types (e.g. dams), respecting other parent filters."""
+        return self.options('Source_Name', Source_Type=list(source_types), **parents)
+
+    def groundwater_options(self, dimension, **parents):
+        """Options of a groundwater-only dimension such as Well_Type or Study_Area."""
+        return self.options(dimension, Source_Type=GROUNDWATER, **parents)
+
+
+def build_catalog(frame):
+    """Builds the catalog from the standardized frame in one pass per dimension pair."""
+    values, children = {}, {}
+    present = [d for d in DIMENSIONS if d in frame.columns]
+    for dim in present:
+        distinct = frame[dim].dropna().unique()
+        if dim == 'Water_Year_Str': values[dim] = _ordered((y for y in distinct if y not in INVALID_YEARS), reverse=True)
+        else: values[dim] = _ordered(distinct)
+    for parent in (p for p in PARENT_DIMENSIONS if p in frame.columns):
+        for child in present:
+            if child == parent: continue
+            pairs = frame[[parent, child]].dropna().drop_duplicates()
+            children[(parent, child)] = {p: frozenset(group) for p, group in pairs.groupby(parent, sort=False)[child]}
+    return DimensionCatalog(values, children)
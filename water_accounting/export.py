@@ -0,0 +1,82 @@
+"""Chunked writers for exporting frames to CSV, Parquet and multi-sheet XLSX.
+
+Each writer walks the frame `CHUNK_ROWS` rows at a time and writes to a binary
+file object, so only one chunk is ever converted in memory. pyarrow (Parquet)
+and openpyxl (XLSX) are imported on use.
+"""
+from .constants import EXPORT_COLUMN_LABELS
+
+CHUNK_ROWS = 50_000
+EXPORT_FORMATS = {'csv': ('CSV', 'text/csv'), 'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+                  'xlsx': ('Excel', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')}
+MULTI_SHEET_FORMATS = ('xlsx',)
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS, progress=None):
+    """Consecutive row slices of `df` with Persian headers; an empty frame yields once so headers are still written.
+
+    Columns are relabelled per chunk so the full frame is never copied.
+    `progress(rows)` is called after each chunk was consumed.
+    """
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.rename(columns=EXPORT_COLUMN_LABELS)
+        if progress: progress(len(chunk))
+
+
+def iter_csv(df, chunk_rows=CHUNK_ROWS, progress=None):
+    """UTF-8 CSV bytes chunk by chunk, with a BOM so Excel shows Persian headers correctly."""
+    yield '\ufeff'.encode('utf-8')
+    for i, chunk in enumerate(iter_chunks(df, chunk_rows, progress)): yield chunk.to_csv(index=False, header=i == 0).encode('utf-8')
+
+
+def iter_record_batches(df, chunk_rows=CHUNK_ROWS, progress=None):
+    """pyarrow RecordBatches with one schema for the whole frame (object columns become strings)."""
+    import pyarrow as pa
+    schema = None
+    for chunk in iter_chunks(df, chunk_rows, progress):
+        chunk = chunk.astype({col: 'string' for col, dtype in chunk.dtypes.items() if dtype == object})
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+        schema = table.schema
+        yield from table.to_batches()
+
+
+def iter_sheet_rows(df, chunk_rows=CHUNK_ROWS, progress=None):
+    """Header row, then value rows with missing values as None, for openpyxl."""
+    yield [str(EXPORT_COLUMN_LABELS.get(col, col)) for col in df.columns]
+    for chunk in iter_chunks(df, chunk_rows, progress):
+        yield from chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_export(sheets, fmt, fileobj, chunk_rows=CHUNK_ROWS, progress=None):
+    """Writes `sheets` ({sheet name: frame}) to a binary file object in `fmt`.
+
+    CSV and Parquet hold one table, so only the first sheet is written; XLSX gets one worksheet per sheet.
+    `progress(fraction)` is called as chunks are written.
+    """
+    if fmt not in EXPORT_FORMATS: raise ValueError(f"Unknown export format: {fmt}")
+    frames = list(sheets.items())
+    if fmt not in MULTI_SHEET_FORMATS: frames = frames[:1]
+    total, written = sum(len(df) for _, df in frames), 0
+
+    def advance(rows):
+        nonlocal written
+        written += rows
+        if progress and total: progress(written / total)
+
+    if fmt == 'csv':
+        for part in iter_csv(frames[0][1], chunk_rows, advance): fileobj.write(part)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = None
+        for batch in iter_record_batches(frames[0][1], chunk_rows, advance):
+            if writer is None: writer = pq.ParquetWriter(fileobj, batch.schema)
+            writer.write_batch(batch)
+        if writer is not None: writer.close()
+    else:
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True) # Rows are flushed as they are appended
+        for name, df in frames:
+            sheet = workbook.create_sheet(title=str(name)[:31]) # Excel's sheet-name limit
+            for row in iter_sheet_rows(df, chunk_rows, advance): sheet.append(row)
+        workbook.save(fileobj)
@@ -0,0 +1,107 @@
+"""Plotly figures of the summary page, shared by the dashboards and the batch reports."""
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from .aggregate import distribution, extraction_trend
+from .basemap import ONLINE
+from .boundaries import map_center
+from .constants import CLASS_LABEL, EXTRACTION_LABEL
+from .pivots import COMPARISON_LABELS
+
+
+def sorted_years_axis(fig, years):
+    return fig.update_xaxes(categoryorder='array', categoryarray=sorted(years.unique())) # Sort x-axis
+
+
+def summary_bar_figure(table):
+    fig = px.bar(table, x='شهرستان', y=EXTRACTION_LABEL, color='طبقه‌بندی منبع', title="برداشت تجمیعی (MCM) بر اساس شهرستان و طبقه‌بندی منبع", labels={'شهرستان': 'شهرستان', EXTRACTION_LABEL: 'مجموع برداشت (میلیون متر مکعب)', 'طبقه‌بندی منبع': 'طبقه‌بندی منبع'}, barmode='group')
+    fig.update_layout(xaxis={'categoryorder':'total descending'})
+    return fig
+
+
+def extraction_trend_figure(frame, projection=None, next_year=None):
+    """Extraction per water year and source type of the filtered summary rows.
+
+    `projection` (an ExtractionForecast.table by Source_Type) adds a dashed segment
+    per source type from its last charted year to `next_year`.
+    """
+    line_plot_data = extraction_trend(frame)
+    fig = px.line(line_plot_data, x='Water_Year_Str', y='Extraction_MCM', color='Source_Type', title="روند برداشت (MCM) در طول زمان بر اساس نوع منبع", labels={'Water_Year_Str': 'سال آبی', 'Extraction_MCM': 'مجموع برداشت (میلیون متر مکعب)', 'Source_Type': 'نوع منبع'}, markers=True)
+    if projection is None or projection.empty: return sorted_years_axis(fig, line_plot_data['Water_Year_Str'])
+    colors = {trace.name: trace.line.color for trace in fig.data}
+    for source_type, value in zip(projection['Source_Type'], projection['Projection']):
+        history = line_plot_data[line_plot_data['Source_Type'] == source_type].sort_values('Water_Year_Str')
+        if history.empty: continue
+        fig.add_trace(go.Scatter(x=[history['Water_Year_Str'].iloc[-1], next_year], y=[history['Extraction_MCM'].iloc[-1], value], mode='lines+markers',
+                                 line={'dash': 'dash', 'color': colors.get(source_type)}, marker={'symbol': 'diamond'}, name=f"پیش‌بینی {source_type}"))
+    return fig.update_xaxes(categoryorder='array', categoryarray=sorted(line_plot_data['Water_Year_Str'].unique()) + [next_year])
+
+
+def distribution_figure(table, col):
+    """Pie of positive extraction by `col`, or None when there is nothing to show."""
+    pie_data = distribution(table, col)
+    if pie_data.empty: return None
+    fig = px.pie(pie_data, names=col, values=EXTRACTION_LABEL, title=f"توزیع درصد برداشت (MCM) بر اساس {col}", hole=0.3)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+
+def boundary_map_figure(merged_gdf, id_col, color_col, basemap=ONLINE):
+    """Subbasin choropleth of a `map_frame` result over `basemap` (None: no basemap)."""
+    fig = px.choropleth_mapbox(merged_gdf, geojson=merged_gdf.geometry, locations=merged_gdf.index, color=color_col,
+                               mapbox_style="carto-positron", zoom=7, center=map_center(merged_gdf), opacity=0.6,
+                               hover_name=id_col, hover_data={EXTRACTION_LABEL: ':.2f'},
+                               color_continuous_scale="Viridis" if color_col == EXTRACTION_LABEL else None,
+                               category_orders={CLASS_LABEL: sorted(merged_gdf[CLASS_LABEL].unique())} if color_col == CLASS_LABEL else None,
+                               title="نقشه برداشت بر اساس زیرحوضه")
+    fig.update_layout(margin={"r":0,"t":30,"l":0,"b":0})
+    if basemap is not ONLINE: # Local tile cache, or a blank background when offline without one
+        layers = [dict(below='traces', sourcetype='raster', source=[basemap.url], sourceattribution=basemap.attribution)] if basemap is not None else []
+        fig.update_layout(mapbox_style='white-bg', mapbox_layers=layers)
+    return fig
+
+
+def subbasin_colors(values, color_col):
+    """Fill colour per row of a `subbasin_values` frame, matching `boundary_map_figure`'s colouring."""
+    if color_col == CLASS_LABEL:
+        palette = px.colors.qualitative.Plotly
+        order = {label: palette[i % len(palette)] for i, label in enumerate(sorted(values[CLASS_LABEL].unique()))}
+        return values[CLASS_LABEL].map(order).tolist()
+    extraction = values[EXTRACTION_LABEL].to_numpy(dtype=float)
+    span = extraction.max() - extraction.min() if len(extraction) else 0
+    scaled = (extraction - extraction.min()) / span if span > 0 else extraction * 0
+    return px.colors.sample_colorscale('Viridis', scaled.tolist()) if len(scaled) else []
+
+
+def comparison_figure(table, title):
+    """Change per value of a `YearPivot.compare` table, increases and decreases coloured apart."""
+    label_col, delta_col = table.columns[0], COMPARISON_LABELS['delta']
+    directions = np.where(table[delta_col] >= 0, 'افزایش', 'کاهش')
+    fig = px.bar(table.assign(جهت=directions), x=label_col, y=delta_col, color='جهت', title=title,
+                 color_discrete_map={'افزایش': '#d62728', 'کاهش': '#2ca02c'}, hover_data={COMPARISON_LABELS['pct_change']: ':.1f'})
+    fig.update_layout(xaxis={'type': 'category'})
+    return fig
+
+
+def heatmap_figure(years, labels, matrix, title, x_title):
+    """Years × values heatmap drawn straight from a dense matrix (one trace, no per-cell rows)."""
+    fig = go.Figure(go.Heatmap(z=matrix, x=[str(label) for label in labels], y=list(years), colorscale='Viridis', colorbar={'title': 'MCM'},
+                               hovertemplate=f"{x_title}: %{{x}}<br>سال آبی: %{{y}}<br>برداشت: %{{z:,.2f}} MCM<extra></extra>"))
+    fig.update_layout(title=title, xaxis={'title': x_title, 'type': 'category'}, yaxis={'title': 'سال آبی', 'type': 'category', 'autorange': 'reversed'},
+                      height=max(350, 28 * len(years) + 150))
+    return fig
+
+
+def scenario_figure(by_year, dam, capacity):
+    """Simulated storage of one dam: P10–P90 band, median line and the capacity used as the spill level."""
+    rows = by_year[by_year['Source_Name'] == dam]
+    years = rows['Year'].tolist()
+    fig = go.Figure([
+        go.Scatter(x=years, y=rows['Storage_P90'], mode='lines', line={'width': 0}, showlegend=False, hoverinfo='skip'),
+        go.Scatter(x=years, y=rows['Storage_P10'], mode='lines', line={'width': 0}, fill='tonexty', fillcolor='rgba(31, 119, 180, 0.25)', name='P10–P90'),
+        go.Scatter(x=years, y=rows['Storage_P50'], mode='lines+markers', line={'color': '#1f77b4'}, name='میانه (P50)'),
+    ])
+    fig.add_hline(y=capacity, line_dash='dash', line_color='gray', annotation_text='ظرفیت')
+    fig.update_layout(title=f"حجم شبیه‌سازی شده مخزن {dam}", xaxis={'title': 'سال شبیه‌سازی', 'dtick': 1}, yaxis={'title': 'حجم (MCM)', 'rangemode': 'tozero'})
+    return fig
@@ -0,0 +1,90 @@
+"""Filter option lists and row filters shared by the dashboard pages."""
+from dataclasses import dataclass
+
+from .constants import ALL, DAM_SOURCE_TYPES, GROUNDWATER, INVALID_YEARS, SOURCE_TYPE_LABELS, UNKNOWN
+from .diagnostics import Diagnostic
+
+
+# --- Option Lists ---
+# Widget options come from the DimensionCatalog (dimensions.py); these helpers
+# derive them from an arbitrary frame for callers without a catalog.
+def year_options(df):
+    """Valid water years, newest first."""
+    if df.empty or 'Water_Year_Str' not in df.columns: return []
+    return [yr for yr in sorted(df['Water_Year_Str'].dropna().unique(), reverse=True) if yr not in INVALID_YEARS]
+
+
+def value_options(df, col, include_unknown=True):
+    """['همه'] followed by the sorted distinct values of `col`."""
+    options = [ALL]
+    if df.empty or col not in df.columns: return options
+    values = df[col].dropna().unique()
+    options.extend(sorted(v for v in values if include_unknown or v != UNKNOWN))
+    return options
+
+
+def source_type_labels(source_types):
+    """Display labels for the given Source_Type values, in SOURCE_TYPE_LABELS order, after 'همه'."""
+    return [ALL] + [k for k, v in SOURCE_TYPE_LABELS.items() if v in source_types and v != "All"]
+
+
+# --- Row Filters ---
+def filter_global(df, water_years=None, county=ALL):
+    """Applies the sidebar filters: water years (empty/None = all) and county."""
+    if water_years: df = df[df['Water_Year_Str'].isin(water_years)]
+    if county != ALL: df = df[df['County'] == county]
+    return df
+
+
+def split_detail(df):
+    """Splits a filtered frame into (dam/transfer rows, groundwater rows)."""
+    return df[df['Source_Type'].isin(DAM_SOURCE_TYPES)], df[df['Source_Type'] == GROUNDWATER]
+
+
+def filter_equals(df, col, value):
+    """Keeps rows where `col == value`; 'همه' or a missing column keeps everything."""
+    if value == ALL or col not in df.columns: return df
+    return df[df[col] == value]
+
+
+@dataclass(frozen=True)
+class GroundwaterFilters:
+    usage_type: str = ALL
+    well_type: str = ALL
+    well_status: str = ALL
+
+    def as_dimensions(self):
+        """The filters keyed by column name, e.g. for WellCountSketch.count."""
+        return {'Usage_Type': self.usage_type, 'Well_Type': self.well_type, 'Well_Status': self.well_status}
+
+
+def filter_groundwater(df, filters):
+    """Applies the detailed-page groundwater filters."""
+    df = filter_equals(df, 'Usage_Type', filters.usage_type)
+    df = filter_equals(df, 'Well_Type', filters.well_type)
+    return filter_equals(df, 'Well_Status', filters.well_status)
+
+
+@dataclass(frozen=True)
+class SummaryFilters:
+    county: str = ALL
+    study_area: str = ALL
+    usage_type: str = ALL
+    source_type: str = "All" # Source_Type value, not the display label
+    renewable_status: str = ALL
+
+
+def filter_summary(df, filters):
+    """Applies the summary-page filters; returns (frame, diagnostics)."""
+    diagnostics = []
+    df = filter_equals(df, 'County', filters.county)
+    # Study area only narrows groundwater rows; other sources have no study area
+    if filters.study_area != ALL and 'Study_Area' in df.columns: df = df[~((df['Source_Type'] == GROUNDWATER) & (df['Study_Area'] != filters.study_area))]
+    df = filter_equals(df, 'Usage_Type', filters.usage_type)
+    if filters.source_type != "All": df = df[df['Source_Type'] == filters.source_type]
+    if filters.renewable_status != ALL:
+        if 'Renewable_Status' in df.columns:
+            status_to_check = [UNKNOWN, 'Unknown', None] if filters.renewable_status == UNKNOWN else [filters.renewable_status]
+            df = df[df['Renewable_Status'].isin(status_to_check)]
+        else: diagnostics.append(Diagnostic.warning("ستون 'Renewable_Status' برای اعمال فیلتر تجدیدپذیری یافت نشد.", code='missing_renewable'))
+    return df, diagnostics
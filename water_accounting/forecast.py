@@ -0,0 +1,82 @@
+"""Next-year extraction projections for every subbasin × county × usage × source series at once.
+
+Extraction is summed into a padded (series × water years) matrix with a mask of
+the years each series was observed. A straight-line trend is then fitted to all
+series together by solving their stacked 2 × 2 normal equations in one batched
+call; series with fewer than MIN_TREND_YEARS observed years fall back to their
+mean. There is no seasonal term: the data has one value per water year.
+"""
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .constants import ALL, INVALID_YEARS, SUMMARY_COLUMN_LABELS
+
+FORECAST_KEYS = ['ID', 'County', 'Usage_Type', 'Source_Type']
+MIN_TREND_YEARS = 3
+FORECAST_LABELS = {**SUMMARY_COLUMN_LABELS, 'Last_Year': 'آخرین سال (MCM)', 'Projection': 'پیش‌بینی سال بعد (MCM)', 'Slope': 'روند سالانه (MCM)', 'Years': 'تعداد سال‌های داده'}
+
+
+def next_water_year(label):
+    """The water year after `label` ('1402-03' -> '1403-04')."""
+    match = re.fullmatch(r'(\d{4})-(\d{2})', str(label))
+    if not match: return f"{label}+1"
+    year = int(match.group(1)) + 1
+    return f"{year}-{(year + 1) % 100:02d}"
+
+
+@dataclass
+class ExtractionForecast:
+    """Fitted trend of every series; positions along `years` are the regression's x values (0, 1, ...)."""
+    years: tuple # ascending water years of the fit
+    next_year: str
+    keys: pd.DataFrame # one row per series, FORECAST_KEYS columns
+    coefficients: np.ndarray # (series, 2): intercept, slope per year
+    observed: np.ndarray # years with data per series
+    last: np.ndarray # extraction in the latest water year per series
+    projection: np.ndarray # next-year extraction, not below zero
+
+    def select(self, county=ALL, usage_type=ALL, source_type='All'):
+        """Boolean mask of the series matching the summary-page filters (source_type uses 'All' like SummaryFilters)."""
+        mask = np.ones(len(self.keys), dtype=bool)
+        for col, value, everything in (('County', county, ALL), ('Usage_Type', usage_type, ALL), ('Source_Type', source_type, 'All')):
+            if value != everything and col in self.keys.columns: mask &= (self.keys[col] == value).to_numpy()
+        return mask
+
+    def table(self, by=None, **filters):
+        """Latest-year extraction, projection and slope per series, or summed per `by` column; largest projection first."""
+        mask = self.select(**filters)
+        table = self.keys[mask].assign(Last_Year=self.last[mask], Projection=self.projection[mask], Slope=self.coefficients[mask, 1], Years=self.observed[mask])
+        if by: table = table.groupby(by, dropna=False)[['Last_Year', 'Projection', 'Slope']].sum().reset_index()
+        return table.sort_values('Projection', ascending=False).reset_index(drop=True)
+
+
+def build_forecast(frame, min_trend_years=MIN_TREND_YEARS):
+    """Fits every series of `frame`'s Extraction_MCM in one batched least-squares solve; None when there is nothing to fit."""
+    keys = [col for col in FORECAST_KEYS if col in frame.columns]
+    if frame.empty or 'Extraction_MCM' not in frame.columns or 'Water_Year_Str' not in frame.columns or not keys: return None
+    df = frame[frame['Water_Year_Str'].notna() & ~frame['Water_Year_Str'].isin(INVALID_YEARS) & frame['Extraction_MCM'].notna()]
+    if df.empty: return None
+    year_codes, years = pd.factorize(df['Water_Year_Str'], sort=True)
+    grouped = df.groupby(keys, dropna=False, sort=True)
+    series_codes = grouped.ngroup().to_numpy()
+    n_series, n_years = grouped.ngroups, len(years)
+
+    # --- Padded Matrix ---
+    flat = series_codes * n_years + year_codes
+    values = np.bincount(flat, weights=df['Extraction_MCM'].to_numpy(dtype='float64'), minlength=n_series * n_years).reshape(n_series, n_years)
+    mask = (np.bincount(flat, minlength=n_series * n_years) > 0).reshape(n_series, n_years).astype('float64')
+
+    # --- Batched Least Squares: [n, Σt; Σt, Σt²] [a, b] = [Σy, Σty] per series ---
+    t = np.arange(n_years, dtype='float64')
+    n, st, stt = mask.sum(axis=1), mask @ t, mask @ (t * t)
+    sy, sty = values.sum(axis=1), values @ t
+    normal = np.stack([np.stack([n, st], axis=-1), np.stack([st, stt], axis=-1)], axis=-2)
+    coefficients = np.column_stack([sy / np.maximum(n, 1), np.zeros(n_series)]) # Mean, no trend
+    trend = (n >= min_trend_years) & (np.abs(n * stt - st * st) > 1e-9)
+    if trend.any(): coefficients[trend] = np.linalg.solve(normal[trend], np.column_stack([sy, sty])[trend][..., None])[..., 0]
+    projection = np.maximum(coefficients[:, 0] + coefficients[:, 1] * n_years, 0)
+    return ExtractionForecast(tuple(years), next_water_year(years[-1]), grouped.size().index.to_frame(index=False), coefficients, n.astype('int64'),
+                              values[:, -1], projection)
@@ -0,0 +1,291 @@
+"""Loading and standardizing the raw source files into one analysis frame."""
+import dataclasses
+import logging
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .constants import (BASE_COLS, DAM_DATA_PATH, DAM_EXPECTED_COLS, DAM_EXTRA_COLS, DAM_MEASURE_COLS, DAM_RENAME_MAP, DAM_SOURCE_TYPES, GROUNDWATER,
+                        GW_DATA_PATH, GW_EXPECTED_COLS, GW_EXTRA_COLS, GW_ID_COLS, GW_MEASURE_COLS, GW_RENAME_MAP, QUARANTINE_DIR, SURFACE, TRANSFER, TRANSFER_DAM_NAMES, TRANSFER_DATA_PATH, TRANSFER_EXPECTED_COLS,
+                        TRANSFER_RENAME_MAP, UNKNOWN, WASTEWATER, WASTEWATER_DATA_PATH, WW_EXPECTED_COLS, WW_RENAME_MAP)
+from .balance import balance_table
+from .diagnostics import Diagnostic
+from .dimensions import DimensionCatalog, build_catalog
+from .lookup import WellIndex, build_well_index
+from .pivots import YearPivot, build_year_pivot
+from .sketches import WellCountSketch, build_well_sketch
+from .validation import ValidationReport, quarantine_path, validate_frame, validation_table, write_quarantine
+from .wells import well_trends
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SourceSpec:
+    """Describes how one raw file maps onto the standardized columns."""
+    source_type: str
+    path: str
+    expected_cols: tuple
+    rename_map: dict
+    extraction_source_col: str = None
+    id_col_standard: str = 'SubBasin_ID'
+    usage_col: str = 'Usage_Type'
+    county_col: str = 'County'
+    year_col: str = 'Water_Year_Str'
+    renewable_col: str = 'Renewable_Status'
+    quarantine_dir: str = QUARANTINE_DIR # Where rows failing validation are written; None keeps them out without a file
+
+    @property
+    def required_cols(self):
+        """Raw columns without which the source cannot load: its water year and extraction."""
+        return [raw for raw, standard in self.rename_map.items() if standard in (self.year_col, self.extraction_source_col)]
+
+
+def default_source_specs(dam_path=DAM_DATA_PATH, gw_path=GW_DATA_PATH, transfer_path=TRANSFER_DATA_PATH, wastewater_path=WASTEWATER_DATA_PATH):
+    """Returns the specs for the four sources, in concatenation order."""
+    return [
+        SourceSpec(SURFACE, dam_path, tuple(DAM_EXPECTED_COLS), DAM_RENAME_MAP, extraction_source_col='Dam_Extraction_Value'),
+        SourceSpec(GROUNDWATER, gw_path, tuple(GW_EXPECTED_COLS), GW_RENAME_MAP, extraction_source_col='Actual_Extraction_m3'),
+        SourceSpec(TRANSFER, transfer_path, tuple(TRANSFER_EXPECTED_COLS), TRANSFER_RENAME_MAP, extraction_source_col='Extraction_MCM'),
+        SourceSpec(WASTEWATER, wastewater_path, tuple(WW_EXPECTED_COLS), WW_RENAME_MAP, extraction_source_col='Extraction_MCM'),
+    ]
+
+
+@dataclass
+class SourceResult:
+    """The standardized frame for one source plus what went wrong while loading it.
+
+    Once combined into a Dataset, `frame` keeps only the schema (the rows live in
+    Dataset.frame) and `rows` records how many the source contributed.
+    """
+    spec: SourceSpec
+    frame: pd.DataFrame
+    diagnostics: list = field(default_factory=list)
+    coercion_failures: dict = field(default_factory=dict) # column -> count of non-empty values that were not numeric
+    validation: ValidationReport = None
+    rows: int = 0
+
+    @property
+    def loaded(self):
+        return self.rows > 0 or not self.frame.empty
+
+
+@dataclass
+class Dataset:
+    """All sources concatenated into `frame` (one row per source record)."""
+    frame: pd.DataFrame
+    sources: dict
+    diagnostics: list = field(default_factory=list)
+    catalog: DimensionCatalog = None
+    balance: pd.DataFrame = None # Dam-year closure residuals, see balance.balance_table
+    wells: pd.DataFrame = None # Per-well multi-year trends, see wells.well_trends
+    well_index: WellIndex = None # Identifier → groundwater rows, see lookup.build_well_index
+    well_sketch: WellCountSketch = None # Distinct well counts per partition, None without groundwater
+    pivot: YearPivot = None # Year × dimension extraction arrays, see pivots.build_year_pivot
+    version: int = 0 # Set by DatasetStore on every swap
+    scope: object = None # AccessScope of a per-user partition (see access.py), None for the full dataset
+    validation: pd.DataFrame = None # Failing validation rules per source file, see validation.validation_table
+
+    def has_source(self, source_type):
+        """True if any row of the given Source_Type was loaded."""
+        return source_type in self.source_types
+
+    @property
+    def cache_key(self):
+        """What caches of derived results key on: the version, plus the access scope for a partition."""
+        return (self.version, self.scope)
+
+    @property
+    def source_types(self):
+        return set(self.frame['Source_Type'].unique()) if not self.frame.empty else set()
+
+
+def safe_to_numeric(series):
+    """Converts a pandas Series to numeric, coercing errors to NaN."""
+    return pd.to_numeric(series, errors='coerce')
+
+
+def normalize_ids(series):
+    """Identifier column as stripped strings; whole floats lose their '.0' and missing values stay None."""
+    missing = series.isna()
+    if pd.api.types.is_float_dtype(series) and (series[~missing] % 1 == 0).all(): series = series.fillna(0).astype('int64')
+    return series.astype(str).str.strip().where(~missing, None)
+
+
+def coerce_measures(df, cols, fill_value=None, invalid=None):
+    """Converts measure columns to float64 in place; returns {column: coercion failure count}.
+
+    Missing columns are created (filled with `fill_value`, NaN if None) so every
+    source of a kind has the same typed schema. If `invalid` is a dict, it receives
+    the mask of non-numeric values per column for row validation.
+    """
+    failures = {}
+    for col in cols:
+        if col not in df.columns:
+            df[col] = np.nan if fill_value is None else float(fill_value)
+            continue
+        raw = df[col]
+        numeric = safe_to_numeric(raw).astype('float64')
+        bad = numeric.isna() & raw.notna()
+        failures[col] = int(bad.sum())
+        if invalid is not None: invalid[col] = bad
+        df[col] = numeric if fill_value is None else numeric.fillna(fill_value)
+    return failures
+
+
+def empty_frame():
+    return pd.DataFrame(columns=BASE_COLS)
+
+
+def read_source_file(path):
+    """Reads a raw CSV export, falling back to Windows-1256 for older Persian files."""
+    try: return pd.read_csv(path, encoding='utf-8', low_memory=False)
+    except UnicodeDecodeError: return pd.read_csv(path, encoding='cp1256', low_memory=False)
+
+
+def standardize_frame(df, spec, invalid=None):
+    """Maps a raw frame onto the typed standardized columns; returns (frame, diagnostics, coercion_failures).
+
+    Only a missing required column (water year, extraction) drops the source;
+    other missing columns are filled like absent measures. The frame keeps the
+    raw row index, and `invalid` (a dict) receives the non-numeric masks.
+    """
+    diagnostics, failures = [], {}
+    file_name = os.path.basename(spec.path)
+    source_type = spec.source_type
+    id_col = spec.id_col_standard
+
+    missing_cols = [col for col in spec.expected_cols if col not in df.columns]
+    missing_required = [col for col in missing_cols if col in spec.required_cols]
+    if missing_required:
+        diagnostics.append(Diagnostic.error(f"خطا: فایل {file_name}. ستون‌های ضروری یافت نشدند: {missing_required}.", file_name, 'missing_columns'))
+        return empty_frame(), diagnostics, failures
+    if missing_cols: diagnostics.append(Diagnostic.warning(f"ستون‌های {missing_cols} در فایل {file_name} یافت نشدند و خالی در نظر گرفته شدند.", file_name, 'missing_columns'))
+    df = df.rename(columns=spec.rename_map)
+
+    # ID Column
+    if id_col not in df.columns:
+        diagnostics.append(Diagnostic.error(f"ستون ID استاندارد ('{id_col}') در فایل {file_name} یافت نشد.", file_name, 'missing_id'))
+        if 'ID' in df.columns:
+            df[id_col] = df['ID'].astype(str)
+            diagnostics.append(Diagnostic.warning("از ستون 'ID' موجود استفاده شد.", file_name, 'fallback_id'))
+        else: df[id_col] = UNKNOWN
+    else: df[id_col] = df[id_col].astype(str)
+
+    # Extraction Column & Unit Conversion
+    extraction_source_col = spec.extraction_source_col
+    if extraction_source_col and extraction_source_col in df.columns:
+        df['Extraction_MCM'] = df[extraction_source_col]
+        failures.update(coerce_measures(df, ['Extraction_MCM'], fill_value=0, invalid=invalid))
+        if source_type == GROUNDWATER: df['Extraction_MCM'] = df['Extraction_MCM'] / 1_000_000
+    elif 'Extraction_MCM' in df.columns:
+        failures.update(coerce_measures(df, ['Extraction_MCM'], fill_value=0, invalid=invalid))
+        if source_type == GROUNDWATER and not df['Extraction_MCM'].empty and df['Extraction_MCM'].max() > 10000:
+            df['Extraction_MCM'] = df['Extraction_MCM'] / 1_000_000
+    else:
+        df['Extraction_MCM'] = 0.0
+        if not (source_type == SURFACE and extraction_source_col == 'Dam_Extraction_Value'):
+            diagnostics.append(Diagnostic.warning(f"ستون برداشت ('{extraction_source_col}' یا 'Extraction_MCM') برای فایل {file_name} یافت نشد. مقدار صفر در نظر گرفته شد.", file_name, 'missing_extraction'))
+
+    # Source Type & Name
+    df['Source_Type'] = source_type
+    if 'Dam_Name' in df.columns: df['Source_Name'] = df['Dam_Name']
+    elif source_type == GROUNDWATER: df['Source_Name'] = 'منبع زیرزمینی ' + df[id_col]
+    elif source_type == TRANSFER and 'Transfer_Source_Name' in df.columns: df['Source_Name'] = df['Transfer_Source_Name']
+    elif source_type == WASTEWATER and 'WW_Plant_Name' in df.columns: df['Source_Name'] = df['WW_Plant_Name']
+    else: df['Source_Name'] = source_type + ' ' + df[id_col]
+
+    # Usage Type, County, Year, Renewable Status
+    for col in (spec.usage_col, spec.county_col, spec.renewable_col):
+        if col not in df.columns: df[col] = UNKNOWN
+        df[col] = df[col].fillna(UNKNOWN)
+    if spec.year_col not in df.columns: df[spec.year_col] = UNKNOWN
+    df[spec.year_col] = df[spec.year_col].astype(str)
+
+    # --- Specific Preprocessing ---
+    if source_type in DAM_SOURCE_TYPES:
+        if 'Dam_Name' in df.columns:
+            df['Source_Type'] = np.where(df['Dam_Name'].isin(TRANSFER_DAM_NAMES), TRANSFER, SURFACE)
+            df['Source_Name'] = df['Dam_Name']
+        # Every dam-type source (the transfer file too) gets the same zero-filled measures; balance charts treat a missing or unreadable measure as zero
+        failures.update(coerce_measures(df, DAM_MEASURE_COLS, fill_value=0, invalid=invalid))
+    elif source_type == GROUNDWATER:
+        failures.update(coerce_measures(df, GW_MEASURE_COLS, invalid=invalid)) # Keep NaN so means skip unknown depths
+        if 'Smart_Meter' in df.columns: df['Smart_Meter'] = df['Smart_Meter'].replace({'دارد': 'Yes', 'ندارد': 'No', 0: 'No', 1: 'Yes'}).fillna(UNKNOWN)
+        if 'Study_Area' not in df.columns: df['Study_Area'] = UNKNOWN
+        df['Study_Area'] = df['Study_Area'].fillna(UNKNOWN)
+        for col in GW_ID_COLS:
+            if col in df.columns: df[col] = normalize_ids(df[col])
+
+    # Select standardized essential columns plus extras
+    df = df.rename(columns={id_col: 'ID', spec.usage_col: 'Usage_Type', spec.county_col: 'County', spec.year_col: 'Water_Year_Str', spec.renewable_col: 'Renewable_Status'})
+    essential_cols = list(BASE_COLS)
+    if source_type == GROUNDWATER: essential_cols.extend(GW_EXTRA_COLS)
+    if source_type in DAM_SOURCE_TYPES: essential_cols.extend(DAM_EXTRA_COLS)
+    final_cols = [col for col in essential_cols if col in df.columns]
+    failures = {col: n for col, n in failures.items() if n}
+    if failures: diagnostics.append(Diagnostic.warning(f"مقادیر غیرعددی در فایل {os.path.basename(spec.path)} با مقدار خالی جایگزین شدند: {failures}", os.path.basename(spec.path), 'coercion_failures'))
+    return df[final_cols].copy(), diagnostics, failures
+
+
+def load_source(spec):
+    """Loads and standardizes one source file. Never raises; problems end up in `diagnostics`."""
+    file_name = os.path.basename(spec.path)
+    if not os.path.exists(spec.path):
+        return SourceResult(spec, empty_frame(), [Diagnostic.info(f"فایل {file_name} یافت نشد.", file_name, 'file_not_found')])
+    try: raw = read_source_file(spec.path)
+    except FileNotFoundError:
+        return SourceResult(spec, empty_frame(), [Diagnostic.info(f"فایل {file_name} یافت نشد.", file_name, 'file_not_found')])
+    except (OSError, ValueError) as e: # Permissions, bad encoding, malformed CSV (pandas' parser errors are ValueErrors)
+        return SourceResult(spec, empty_frame(), [Diagnostic.error(f"فایل {file_name} خوانده نشد: {e}", file_name, 'read_failed')])
+    try:
+        invalid = {}
+        frame, diagnostics, failures = standardize_frame(raw, spec, invalid)
+        report = ValidationReport(file_name, len(raw), missing_columns=[col for col in spec.expected_cols if col not in raw.columns])
+        if frame.empty: return SourceResult(spec, frame, diagnostics, failures, report)
+        frame, report, quarantine_diagnostics = validate_source(raw, frame, spec, invalid, report)
+        return SourceResult(spec, frame, diagnostics + quarantine_diagnostics, failures, report)
+    except Exception as e: # A bug rather than a bad file: the other sources still load, the traceback goes to the server log
+        logger.exception("Processing source %s failed", spec.path)
+        return SourceResult(spec, empty_frame(), [Diagnostic.error(f"خطایی در پردازش {file_name} رخ داد: {type(e).__name__}: {e}", file_name, 'processing_failed')])
+
+
+def validate_source(raw, frame, spec, invalid, report):
+    """Drops the rows failing a quarantine rule and writes them to the spec's quarantine file; returns (frame, report, diagnostics)."""
+    file_name, diagnostics = report.source, []
+    quarantine, flagged, reasons, report.issues = validate_frame(frame, spec.source_type, invalid, spec.extraction_source_col)
+    report.quarantined, report.flagged = int(quarantine.sum()), int(flagged.sum())
+    if 'Well_Depth_m' in frame.columns: frame['Well_Depth_m'] = frame['Well_Depth_m'].where(frame['Well_Depth_m'] > 0) # Flagged as unknown_depth
+    if spec.quarantine_dir:
+        path = quarantine_path(spec.quarantine_dir, file_name)
+        try:
+            if report.quarantined: report.quarantine_path = write_quarantine(raw, reasons[quarantine], path)
+            elif os.path.exists(path): os.remove(path) # Stale file from an earlier version of the source
+        except OSError as e: diagnostics.append(Diagnostic.warning(f"فایل قرنطینه {path} نوشته نشد: {e}", file_name, 'quarantine_write_failed'))
+    if report.quarantined:
+        where = f" (فایل قرنطینه: {report.quarantine_path})" if report.quarantine_path else ""
+        diagnostics.append(Diagnostic.warning(f"{report.quarantined} ردیف از {report.rows} ردیف فایل {file_name} در اعتبارسنجی رد و کنار گذاشته شد{where}.", file_name, 'quarantined'))
+    return frame[~quarantine], report, diagnostics
+
+
+def build_dataset(frame, sources, diagnostics):
+    """A Dataset over the combined `frame` with every ingest-time table built from it."""
+    return Dataset(frame, sources, diagnostics, build_catalog(frame), balance_table(frame), well_trends(frame), build_well_index(frame), build_well_sketch(frame),
+                   build_year_pivot(frame), validation=validation_table([r.validation for r in sources.values() if r.validation is not None]))
+
+
+def combine_sources(results):
+    """Concatenates loaded sources into a Dataset; the per-source frames are dropped, so the rows are held once."""
+    frames = [r.frame for r in results if not r.frame.empty]
+    frame = pd.concat(frames, ignore_index=True) if frames else empty_frame()
+    diagnostics = [d for r in results for d in r.diagnostics]
+    sources = {r.spec.source_type: dataclasses.replace(r, frame=r.frame.iloc[0:0].copy(), rows=len(r.frame)) for r in results} # copy(): a 0-row view would keep the rows alive
+    return build_dataset(frame, sources, diagnostics)
+
+
+def load_dataset(specs=None):
+    """Loads every source (default: the four dashboard files) into one Dataset."""
+    if specs is None: specs = default_source_specs()
+    return combine_sources([load_source(spec) for spec in specs])
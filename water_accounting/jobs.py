@@ -0,0 +1,160 @@
+"""Background jobs: heavy work (shapefile reads, exports, batch reports) off the Streamlit rerun thread.
+
+A process-wide JobQueue runs jobs on a bounded thread pool, so however many
+analysts start heavy tasks, at most `max_workers` run at once and interactive
+reruns keep the remaining cores. A job's function receives its Job to report
+progress and to check for cancellation between steps; the session that
+submitted it keeps the handle and collects the result once it is done.
+"""
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = 'pending', 'running', 'done', 'failed', 'cancelled'
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2) # Leave half the cores to interactive reruns
+DEFAULT_PER_OWNER = 2 # Active (queued or running) jobs one user may have
+KEEP_SECONDS = 3600 # Finished jobs (and their scratch files) are discarded after this long
+
+
+class JobCancelled(Exception):
+    """Raised by Job.check() once cancellation was requested."""
+
+
+class JobLimitError(Exception):
+    """The owner already has the maximum number of active jobs."""
+
+
+@dataclass(eq=False)
+class Job:
+    id: str
+    label: str # Shown next to the progress bar
+    owner: str
+    status: str = PENDING
+    progress: float = 0.0 # 0..1
+    message: str = ''
+    result: object = None
+    error: str = ''
+    submitted: float = field(default_factory=time.time)
+    started: float = 0.0
+    finished: float = 0.0
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _workdir: str = field(default=None, repr=False)
+    _workdir_root: str = field(default=None, repr=False)
+
+    @property
+    def active(self):
+        return self.status in (PENDING, RUNNING)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Asks the job to stop; a queued job never starts, a running one stops at its next check()."""
+        self._cancel.set()
+
+    def report(self, fraction, message=None):
+        """Progress from inside the job; also a cancellation point."""
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None: self.message = message
+        self.check()
+
+    def check(self):
+        if self._cancel.is_set(): raise JobCancelled()
+
+    def workdir(self):
+        """A scratch directory for output files, removed when the job is discarded.
+
+        Under the queue's `workdir_root` its name is an unguessable token, so the
+        root can be a statically served folder and the files handed out by URL.
+        """
+        if self._workdir is None:
+            if self._workdir_root:
+                self._workdir = os.path.join(self._workdir_root, secrets.token_urlsafe(16))
+                os.makedirs(self._workdir)
+            else: self._workdir = tempfile.mkdtemp(prefix=f'water-accounting-job-{self.id}-')
+        return self._workdir
+
+    def discard(self):
+        if self._workdir: shutil.rmtree(self._workdir, ignore_errors=True)
+
+
+class JobQueue:
+    """Runs `func(job, *args, **kwargs)` on a bounded thread pool and keeps a registry of the jobs.
+
+    `workdir_root` (default: the system temp dir) holds the jobs' scratch directories.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_per_owner=DEFAULT_PER_OWNER, keep_seconds=KEEP_SECONDS, workdir_root=None):
+        self.max_workers, self.max_per_owner, self.keep_seconds = int(max_workers), int(max_per_owner), float(keep_seconds)
+        self.workdir_root = workdir_root
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='water-accounting-job')
+        self._jobs = {} # id -> Job, in submission order
+        self._lock = threading.Lock()
+
+    def submit(self, owner, label, func, *args, **kwargs):
+        """Queues a job and returns its Job; raises JobLimitError if `owner` already has max_per_owner active jobs."""
+        with self._lock:
+            self._prune()
+            if self.max_per_owner and sum(job.owner == owner and job.active for job in self._jobs.values()) >= self.max_per_owner:
+                raise JobLimitError(f"{owner} already has {self.max_per_owner} jobs running")
+            job = Job(uuid.uuid4().hex[:12], label, owner, _workdir_root=self.workdir_root)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        if job.cancel_requested:
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            job.result = func(job, *args, **kwargs)
+            job.progress, job.status = 1.0, DONE
+        except JobCancelled: job.status = CANCELLED
+        except Exception as e: job.status, job.error = FAILED, str(e) or type(e).__name__
+        finally: job.finished = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job in [job for job in self._jobs.values() if not job.active and job.finished < cutoff]:
+            del self._jobs[job.id]
+            job.discard()
+
+    def get(self, job_id):
+        with self._lock: return self._jobs.get(job_id)
+
+    def discard(self, job):
+        """Cancels `job` if still active and forgets it, deleting its scratch files once it stopped."""
+        job.cancel()
+        with self._lock:
+            if job.active: return # _prune removes it after it stops
+            self._jobs.pop(job.id, None)
+        job.discard()
+
+    def jobs(self, owner=None):
+        with self._lock: return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self._lock:
+            counts = dict.fromkeys((PENDING, RUNNING, DONE, FAILED, CANCELLED), 0)
+            for job in self._jobs.values(): counts[job.status] += 1
+            return counts
+
+    def remove_stale_workdirs(self):
+        """Deletes directories under `workdir_root` older than keep_seconds, e.g. left by a process that was killed."""
+        if not self.workdir_root or not os.path.isdir(self.workdir_root): return
+        cutoff = time.time() - self.keep_seconds
+        for entry in os.scandir(self.workdir_root):
+            if entry.is_dir() and entry.stat().st_mtime < cutoff: shutil.rmtree(entry.path, ignore_errors=True)
+
+    def shutdown(self):
+        for job in self.jobs(): job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
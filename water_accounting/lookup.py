@@ -0,0 +1,90 @@
+"""Hash indexes from well identifiers to row positions, with prefix search.
+
+Each identifier column gets a dict from value to group number and the row
+positions grouped by that number (one argsort at build time), so fetching a
+well's multi-year history is a dict lookup plus one slice.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .constants import GROUNDWATER, GW_ID_COLS
+
+ID_LABELS = {'Subscription_ID': 'اشتراک', 'Electricity_Subscription': 'اشتراک برق', 'Well_ID_Orig': 'شناسه چاه'}
+
+
+@dataclass
+class IdentifierIndex:
+    """Row positions per distinct value of one identifier column."""
+    codes: dict # value -> group number
+    order: np.ndarray # row positions sorted by group
+    offsets: np.ndarray # group g owns order[offsets[g]:offsets[g + 1]]
+    keys: np.ndarray # distinct values, sorted, for prefix search
+
+    @classmethod
+    def build(cls, values, positions=None):
+        """Index of `values`; `positions` (default 0..n-1) are the row positions the values sit at."""
+        codes, uniques = pd.factorize(values, sort=True) # Missing values get code -1
+        present = codes >= 0
+        positions = np.flatnonzero(present) if positions is None else np.asarray(positions)[present]
+        codes = codes[present]
+        order = positions[np.argsort(codes, kind='stable')]
+        offsets = np.r_[0, np.cumsum(np.bincount(codes, minlength=len(uniques)))]
+        keys = np.asarray(uniques, dtype=str)
+        return cls(dict(zip(keys.tolist(), range(len(keys)))), order, offsets, keys)
+
+    def positions(self, value):
+        code = self.codes.get(str(value).strip())
+        if code is None: return np.empty(0, dtype='int64')
+        return self.order[self.offsets[code]:self.offsets[code + 1]]
+
+    def prefix(self, text, limit=None):
+        """Values starting with `text`, in sorted order."""
+        lo = np.searchsorted(self.keys, text, side='left')
+        hi = np.searchsorted(self.keys, text + '\uffff', side='left')
+        if limit: hi = min(hi, lo + limit)
+        return self.keys[lo:hi].tolist()
+
+
+@dataclass
+class WellIndex:
+    """Identifier indexes over the groundwater rows of a frame."""
+    frame: pd.DataFrame # the indexed frame itself (not a copy); positions are iloc positions into it
+    indexes: dict = field(default_factory=dict) # column -> IdentifierIndex
+
+    @property
+    def columns(self):
+        return list(self.indexes)
+
+    def history(self, value, column=None):
+        """All rows of the well with this identifier (any indexed column if `column` is None), oldest year first."""
+        for col in ([column] if column else self.columns):
+            positions = self.indexes[col].positions(value) if col in self.indexes else ()
+            if len(positions): return self.frame.iloc[positions].sort_values('Water_Year_Str', kind='stable')
+        return self.frame.iloc[0:0]
+
+    def search(self, text, limit=50):
+        """(column, value) pairs whose value starts with `text`, across every indexed column."""
+        text = str(text).strip()
+        if not text: return []
+        matches = []
+        for col, index in self.indexes.items():
+            matches.extend((col, value) for value in index.prefix(text, limit - len(matches)))
+            if len(matches) >= limit: break
+        return matches
+
+
+def build_well_index(frame):
+    """Indexes every identifier column present on the groundwater rows of `frame`, by position in `frame` itself.
+
+    Only the positions are stored, so the index adds no copy of the groundwater rows.
+    """
+    if frame.empty or 'Source_Type' not in frame.columns: return WellIndex(frame)
+    gw = np.flatnonzero((frame['Source_Type'] == GROUNDWATER).to_numpy())
+    indexes = {}
+    for col in GW_ID_COLS:
+        if col not in frame.columns: continue
+        values = frame[col].iloc[gw]
+        if values.notna().any(): indexes[col] = IdentifierIndex.build(values, gw)
+    return WellIndex(frame, indexes)
@@ -0,0 +1,98 @@
+"""Year × dimension extraction pivots for year-over-year comparisons.
+
+Built once at ingest: for each comparison dimension, extraction (MCM) is summed
+into a dense float64 array of shape (years, counties, source types, values).
+Comparisons and heatmaps then only slice and sum these integer-coded arrays;
+the row-level frame is never touched.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .constants import ALL, INVALID_YEARS, SUMMARY_COLUMN_LABELS
+
+# Dimensions offered by the comparison, keyed by frame column
+COMPARISON_DIMENSIONS = {col: SUMMARY_COLUMN_LABELS[col] for col in ('County', 'ID', 'Source_Type')}
+COMPARISON_LABELS = {'baseline': 'پایه (MCM)', 'target': 'هدف (MCM)', 'delta': 'تغییر (MCM)', 'pct_change': 'درصد تغییر'}
+
+
+@dataclass
+class YearPivot:
+    """Extraction per (water year, county, source type, value) for every comparison dimension."""
+    years: tuple # ascending
+    counties: tuple
+    source_types: tuple
+    labels: dict # dimension -> tuple of values along the last axis
+    cubes: dict # dimension -> float64 array (years, counties, source types, values)
+
+    def _year_positions(self, years):
+        lookup = {year: i for i, year in enumerate(self.years)}
+        missing = [year for year in years if year not in lookup]
+        if missing: raise KeyError(f"Water year(s) not in the data: {', '.join(map(str, missing))}")
+        return [lookup[year] for year in years]
+
+    def matrix(self, dimension, county=ALL, source_type=ALL):
+        """Years × values extraction of `dimension` for one county and/or source type ('همه' sums them)."""
+        cube = self.cubes[dimension]
+        for axis, selected, values in ((1, county, self.counties), (2, source_type, self.source_types)):
+            if selected == ALL: continue
+            cube = np.take(cube, [values.index(selected)] if selected in values else [], axis=axis)
+        return cube.sum(axis=(1, 2))
+
+    def annual(self, dimension, years, county=ALL, source_type=ALL):
+        """Mean annual extraction per value of `dimension` over `years` (a single year gives that year)."""
+        rows = self.matrix(dimension, county, source_type)[self._year_positions(list(years))]
+        return rows.mean(axis=0) if len(rows) else np.zeros(len(self.labels[dimension]))
+
+    def compare(self, dimension, baseline_years, target_year, county=ALL, source_type=ALL):
+        """Baseline (mean of `baseline_years`) vs `target_year` per value of `dimension`.
+
+        Columns: the dimension's Persian label plus COMPARISON_LABELS; percent change
+        is NaN where the baseline is zero. Values absent from both periods are dropped.
+        """
+        baseline, target = self.annual(dimension, baseline_years, county, source_type), self.annual(dimension, [target_year], county, source_type)
+        delta = target - baseline
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change = np.where(baseline != 0, delta / np.abs(baseline) * 100, np.nan)
+        table = pd.DataFrame({COMPARISON_DIMENSIONS[dimension]: self.labels[dimension], COMPARISON_LABELS['baseline']: baseline,
+                              COMPARISON_LABELS['target']: target, COMPARISON_LABELS['delta']: delta, COMPARISON_LABELS['pct_change']: pct_change})
+        keep = (baseline != 0) | (target != 0)
+        return table[keep].sort_values(COMPARISON_LABELS['delta'], key=np.abs, ascending=False).reset_index(drop=True)
+
+
+def _codes(series):
+    """Integer codes and values of a dimension, numeric-looking values (subbasin IDs) in numeric order."""
+    series = series.astype(str).where(series.notna())
+    codes, values = pd.factorize(series, sort=True)
+    numeric = pd.to_numeric(pd.Series(values), errors='coerce')
+    if len(values) and numeric.notna().all():
+        order = np.argsort(numeric.to_numpy(), kind='stable')
+        remap = np.empty(len(order), dtype='int64')
+        remap[order] = np.arange(len(order))
+        codes = np.where(codes >= 0, remap[np.maximum(codes, 0)], -1)
+        values = values[order]
+    return codes, tuple(values)
+
+
+def build_year_pivot(frame):
+    """Dense pivots of `frame`'s Extraction_MCM, or None when there is nothing to pivot."""
+    required = {'Water_Year_Str', 'County', 'Source_Type', 'Extraction_MCM'}
+    if frame.empty or not required <= set(frame.columns): return None
+    valid = frame['Water_Year_Str'].notna() & ~frame['Water_Year_Str'].isin(INVALID_YEARS) & frame['County'].notna() & frame['Source_Type'].notna()
+    df = frame[valid]
+    if df.empty: return None
+    year_codes, years = pd.factorize(df['Water_Year_Str'], sort=True)
+    county_codes, counties = pd.factorize(df['County'], sort=True)
+    source_codes, source_types = pd.factorize(df['Source_Type'], sort=True)
+    weights = df['Extraction_MCM'].fillna(0).to_numpy(dtype='float64')
+    labels, cubes = {}, {}
+    for dimension in COMPARISON_DIMENSIONS:
+        if dimension not in df.columns: continue
+        value_codes, values = _codes(df[dimension])
+        present = value_codes >= 0
+        shape = (len(years), len(counties), len(source_types), len(values))
+        flat = np.ravel_multi_index((year_codes[present], county_codes[present], source_codes[present], value_codes[present]), shape)
+        cubes[dimension] = np.bincount(flat, weights=weights[present], minlength=int(np.prod(shape))).reshape(shape)
+        labels[dimension] = values
+    return YearPivot(tuple(years), tuple(counties), tuple(source_types), labels, cubes)
@@ -0,0 +1,163 @@
+"""Static summary-page reports for every (county, water year), rendered on a process pool.
+
+Each report holds the summary metrics, the summary table and the bar, trend,
+distribution and map figures of the dashboard's summary page for one county and
+one water year. The Dataset and boundary polygons are handed to each worker once
+through the pool initializer: with the 'fork' start method the workers share the
+parent's pages copy-on-write, with 'spawn' they are pickled once per worker.
+"""
+import html
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+from .aggregate import map_frame, summary_view
+from .boundaries import guess_id_column
+from .constants import ALL, GROUNDWATER, SURFACE, TRANSFER, WASTEWATER
+from .figures import boundary_map_figure, distribution_figure, extraction_trend_figure, summary_bar_figure
+from .filters import SummaryFilters
+
+REPORT_FORMATS = ('html', 'png')
+PROVINCE_LABEL = 'استان' # File-name stand-in for the 'همه' (all counties) report
+PLOTLY_JS = 'plotly.min.js' # Written once next to the HTML reports instead of being inlined in each
+METRIC_LABELS = {SURFACE: "برداشت آب سطحی (سدها)", GROUNDWATER: "برداشت آب زیرزمینی", TRANSFER: "برداشت آب انتقالی", WASTEWATER: "تصفیه خانه"}
+
+
+@dataclass
+class ReportResult:
+    county: str
+    water_year: str
+    paths: list = field(default_factory=list)
+    seconds: float = 0.0
+    error: str = ''
+
+
+def report_jobs(catalog, counties=None, water_years=None, include_province=True):
+    """(county, water year) pairs to render; defaults to every county and year in the catalog."""
+    counties = list(counties) if counties else [c for c in catalog.options('County') if c != ALL]
+    if include_province and ALL not in counties: counties = [ALL] + counties
+    water_years = list(water_years) if water_years else list(catalog.years)
+    return [(county, year) for year in water_years for county in counties]
+
+
+def report_basename(county, water_year):
+    name = re.sub(r'[^\w\-]+', '_', PROVINCE_LABEL if county == ALL else str(county)).strip('_')
+    return f"{water_year}_{name}"
+
+
+def report_figures(dataset, boundary_gdf, county, water_year, id_col=None):
+    """(summary, figures) for one report; figures is a list of (name, plotly figure)."""
+    summary = summary_view(dataset.frame, [water_year], county, SummaryFilters(county=county))
+    figures = []
+    if summary.table.empty: return summary, figures
+    figures.append(('bar', summary_bar_figure(summary.table)))
+    # The trend covers every year of the county so a single-year report still shows context
+    history = summary_view(dataset.frame, list(dataset.catalog.years), county, SummaryFilters(county=county))
+    if history.frame['Water_Year_Str'].nunique() > 1: figures.append(('trend', extraction_trend_figure(history.frame)))
+    pie = distribution_figure(summary.table, 'طبقه‌بندی منبع')
+    if pie is not None: figures.append(('distribution', pie))
+    if boundary_gdf is not None:
+        id_col = id_col or boundary_gdf.columns[guess_id_column(boundary_gdf.columns)]
+        merged_gdf, color_col, _ = map_frame(boundary_gdf, id_col, summary.table)
+        figures.append(('map', boundary_map_figure(merged_gdf, id_col, color_col)))
+    return summary, figures
+
+
+def _metrics_html(dataset, totals):
+    cells = ''.join(f"<div class='metric'><div>{html.escape(label)}</div><b>{f'{totals[source]:,.2f}' if source in (SURFACE, GROUNDWATER) or dataset.has_source(source) else 'N/A'}</b></div>"
+                    for source, label in METRIC_LABELS.items())
+    return f"<div class='metrics'>{cells}</div>"
+
+
+def render_html(dataset, summary, figures, county, water_year, plotly_js=PLOTLY_JS):
+    """One self-contained report page (apart from the shared plotly.js script)."""
+    title = f"خلاصه بیلان آب - {PROVINCE_LABEL if county == ALL else county} - سال آبی {water_year}"
+    table = summary.table.to_html(index=False, float_format=lambda v: f"{v:,.2f}", classes='summary', border=0) if not summary.table.empty else "<p>داده‌ای برای این شهرستان و سال یافت نشد.</p>"
+    charts = ''.join(fig.to_html(full_html=False, include_plotlyjs=False) for _, fig in figures)
+    return f"""<!DOCTYPE html>
+<html lang="fa" dir="rtl"><head><meta charset="utf-8"><title>{html.escape(title)}</title>
+<script src="{plotly_js}"></script>
+<style>body{{font-family:Tahoma,sans-serif;margin:2em}} .metrics{{display:flex;gap:2em}} .metric b{{font-size:1.4em}}
+table.summary{{border-collapse:collapse}} table.summary td,table.summary th{{padding:2px 8px;border-bottom:1px solid #ddd}}</style>
+</head><body>
+<h1>{html.escape(title)}</h1>
+<h2>خلاصه مقادیر برداشت (میلیون متر مکعب - MCM)</h2>
+{_metrics_html(dataset, summary.totals)}
+<h2>جدول خلاصه</h2>
+{table}
+{charts}
+</body></html>
+"""
+
+
+def render_report(dataset, boundary_gdf, county, water_year, out_dir, formats=('html',), id_col=None):
+    """Renders one report into `out_dir`; returns a ReportResult (errors are recorded, not raised)."""
+    started = time.perf_counter()
+    result = ReportResult(county, water_year)
+    try:
+        summary, figures = report_figures(dataset, boundary_gdf, county, water_year, id_col)
+        base = os.path.join(out_dir, report_basename(county, water_year))
+        if 'html' in formats:
+            with open(base + '.html', 'w', encoding='utf-8') as f: f.write(render_html(dataset, summary, figures, county, water_year))
+            result.paths.append(base + '.html')
+        if 'png' in formats:
+            for name, fig in figures:
+                fig.write_image(f"{base}_{name}.png", width=1200, height=700) # Needs the kaleido package
+                result.paths.append(f"{base}_{name}.png")
+    except Exception as e: result.error = str(e)
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# --- Process Pool ---
+_shared = {}
+
+
+def _init_worker(dataset, boundary_gdf):
+    _shared['dataset'], _shared['boundary'] = dataset, boundary_gdf
+
+
+def _render_job(county, water_year, out_dir, formats, id_col):
+    return render_report(_shared['dataset'], _shared['boundary'], county, water_year, out_dir, formats, id_col)
+
+
+def write_plotly_js(out_dir):
+    """Copies plotly.js into `out_dir` once so the HTML reports can share it."""
+    from plotly.offline import get_plotlyjs
+    path = os.path.join(out_dir, PLOTLY_JS)
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as f: f.write(get_plotlyjs())
+    return path
+
+
+def run_reports(dataset, boundary_gdf, jobs, out_dir, formats=('html',), workers=None, id_col=None, progress=None):
+    """Renders every (county, water year) job and returns the ReportResults in job order.
+
+    `workers` <= 1 renders in-process; `progress(done, total, result)` is called as reports finish.
+    """
+    unknown = set(formats) - set(REPORT_FORMATS)
+    if unknown: raise ValueError(f"Unknown report format(s): {', '.join(sorted(unknown))}")
+    os.makedirs(out_dir, exist_ok=True)
+    if 'html' in formats: write_plotly_js(out_dir)
+    workers = workers or os.cpu_count() or 1
+    results = {}
+    if workers <= 1 or len(jobs) <= 1:
+        for i, (county, year) in enumerate(jobs):
+            results[i] = render_report(dataset, boundary_gdf, county, year, out_dir, formats, id_col)
+            if progress: progress(len(results), len(jobs), results[i])
+    else:
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=context, initializer=_init_worker, initargs=(dataset, boundary_gdf)) as pool:
+            futures = {pool.submit(_render_job, county, year, out_dir, tuple(formats), id_col): i for i, (county, year) in enumerate(jobs)}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    if progress: progress(len(results), len(jobs), results[futures[future]])
+            except BaseException:
+                for future in futures: future.cancel() # Do not render queued reports after a failure or cancellation
+                raise
+    return [results[i] for i in range(len(jobs))]
+
@@ -0,0 +1,121 @@
+"""Distinct well counts for any filter combination without rescanning well IDs.
+
+Groundwater rows are split into partitions keyed by PARTITION_COLS. Each
+partition keeps its distinct well codes (exact mode) and a HyperLogLog register
+row (approximate mode); a query merges the partitions that match the filters.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .constants import ALL, GROUNDWATER
+from .wells import well_key_column
+
+PARTITION_COLS = ['Water_Year_Str', 'County', 'Study_Area', 'Usage_Type', 'Well_Type', 'Well_Status']
+HLL_PRECISION = 10 # 2**10 registers per partition, about 3% standard error
+# Selections with at most this many (partition, well) members are counted exactly
+EXACT_LIMIT = 500_000
+
+
+def _hash64(values):
+    """splitmix64 finalizer over unsigned 64-bit integers."""
+    with np.errstate(over='ignore'):
+        z = values.astype('uint64') + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+def _bit_length(values):
+    """Bit length of unsigned 64-bit integers (exact: each 32-bit half fits a float64 mantissa)."""
+    hi, lo = (values >> np.uint64(32)).astype('float64'), (values & np.uint64(0xFFFFFFFF)).astype('float64')
+    return np.where(hi > 0, np.frexp(hi)[1] + 32, np.frexp(lo)[1])
+
+
+def _hll_estimate(registers):
+    """HyperLogLog cardinality of each register row, with the small-range (linear counting) correction."""
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype('float64')), axis=-1)
+    zeros = np.sum(registers == 0, axis=-1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+@dataclass
+class WellCountSketch:
+    """Per-partition distinct wells: exact member lists plus mergeable HyperLogLog registers."""
+    keys: pd.DataFrame # one row per partition, PARTITION_COLS that exist in the data
+    member_partition: np.ndarray # distinct (partition, well) pairs, sorted by partition
+    member_well: np.ndarray
+    registers: np.ndarray # uint8, partitions × 2**HLL_PRECISION
+    n_wells: int
+
+    def _selected(self, filters):
+        mask = np.ones(len(self.keys), dtype=bool)
+        for col, value in filters.items():
+            if value is None or value == ALL or col not in self.keys.columns: continue
+            values = [value] if isinstance(value, str) else list(value)
+            if values: mask &= self.keys[col].isin(values).to_numpy()
+        return mask
+
+    def count(self, by, exact_limit=EXACT_LIMIT, **filters):
+        """Distinct wells per value of `by` among partitions matching `filters`; columns [by, 'Count'].
+
+        Filters are keyword arguments named after PARTITION_COLS, each one value or
+        a list; 'همه', None and empty lists keep everything. Counts are exact when
+        the selection has at most `exact_limit` members, HyperLogLog estimates otherwise.
+        """
+        if by not in self.keys.columns: return pd.DataFrame(columns=[by, 'Count'])
+        selected = self._selected(filters)
+        group_codes, group_values = pd.factorize(self.keys[by]) # Missing values get -1 and are dropped
+        selected &= group_codes >= 0
+        member_mask = selected[self.member_partition]
+        if member_mask.sum() <= exact_limit:
+            pairs = np.unique(group_codes[self.member_partition[member_mask]].astype('int64') * self.n_wells + self.member_well[member_mask])
+            counts = np.bincount(pairs // self.n_wells, minlength=len(group_values))
+        else:
+            partitions = np.flatnonzero(selected)
+            partitions = partitions[np.argsort(group_codes[partitions], kind='stable')]
+            codes = group_codes[partitions]
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+            counts = np.zeros(len(group_values))
+            counts[codes[starts]] = np.rint(_hll_estimate(np.maximum.reduceat(self.registers[partitions], starts, axis=0)))
+        result = pd.DataFrame({by: group_values, 'Count': counts.astype('int64')})
+        return result[result['Count'] > 0].reset_index(drop=True)
+
+    def total(self, exact_limit=EXACT_LIMIT, **filters):
+        """Distinct wells across every partition matching `filters`."""
+        selected = self._selected(filters)
+        member_mask = selected[self.member_partition]
+        if member_mask.sum() <= exact_limit: return int(np.unique(self.member_well[member_mask]).size)
+        return int(np.rint(_hll_estimate(self.registers[selected].max(axis=0))))
+
+
+def build_well_sketch(frame, precision=HLL_PRECISION):
+    """Partitions the groundwater rows of `frame` and builds both count structures, or None without groundwater."""
+    if frame.empty or 'Source_Type' not in frame.columns: return None
+    gw = frame[frame['Source_Type'] == GROUNDWATER]
+    if gw.empty: return None
+    key_col = well_key_column(gw) or 'ID'
+    cols = [col for col in PARTITION_COLS if col in gw.columns]
+    gw = gw[gw[key_col].notna()]
+    if gw.empty: return None
+    partition = gw.groupby(cols, dropna=False, sort=False).ngroup().to_numpy().astype('int64')
+    first = np.flatnonzero(~pd.Series(partition).duplicated().to_numpy()) # ngroup(sort=False) numbers partitions by first appearance
+    keys = gw.iloc[first][cols].reset_index(drop=True)
+    well_codes = pd.factorize(gw[key_col])[0].astype('int64')
+
+    n_wells = int(well_codes.max()) + 1
+    members = np.sort(pd.unique(partition * n_wells + well_codes))
+    member_partition, member_well = members // n_wells, members % n_wells
+
+    hashes = _hash64(member_well)
+    register = (hashes >> np.uint64(64 - precision)).astype('int64')
+    rest = hashes & np.uint64((1 << (64 - precision)) - 1)
+    rank = (64 - precision) - _bit_length(rest) + 1
+    registers = np.zeros((len(keys), 1 << precision), dtype='uint8')
+    np.maximum.at(registers, (member_partition, register), rank.astype('uint8'))
+    return WellCountSketch(keys, member_partition, member_well, registers, n_wells)
@@ -0,0 +1,142 @@
+"""Memory-mapped Dataset snapshots shared by several dashboard processes.
+
+One loader process builds the Dataset (frame plus every precomputed table) and
+writes it as a snapshot directory: DataFrames become uncompressed Arrow IPC
+files, large numeric arrays become .npy files, and the remaining object graph
+is pickled with references to them. Worker processes map those files read-only.
+Numeric columns are zero-copy views and string columns stay in Arrow buffers
+(pandas' pyarrow-backed string dtype), so every worker shares the same page
+cache instead of holding its own copy of the data.
+
+A `CURRENT` file names the newest snapshot, so a worker's DatasetStore can poll
+it the way it polls source files in single-process mode.
+"""
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR_ENV = 'WATER_ACCOUNTING_SNAPSHOT_DIR' # Set for worker processes by serve.py
+CURRENT_FILE = 'CURRENT'
+OBJECT_FILE = 'dataset.pkl'
+KEEP_SNAPSHOTS = 3 # Older snapshots are deleted; workers still mapping them keep their pages until they reload
+MIN_ARRAY_BYTES = 1 << 16 # Smaller arrays are simply pickled
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """Pickler that writes DataFrames and large numeric arrays to side files and records only their names."""
+
+    def __init__(self, file, directory):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.directory = directory
+        self.count = 0
+        self.written = {} # id(obj) -> (obj, pid): a frame referenced twice (e.g. by the well index) is written once
+
+    def persistent_id(self, obj):
+        seen = self.written.get(id(obj))
+        if seen is not None: return seen[1]
+        pid = None
+        if isinstance(obj, pd.DataFrame) and type(obj) is pd.DataFrame: pid = self._frame(obj)
+        elif isinstance(obj, np.ndarray) and obj.dtype.kind in 'biufcmM' and obj.nbytes >= MIN_ARRAY_BYTES:
+            name = f'array_{self.count}.npy'
+            self.count += 1
+            np.save(os.path.join(self.directory, name), np.ascontiguousarray(obj), allow_pickle=False)
+            pid = ('npy', name)
+        if pid is not None: self.written[id(obj)] = (obj, pid) # Keeping obj alive keeps its id unique
+        return pid
+
+    def _frame(self, frame):
+        import pyarrow as pa
+        try: table = pa.Table.from_pandas(frame, preserve_index=None)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError): return None # Mixed-type columns: pickled with the rest
+        for i, name in enumerate(table.column_names):
+            field = table.schema.field(i)
+            # from_pandas turns NaN into Arrow nulls, which to_pandas copies back into every worker: keep NaN as a float value
+            if pa.types.is_floating(field.type) and table.column(i).null_count:
+                table = table.set_column(i, field, pa.array(frame[name].to_numpy(), type=field.type, from_pandas=False))
+            # pandas' pyarrow strings use 64-bit offsets; 32-bit ones would be widened (copied) on every read
+            elif pa.types.is_string(field.type): table = table.set_column(i, field.with_type(pa.large_string()), table.column(i).cast(pa.large_string()))
+        name = f'frame_{self.count}.arrow'
+        self.count += 1
+        with pa.OSFile(os.path.join(self.directory, name), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer: writer.write_table(table)
+        return ('arrow', name)
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, directory):
+        super().__init__(file)
+        self.directory = directory
+        self.loaded = {} # pid -> object, so shared references stay shared
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        if pid not in self.loaded:
+            path = os.path.join(self.directory, name)
+            self.loaded[pid] = np.load(path, mmap_mode='r') if kind == 'npy' else read_arrow_frame(path)
+        return self.loaded[pid]
+
+
+def _string_dtype(arrow_type):
+    import pyarrow as pa
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type): return pd.StringDtype('pyarrow')
+    return None
+
+
+def read_arrow_frame(path):
+    """A DataFrame over a memory-mapped Arrow IPC file, without copying numeric or string columns."""
+    import pyarrow as pa
+    table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    return table.to_pandas(split_blocks=True, types_mapper=_string_dtype)
+
+
+def write_snapshot(dataset, root, keep=KEEP_SNAPSHOTS):
+    """Writes `dataset` as a new snapshot under `root`, points CURRENT at it and prunes old ones; returns its path."""
+    os.makedirs(root, exist_ok=True)
+    name = f'snapshot-{time.time_ns()}-v{dataset.version}' # Names sort chronologically
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+    try:
+        with open(os.path.join(staging, OBJECT_FILE), 'wb') as f: _SnapshotPickler(f, staging).dump(dataset)
+        os.replace(staging, os.path.join(root, name))
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w', encoding='utf-8') as f: f.write(name)
+    os.replace(pointer + '.tmp', pointer) # Atomic: readers see the old or the new name
+    older = sorted(d for d in os.listdir(root) if d.startswith('snapshot-') and d != name)
+    for old in older[:max(len(older) - (keep - 1), 0)]: shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return os.path.join(root, name)
+
+
+def current_snapshot(root):
+    """Path of the snapshot CURRENT points at, or None if none was written yet."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding='utf-8') as f: name = f.read().strip()
+    except OSError: return None
+    return os.path.join(root, name) if name else None
+
+
+def read_snapshot(path):
+    """The Dataset stored at `path`, with its frames and large arrays memory-mapped read-only."""
+    with open(os.path.join(path, OBJECT_FILE), 'rb') as f: data = f.read()
+    return _SnapshotUnpickler(io.BytesIO(data), path).load()
+
+
+def snapshot_fingerprint(root):
+    """Changes whenever CURRENT points at a new snapshot; used as a DatasetStore fingerprint."""
+    return (current_snapshot(root),)
+
+
+def snapshot_loader(root, wait=30.0):
+    """DatasetStore loader reading the current snapshot under `root` (waits up to `wait` seconds for the first one)."""
+    def load(_specs):
+        deadline = time.monotonic() + wait
+        while (path := current_snapshot(root)) is None and time.monotonic() < deadline: time.sleep(0.5)
+        if path is None: raise FileNotFoundError(f"No dataset snapshot under {root}")
+        return read_snapshot(path)
+    return load
@@ -0,0 +1,218 @@
+"""Pre-generated Mapbox vector tiles (MVT) of the subbasin boundaries.
+
+`generate_tiles` cuts the polygons into a {z}/{x}/{y}.pbf pyramid under the
+Streamlit static folder, so the map downloads each tile once (browser cache)
+and a rerun only sends the small subbasin ID → value table. Tiles carry the ID
+column as a string property for the client-side join. The MVT protobuf is
+written directly; only shapely is needed.
+"""
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .boundaries import guess_id_column, read_boundary_file
+from .diagnostics import Diagnostic
+
+TILE_LAYER = 'subbasins'
+ID_PROPERTY = 'id'
+MIN_ZOOM, MAX_ZOOM = 5, 12
+EXTENT = 4096 # Tile coordinate range
+BUFFER = 64 # Tile units drawn beyond the edge so strokes do not show seams
+METADATA_FILE = 'metadata.json'
+_HALF_WORLD = 20037508.342789244 # Web Mercator half-circumference in metres
+
+
+# --- Protobuf Encoding ---
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number, values):
+    return _bytes_field(number, b''.join(_varint(int(v)) for v in values))
+
+
+def _zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def _ring_commands(ring, cursor):
+    """MoveTo/LineTo/ClosePath commands of one closed ring of integer tile coordinates."""
+    points = ring[:-1] # Drop the closing point; ClosePath implies it
+    deltas = np.diff(np.vstack([cursor, points]), axis=0)
+    params = _zigzag(deltas.astype('int64')).ravel()
+    commands = [(1 | (1 << 3)), *params[:2], (2 | ((len(points) - 1) << 3)), *params[2:], (7 | (1 << 3))]
+    return commands, points[-1]
+
+
+def _polygon_rings(geometry):
+    import shapely
+    parts = shapely.get_parts(geometry)
+    for polygon in parts:
+        if polygon.is_empty or polygon.geom_type != 'Polygon': continue
+        rings = [polygon.exterior, *polygon.interiors]
+        for i, ring in enumerate(rings):
+            coords = np.asarray(ring.coords, dtype='int64')
+            keep = np.r_[True, np.any(coords[1:] != coords[:-1], axis=1)] # Points collapsed by rounding
+            coords = coords[keep]
+            if len(coords) < 4:
+                if i == 0: break # Degenerate exterior: skip the whole polygon
+                continue
+            yield coords
+
+
+def encode_tile(features, layer=TILE_LAYER, extent=EXTENT):
+    """MVT bytes of one layer; `features` are (feature id, {key: str value}, polygon in tile coordinates)."""
+    keys, values, encoded = {}, {}, []
+    for feature_id, properties, geometry in features:
+        commands, cursor = [], np.zeros(2, dtype='int64')
+        for ring in _polygon_rings(geometry):
+            ring_commands, cursor = _ring_commands(ring, cursor)
+            commands.extend(ring_commands)
+        if not commands: continue
+        tags = []
+        for key, value in properties.items():
+            tags += [keys.setdefault(key, len(keys)), values.setdefault(str(value), len(values))]
+        encoded.append(_bytes_field(2, _field(1, 0) + _varint(feature_id) + _packed(2, tags) + _field(3, 0) + _varint(3) + _packed(4, commands)))
+    if not encoded: return b''
+    body = _field(15, 0) + _varint(2) + _bytes_field(1, layer.encode('utf-8')) + b''.join(encoded)
+    body += b''.join(_bytes_field(3, key.encode('utf-8')) for key in keys)
+    body += b''.join(_bytes_field(4, _bytes_field(1, value.encode('utf-8'))) for value in values)
+    body += _field(5, 0) + _varint(extent)
+    return _bytes_field(3, body)
+
+
+# --- Tiling ---
+def tile_span(zoom):
+    return 2 * _HALF_WORLD / (1 << zoom)
+
+
+def tile_range(bounds, zoom):
+    """(x0, y0, x1, y1) inclusive tile indices covering Web Mercator `bounds`."""
+    span, last = tile_span(zoom), (1 << zoom) - 1
+    minx, miny, maxx, maxy = bounds
+    x0, x1 = (int(np.clip(math.floor((v + _HALF_WORLD) / span), 0, last)) for v in (minx, maxx))
+    y0, y1 = (int(np.clip(math.floor((_HALF_WORLD - v) / span), 0, last)) for v in (maxy, miny))
+    return x0, y0, x1, y1
+
+
+def _to_tile(geometry, zoom, x, y, extent):
+    """Clips a Web Mercator geometry to tile (x, y) plus the buffer and maps it onto the integer tile grid."""
+    import shapely
+    span = tile_span(zoom)
+    left, top = -_HALF_WORLD + x * span, _HALF_WORLD - y * span
+    pad = BUFFER / extent * span
+    clipped = shapely.clip_by_rect(geometry, left - pad, top - span - pad, left + span + pad, top + pad)
+    if clipped.is_empty: return None
+    scale = extent / span
+    local = shapely.transform(clipped, lambda c: np.column_stack([(c[:, 0] - left) * scale, (top - c[:, 1]) * scale]))
+    local = shapely.set_precision(local, 1.0)
+    if local.is_empty: return None
+    # MVT exteriors have positive area in tile coordinates (y down), i.e. counter-clockwise for shapely
+    return shapely.orient_polygons(local, exterior_cw=False)
+
+
+def generate_tiles(gdf, id_col, out_dir, layer=TILE_LAYER, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, extent=EXTENT):
+    """Writes {z}/{x}/{y}.pbf tiles of `gdf` plus metadata.json into `out_dir`; returns the metadata.
+
+    The ID column is stored as the string property ID_PROPERTY. Geometry is
+    simplified to one tile unit per zoom; tiles without features are not written.
+    """
+    import shapely
+    mercator = gdf[[id_col, 'geometry']].to_crs('EPSG:3857')
+    ids = mercator[id_col].astype(str).tolist()
+    bounds = mercator.total_bounds
+    count = 0
+    for zoom in range(min_zoom, max_zoom + 1):
+        simplified = shapely.simplify(np.asarray(mercator.geometry.values), tile_span(zoom) / extent, preserve_topology=True)
+        boxes = shapely.bounds(simplified)
+        x0, y0, x1, y1 = tile_range(bounds, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                span = tile_span(zoom)
+                left, top = -_HALF_WORLD + x * span, _HALF_WORLD - y * span
+                hits = np.flatnonzero((boxes[:, 0] <= left + span) & (boxes[:, 2] >= left) & (boxes[:, 1] <= top) & (boxes[:, 3] >= top - span))
+                features = []
+                for i in hits:
+                    local = _to_tile(simplified[i], zoom, x, y, extent)
+                    if local is not None: features.append((int(i) + 1, {ID_PROPERTY: ids[i]}, local))
+                data = encode_tile(features, layer, extent)
+                if not data: continue
+                os.makedirs(os.path.join(out_dir, str(zoom), str(x)), exist_ok=True)
+                with open(os.path.join(out_dir, str(zoom), str(x), f'{y}.pbf'), 'wb') as f: f.write(data)
+                count += 1
+    wgs84 = gdf.to_crs('EPSG:4326').total_bounds
+    metadata = {
+        'tilejson': '3.0.0', 'tiles': ['{z}/{x}/{y}.pbf'], 'minzoom': min_zoom, 'maxzoom': max_zoom,
+        'bounds': [round(float(v), 6) for v in wgs84],
+        'center': [round(float(wgs84[0] + wgs84[2]) / 2, 6), round(float(wgs84[1] + wgs84[3]) / 2, 6), 7],
+        'vector_layers': [{'id': layer, 'fields': {ID_PROPERTY: 'String'}}],
+        'id_column': id_col, 'ids': ids, 'tile_count': count,
+    }
+    with open(os.path.join(out_dir, METADATA_FILE), 'w', encoding='utf-8') as f: json.dump(metadata, f, ensure_ascii=False)
+    return metadata
+
+
+def read_tile_metadata(out_dir):
+    """metadata.json of a generated tile set, or None if there is none."""
+    try:
+        with open(os.path.join(out_dir, METADATA_FILE), encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+def _file_sha1(path):
+    with open(path, 'rb') as f: return hashlib.sha1(f.read()).hexdigest()
+
+
+def ensure_tiles(zip_path, out_dir, id_col=None, **kwargs):
+    """Tiles for a zipped boundary shapefile, regenerated only when the zip's content or the requested options changed.
+
+    Returns (metadata or None, diagnostics). A new tile set is built in a sibling
+    temporary directory and then swapped in, so readers never see half a pyramid.
+    """
+    try: source_hash = _file_sha1(zip_path)
+    except OSError as e: return None, [Diagnostic.error(f"فایل مرز برای ساخت کاشی‌ها یافت نشد: {e}", code='missing_boundary')]
+    metadata = read_tile_metadata(out_dir)
+    wanted = {'id_column': id_col, 'minzoom': kwargs.get('min_zoom'), 'maxzoom': kwargs.get('max_zoom')}
+    if metadata is not None and metadata.get('source_sha1') == source_hash and all(v is None or metadata.get(k) == v for k, v in wanted.items()): return metadata, []
+    boundary = read_boundary_file(zip_path)
+    if boundary.gdf is None: return None, boundary.diagnostics
+    gdf = boundary.gdf
+    id_col = id_col or gdf.columns[guess_id_column(gdf.columns)]
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent, prefix='.tiles-')
+    try:
+        metadata = generate_tiles(gdf, id_col, staging, **kwargs)
+        metadata['source_sha1'] = source_hash
+        with open(os.path.join(staging, METADATA_FILE), 'w', encoding='utf-8') as f: json.dump(metadata, f, ensure_ascii=False)
+        old = None
+        if os.path.exists(out_dir):
+            old = tempfile.mkdtemp(dir=parent, prefix='.tiles-old-')
+            os.replace(out_dir, os.path.join(old, 'tiles'))
+        os.replace(staging, out_dir)
+        if old: shutil.rmtree(old, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return metadata, boundary.diagnostics
@@ -0,0 +1,149 @@
+"""Row validation of a standardized source: every rule is one vectorized mask over the whole file.
+
+Rows failing a quarantine rule (unreadable or negative volumes, impossible well
+depths or hours, duplicate keys, values a unit factor away from the rest of the
+file) are taken out of the source and written with their reasons to a
+quarantine CSV; the remaining rows load as usual. Rows failing a flag rule stay
+in the data and are only counted; a zero or negative well depth, the exports'
+way of saying "not measured", is one of them and is loaded as empty. The ValidationReport travels with the
+SourceResult, so it is cached and versioned together with the dataset.
+"""
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .constants import DAM_SOURCE_TYPES, GROUNDWATER
+from .wells import well_key_column
+
+QUARANTINE, FLAG = 'quarantine', 'flag'
+MAX_WELL_DEPTH_M = 1500
+HOURS_PER_YEAR = 8784 # Leap year
+UNIT_FACTOR = 1000 # A well extraction this many times above or below the file's median was entered in the wrong unit (litres, MCM)
+MIN_UNIT_ROWS = 30 # Fewer positive extractions give no reliable median
+YEAR_PATTERN = r'\d{4}-\d{2}'
+REASON_SEPARATOR = '؛ '
+
+DAM_VOLUME_COLS = ['Volume_Start_Year', 'Volume_End_Year', 'Inflow', 'Other_Input', 'Total_Input', 'Leakage', 'Pumping_Out', 'Drainage', 'Evaporation',
+                   'Sediment_Discharge', 'Intake_Discharge', 'Spillway_Discharge', 'Total_Outflow']
+GW_VOLUME_COLS = ['Operating_Hours', 'Flow_Rate_ls', 'Actual_Extraction_m3', 'Discharge_m3'] # Over/under extraction may be negative
+DEFAULT_DUPLICATE_KEYS = ['Source_Name', 'ID', 'Water_Year_Str', 'Usage_Type', 'County'] # Dams: the same dam and year may serve several subbasins
+DUPLICATE_KEYS = {GROUNDWATER: ['Water_Year_Str'], **dict.fromkeys(DAM_SOURCE_TYPES, DEFAULT_DUPLICATE_KEYS)}
+
+# code -> (action, reason written to the quarantine file and shown in the report)
+RULES = {
+    'non_numeric_extraction': (QUARANTINE, "مقدار برداشت غیرعددی"),
+    'negative_value': (QUARANTINE, "مقدار منفی"),
+    'impossible_depth': (QUARANTINE, "عمق چاه غیرممکن"),
+    'impossible_hours': (QUARANTINE, "ساعت کارکرد بیش از ساعات سال"),
+    'unit_anomaly': (QUARANTINE, "برداشت با اختلاف واحد نسبت به سایر ردیف‌ها"),
+    'duplicate_key': (QUARANTINE, "ردیف تکراری"),
+    'non_numeric_measure': (FLAG, "مقدار غیرعددی (خالی در نظر گرفته شد)"),
+    'unknown_depth': (FLAG, "عمق چاه صفر یا منفی (خالی در نظر گرفته شد)"),
+    'invalid_year': (FLAG, "سال آبی نامعتبر"),
+}
+VALIDATION_LABELS = {'Source': 'فایل', 'Rule': 'قاعده', 'Column': 'ستون', 'Action': 'اقدام', 'Rows': 'تعداد ردیف'}
+ACTION_LABELS = {QUARANTINE: 'قرنطینه', FLAG: 'علامت‌گذاری'}
+
+
+@dataclass
+class ValidationReport:
+    """What validating one source found; `issues` has one row per rule and column that failed at least once."""
+    source: str # File name
+    rows: int = 0 # Rows read
+    quarantined: int = 0
+    flagged: int = 0 # Kept rows failing a flag rule
+    missing_columns: list = field(default_factory=list)
+    issues: pd.DataFrame = None
+    quarantine_path: str = None # Set while the quarantine file exists
+
+    @property
+    def loaded(self):
+        return self.rows - self.quarantined
+
+
+def _issues(frame, source_type, invalid, extraction_col):
+    """(code, column, mask) for every rule except duplicates, each one vectorized over all rows."""
+    found = []
+    if invalid.get('Extraction_MCM') is not None: found.append(('non_numeric_extraction', 'Extraction_MCM', invalid['Extraction_MCM']))
+    for col, mask in invalid.items():
+        if col not in ('Extraction_MCM', extraction_col): found.append(('non_numeric_measure', col, mask))
+    volume_cols = ['Extraction_MCM'] + (DAM_VOLUME_COLS if source_type in DAM_SOURCE_TYPES else GW_VOLUME_COLS if source_type == GROUNDWATER else [])
+    for col in volume_cols:
+        if col in frame.columns: found.append(('negative_value', col, frame[col] < 0))
+    if 'Well_Depth_m' in frame.columns:
+        found.append(('unknown_depth', 'Well_Depth_m', frame['Well_Depth_m'] <= 0))
+        found.append(('impossible_depth', 'Well_Depth_m', frame['Well_Depth_m'] > MAX_WELL_DEPTH_M))
+    if 'Operating_Hours' in frame.columns: found.append(('impossible_hours', 'Operating_Hours', frame['Operating_Hours'] > HOURS_PER_YEAR))
+    if 'Water_Year_Str' in frame.columns: found.append(('invalid_year', 'Water_Year_Str', ~frame['Water_Year_Str'].astype(str).str.fullmatch(YEAR_PATTERN)))
+    positive = frame['Extraction_MCM'] > 0 if 'Extraction_MCM' in frame.columns else pd.Series(False, index=frame.index)
+    if source_type == GROUNDWATER and positive.sum() >= MIN_UNIT_ROWS: # Dam usage shares legitimately span several orders of magnitude
+        log_values = np.log10(frame['Extraction_MCM'].where(positive))
+        found.append(('unit_anomaly', 'Extraction_MCM', (log_values - log_values.median()).abs() > np.log10(UNIT_FACTOR)))
+    return found
+
+
+def duplicate_keys(frame, source_type):
+    """Columns identifying one record of `source_type`: water year plus the well identifier for groundwater."""
+    if source_type == GROUNDWATER:
+        key = well_key_column(frame)
+        return DUPLICATE_KEYS[GROUNDWATER] + [key] if key else []
+    return [col for col in DUPLICATE_KEYS.get(source_type, DEFAULT_DUPLICATE_KEYS) if col in frame.columns]
+
+
+def validate_frame(frame, source_type, invalid=None, extraction_col=None):
+    """Runs every rule over `frame`; returns (quarantine mask, flag mask, reasons per failing row, issues table).
+
+    `invalid` maps measure columns to masks of non-empty values that were not
+    numeric (see ingest.coerce_measures); `extraction_col`, the raw measure
+    Extraction_MCM was read from, is reported once as extraction. Duplicates are
+    looked for among the rows no other rule quarantined, so a bad first copy does
+    not take the good one with it.
+    """
+    found = [(code, col, mask.fillna(False).astype(bool)) for code, col, mask in _issues(frame, source_type, invalid or {}, extraction_col)]
+    quarantine = np.zeros(len(frame), dtype=bool)
+    for code, _, mask in found:
+        if RULES[code][0] == QUARANTINE: quarantine |= mask.to_numpy()
+    keys = duplicate_keys(frame, source_type)
+    if keys:
+        clean = frame[~quarantine]
+        duplicated = clean.duplicated(keys, keep='first') & clean[keys].notna().all(axis=1)
+        found.append(('duplicate_key', ', '.join(keys), duplicated.reindex(frame.index, fill_value=False)))
+        quarantine |= found[-1][2].to_numpy()
+    flagged = np.zeros(len(frame), dtype=bool)
+    reasons = pd.Series('', index=frame.index)
+    rows = []
+    for code, col, mask in found:
+        if not mask.any(): continue
+        action, label = RULES[code]
+        if action == FLAG: flagged |= mask.to_numpy()
+        reasons = reasons.mask(mask, reasons + f"{label} ({col}){REASON_SEPARATOR}")
+        rows.append({'Rule': code, 'Column': col, 'Action': action, 'Rows': int(mask.sum())})
+    issues = pd.DataFrame(rows, columns=['Rule', 'Column', 'Action', 'Rows'])
+    return quarantine, flagged & ~quarantine, reasons.str.removesuffix(REASON_SEPARATOR), issues
+
+
+def quarantine_path(quarantine_dir, file_name):
+    return os.path.join(quarantine_dir, f"{os.path.splitext(file_name)[0]}.quarantine.csv")
+
+
+def write_quarantine(raw, reasons, path):
+    """Writes the raw rows of `reasons` (original headers, their file line and the reasons) as a CSV Excel opens; returns the path."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rows = raw.loc[reasons.index].copy()
+    rows.insert(0, 'دلایل', reasons)
+    rows.insert(0, 'ردیف فایل', reasons.index + 2) # Header is line 1
+    rows.to_csv(path + '.tmp', index=False, encoding='utf-8-sig')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def validation_table(reports):
+    """One row per source file and failing rule, with Persian rule and action labels."""
+    frames = [report.issues.assign(Source=report.source) for report in reports if report.issues is not None and not report.issues.empty]
+    if not frames: return pd.DataFrame(columns=['Source', 'Rule', 'Column', 'Action', 'Rows'])
+    table = pd.concat(frames, ignore_index=True)[['Source', 'Rule', 'Column', 'Action', 'Rows']]
+    table['Rule'] = table['Rule'].map(lambda code: RULES[code][1])
+    table['Action'] = table['Action'].map(ACTION_LABELS)
+    return table
@@ -0,0 +1,76 @@
+"""Background warm-up: runs named loading steps once per process on a daemon thread.
+
+The steps themselves are plain callables supplied by the caller (the dashboards
+pass their cached loaders), so the first analyst after a restart finds the
+caches already populated and the login form is never blocked.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    label: str # Shown in the readiness indicator
+    func: object
+    status: str = PENDING
+    seconds: float = 0.0
+    error: str = ''
+
+
+class Warmup:
+    """Runs the steps in order on a daemon thread; a failed step is recorded and the rest still run."""
+
+    def __init__(self, steps):
+        self.steps = [WarmupStep(name, label, func) for name, label, func in steps]
+        self._done = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Starts the thread once; later calls are no-ops. Returns self."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='water-accounting-warmup', daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for step in self.steps:
+                step.status = RUNNING
+                started = time.perf_counter()
+                try:
+                    step.func()
+                    step.status = DONE
+                except Exception as e:
+                    step.status, step.error = FAILED, str(e)
+                step.seconds = time.perf_counter() - started
+        finally:
+            self._done.set()
+
+    @property
+    def finished(self):
+        return self._done.is_set()
+
+    @property
+    def ready(self):
+        """True once every step finished without error."""
+        return self.finished and all(step.status == DONE for step in self.steps)
+
+    @property
+    def progress(self):
+        """Share of steps finished (done or failed), between 0 and 1."""
+        return sum(step.status in (DONE, FAILED) for step in self.steps) / len(self.steps) if self.steps else 1.0
+
+    @property
+    def current(self):
+        """The running step, or None."""
+        return next((step for step in self.steps if step.status == RUNNING), None)
+
+    def wait(self, timeout=None):
+        """Blocks until all steps finished; returns `finished`."""
+        return self._done.wait(timeout)
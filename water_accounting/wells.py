@@ -0,0 +1,116 @@
+"""Per-well multi-year trends and persistent over-extraction flags.
+
+Rows are reduced to one row per (well, year), sorted by well then year, and
+every per-well statistic is computed with `np.add.reduceat`-style reductions
+over the group start offsets, so there is no Python loop per well.
+"""
+import numpy as np
+import pandas as pd
+
+from .constants import GROUNDWATER, GW_ID_COLS, INVALID_YEARS
+from .filters import filter_equals
+
+# A well is a persistent over-extractor after this many consecutive over-extraction years
+PERSISTENT_YEARS = 3
+WELL_ATTRIBUTE_COLS = ['County', 'Study_Area', 'Usage_Type', 'Well_Type', 'Well_Status']
+TREND_COLS = ['Years', 'First_Year', 'Last_Year', 'Total_Extraction_m3', 'Mean_Extraction_m3', 'Trend_m3_per_year', 'Last_YoY_Change_m3', 'Last_YoY_Change_Pct',
+              'Over_Years', 'Longest_Over_Streak', 'Total_Over_Extraction_m3', 'Persistent_Over_Extraction']
+
+WELL_TREND_LABELS = {
+    'Well_ID': 'شناسه چاه', 'County': 'شهرستان', 'Study_Area': 'محدوده مطالعاتی', 'Usage_Type': 'کاربری', 'Well_Type': 'نوع چاه',
+    'Years': 'تعداد سال', 'Last_Year': 'آخرین سال', 'Total_Extraction_m3': 'مجموع برداشت (m3)', 'Trend_m3_per_year': 'روند (m3 در سال)',
+    'Last_YoY_Change_m3': 'تغییر سال آخر (m3)', 'Over_Years': 'سال‌های اضافه برداشت', 'Longest_Over_Streak': 'بیشترین سال‌های متوالی',
+    'Total_Over_Extraction_m3': 'مجموع اضافه برداشت (m3)', 'Persistent_Over_Extraction': 'اضافه برداشت مداوم',
+}
+
+
+def well_key_column(df):
+    """The identifier column that tracks a well across years, or None."""
+    return next((col for col in GW_ID_COLS if col in df.columns and df[col].notna().any()), None)
+
+
+def _empty_trends():
+    return pd.DataFrame(columns=['Well_ID'] + WELL_ATTRIBUTE_COLS + TREND_COLS)
+
+
+def well_trends(df):
+    """One row per well: trend, last year-over-year change and over-extraction streaks.
+
+    `Trend_m3_per_year` is the least-squares slope of yearly extraction over the
+    water-year index; over-extraction is a positive `Over_Under_Extraction_m3`.
+    """
+    if df.empty or 'Source_Type' not in df.columns: return _empty_trends()
+    gw = df[df['Source_Type'] == GROUNDWATER]
+    key_col = well_key_column(gw)
+    if gw.empty or key_col is None: return _empty_trends()
+    gw = gw[gw[key_col].notna() & ~gw['Water_Year_Str'].isin(INVALID_YEARS)]
+    if gw.empty: return _empty_trends()
+
+    # --- Reduce to sorted (well, year) cells ---
+    well_codes, well_ids = pd.factorize(gw[key_col])
+    years = np.sort(gw['Water_Year_Str'].unique())
+    year_codes = np.searchsorted(years, gw['Water_Year_Str'].to_numpy())
+    cells, row_cell = np.unique(well_codes.astype('int64') * len(years) + year_codes, return_inverse=True)
+    cell_well, cell_year = cells // len(years), (cells % len(years)).astype('float64')
+    extraction = _cell_sum(gw, 'Actual_Extraction_m3', row_cell, len(cells), fallback='Extraction_MCM', scale=1_000_000)
+    over = _cell_sum(gw, 'Over_Under_Extraction_m3', row_cell, len(cells))
+
+    # --- Group offsets: cells are sorted by well, then year ---
+    starts = np.flatnonzero(np.r_[True, cell_well[1:] != cell_well[:-1]])
+    ends = np.r_[starts[1:], len(cells)] - 1
+    n = np.diff(np.r_[starts, len(cells)]).astype('float64')
+    sx, sy = np.add.reduceat(cell_year, starts), np.add.reduceat(extraction, starts)
+    sxy, sxx = np.add.reduceat(cell_year * extraction, starts), np.add.reduceat(cell_year * cell_year, starts)
+    denominator = n * sxx - sx * sx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(denominator > 0, (n * sxy - sx * sy) / denominator, np.nan)
+    has_previous = n > 1
+    last_change = np.where(has_previous, extraction[ends] - extraction[np.maximum(ends - 1, 0)], np.nan)
+
+    # --- Over-extraction streaks: a run continues while the same well over-extracts in consecutive years ---
+    is_over = over > 0
+    continues = np.r_[False, (cell_well[1:] == cell_well[:-1]) & (np.diff(cell_year) == 1) & is_over[1:] & is_over[:-1]]
+    run_id = np.cumsum(~continues)
+    run_length = np.bincount(run_id, weights=is_over)[run_id] * is_over
+    longest = np.maximum.reduceat(run_length, starts)
+
+    # --- Attributes from each well's latest row ---
+    latest_rows = np.zeros(len(cells), dtype='int64')
+    latest_rows[row_cell] = np.arange(len(gw)) # Later rows of a cell overwrite earlier ones
+    attributes = gw.iloc[latest_rows[ends]]
+    trends = pd.DataFrame({'Well_ID': well_ids[cell_well[starts]]})
+    for col in WELL_ATTRIBUTE_COLS:
+        if col in attributes.columns: trends[col] = attributes[col].to_numpy()
+    trends['Years'] = n.astype('int64')
+    trends['First_Year'], trends['Last_Year'] = years[cell_year[starts].astype('int64')], years[cell_year[ends].astype('int64')]
+    trends['Total_Extraction_m3'] = sy
+    trends['Mean_Extraction_m3'] = sy / n
+    trends['Trend_m3_per_year'] = slope
+    trends['Last_YoY_Change_m3'] = last_change
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trends['Last_YoY_Change_Pct'] = np.where(has_previous & (extraction[np.maximum(ends - 1, 0)] != 0), 100 * last_change / extraction[np.maximum(ends - 1, 0)], np.nan)
+    trends['Over_Years'] = np.add.reduceat(is_over.astype('int64'), starts)
+    trends['Longest_Over_Streak'] = longest.astype('int64')
+    trends['Total_Over_Extraction_m3'] = np.add.reduceat(np.where(is_over, over, 0.0), starts)
+    trends['Persistent_Over_Extraction'] = trends['Longest_Over_Streak'] >= PERSISTENT_YEARS
+    return trends
+
+
+def _cell_sum(df, col, row_cell, n_cells, fallback=None, scale=1):
+    """Sums a measure per (well, year) cell, falling back to another column times `scale`."""
+    if col in df.columns: values = df[col].to_numpy(dtype='float64')
+    elif fallback in df.columns: values = df[fallback].to_numpy(dtype='float64') * scale
+    else: return np.zeros(n_cells)
+    return np.bincount(row_cell, weights=np.nan_to_num(values), minlength=n_cells)
+
+
+def worst_offenders(trends, limit=50, **filters):
+    """Wells ranked by over-extraction: persistent offenders first, then total over-extraction and trend.
+
+    Keyword filters restrict attribute columns, e.g. `County='مشهد'`; 'همه' or None keeps everything.
+    """
+    for col, value in filters.items():
+        if value is not None: trends = filter_equals(trends, col, value)
+    offenders = trends[trends['Over_Years'] > 0]
+    offenders = offenders.sort_values(['Persistent_Over_Extraction', 'Total_Over_Extraction_m3', 'Trend_m3_per_year'], ascending=False, kind='stable')
+    return offenders.head(limit) if limit else offenders